@@ -2,17 +2,21 @@ from __future__ import print_function
 
 import os
 import sys
+import hashlib
 import logging
 import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
 import six
 import copy
 
-from collections import deque
+from collections import deque, OrderedDict
+from six.moves import cPickle
 
 from flightdatautilities.dict_helpers import dict_filter
 
+from analysis_engine import settings, __version__
 from analysis_engine.node import (
     ApproachNode,
+    Attribute,
     DerivedParameterNode,
     MultistateDerivedParameterNode,
     FlightAttributeNode,
@@ -22,7 +26,9 @@ from analysis_engine.node import (
 )
 
 logger = logging.getLogger(__name__)
-not_windows = sys.platform not in ('win32', 'win64') # False for Windows :-(
+
+# Processing orders and spanning trees keyed by dependency signature.
+_dependency_order_cache = OrderedDict()
 
 """
 TODO:
@@ -152,14 +158,14 @@ def indent_tree(graph, node, level=0, space='  ', delim='- ', label=True,
             path.append(node)
             return ['<<Circular Depenency to: %s>>' % node]
         path.append(node)
-        if graph.node[node].get('active', True):
+        if graph.nodes[node].get('active', True):
             if recurse_active:
                 node_repr = node
             else:
                 return []
         else:
             node_repr = '[%s]' % node
-        node_type = graph.node[node].get('node_type')
+        node_type = graph.nodes[node].get('node_type')
         if node_type and label:
             node_repr = '%s (%s)' % (node_repr, node_type)
         row = '%s%s%s' % (space*level, delim, node_repr)
@@ -183,7 +189,18 @@ def print_tree(graph, node='root', **kwargs):
     print('\n'.join(indent_tree(graph, node, **kwargs)))
 
 
-def dependencies3(di_graph, root, node_mgr, raise_cir_dep=False):
+def _edge_order(edge):
+    '''
+    Sort key of (successor, edge attributes) by the order of the dependency
+    within the derive method. Edges without an order (from root) sort first,
+    as None does in Python 2.
+    '''
+    order = edge[1].get('order')
+    return order is not None, order
+
+
+def dependencies3(di_graph, root, node_mgr, raise_cir_dep=False,
+                  record_tree_path=None):
     '''
     Performs a Depth First Search down each dependency node in the tree
     (di_graph) until each branch's dependencies are best satisfied.
@@ -199,6 +216,9 @@ def dependencies3(di_graph, root, node_mgr, raise_cir_dep=False):
     Heading -> Heading True + Magnetic Variation
     Heading True -> Heading - Magnetic Variation
 
+    The search is iterative so that the depth of the tree is not limited by
+    the recursion limit.
+
     :param di_graph: Directed graph of all nodes and their dependencies.
     :type di_graph: nx.DiGraph
     :param root: Root node to start traversing from, usually named 'root'
@@ -209,60 +229,103 @@ def dependencies3(di_graph, root, node_mgr, raise_cir_dep=False):
     :type node_mgr: analysis_engine.node.NodeManager
     :raise_cir_dep: Stop and raise a CircularDependency error if a circular
                     dependency on the node is encountered.
+    :param record_tree_path: Record the path to each node visited, e.g. for
+        ordered_tree_to_file. If None, only recorded when logging at DEBUG.
+    :type record_tree_path: bool or None
+    :returns: Processing order and the recorded tree path (empty if not recorded).
+    :rtype: ([str], [[str]])
     '''
     log_stuff = logger.getEffectiveLevel() >= logging.INFO
-    def traverse_tree(node):
-        "Begin the recursion at this node's position in the dependency tree"
-        if node in path:
-            # add node for it to be removed (pop'd) in a moment
-            path.append(node)
+    if record_tree_path is None:
+        record_tree_path = logger.isEnabledFor(logging.DEBUG)
+
+    # OPT: Successors are sorted by the order in the derive method once per
+    # node rather than on every visit.
+    adjacency = {}
+    ordering = []
+    path = []  # current branch path
+    on_path = set()  # nodes within path for fast lookup
+    active_nodes = set()  # operational nodes visited for fast lookup
+    # OPT: Nodes which were not operational without avoiding a circular
+    # dependency anywhere beneath them cannot become operational later in the
+    # search, so are not searched again. Disabled when recording the tree
+    # path so that every visit is recorded.
+    inoperable_nodes = set()
+    circular = [0]  # circular dependencies avoided so far
+    tree_path = [] # For viewing the tree in which nodes are add to path
+    # Each frame is [node, iterator of ordered successors, layer of available
+    # dependencies, circular dependencies avoided before visiting the node].
+    stack = []
+
+    def visit(node):
+        '''
+        :returns: Whether the node is available, or None if its successors
+            must be searched first.
+        :rtype: bool or None
+        '''
+        if node in on_path:
             # we've met this node before; start of circular dependency?
-            tree_path.append(list(path) + ['CIRCULAR',])
+            circular[0] += 1
+            if record_tree_path:
+                tree_path.append(path + [node, 'CIRCULAR'])
             if log_stuff:
                 logger.info("Circular dependency avoided at node '%s'. "
-                            "Branch path: %s", node, path)
+                            "Branch path: %s", node, path + [node])
             if raise_cir_dep:
                 raise CircularDependency("Circular Dependency In Path "
                                          "(node: '%s', path: '%s')"
-                                         % (node,"' > '".join(path)))
+                                         % (node, "' > '".join(path + [node])))
             return False  # establishing if available; cannot yet be available
-        # we're recursing down
-        path.append(node)
         if node in active_nodes:
             # node already discovered operational
             return True
-
-        layer = set()  # layer of current node's available dependencies
-        # order the successors based on the order in the derive method; this allows the
-        # class to define the best path through the dependency tree.
-        ordered_successors = [name for (name, d) in sorted(di_graph[node].items(), key=lambda a: a[1].get('order'))]
-        for dependency in ordered_successors:
-            # traverse again, 'like we did last summer'
-            if traverse_tree(dependency):
+        if node in inoperable_nodes:
+            return False
+        try:
+            successors = adjacency[node]
+        except KeyError:
+            # order the successors based on the order in the derive method;
+            # this allows the class to define the best path through the
+            # dependency tree.
+            successors = adjacency[node] = [
+                name for name, _ in sorted(di_graph[node].items(),
+                                           key=_edge_order)]
+        path.append(node)
+        on_path.add(node)
+        stack.append([node, iter(successors), set(), circular[0]])
+        return None
+
+    available = visit(root)
+    while stack:
+        frame = stack[-1]
+        node, successors, layer, circular_before = frame
+        for dependency in successors:
+            available = visit(dependency)
+            if available is None:
+                break  # search the dependency's successors first
+            if available:
                 layer.add(dependency)
-            # each time traverse_tree returns, remove node from visited path
-            path.pop()
-
-        if node_mgr.operational(node, layer):
-            # node will work at this level with the available dependencies
-            active_nodes.add(node)
-            ordering.append(node)
-
-            if node not in node_mgr.hdf_keys:
-                tree_path.append(list(path))
-            return True  # layer below works
         else:
-            # node will not work with available dependencies
-            tree_path.append(list(path) + ['NOT OPERATIONAL',])
-            return False
+            if node_mgr.operational(node, layer):
+                # node will work at this level with the available dependencies
+                active_nodes.add(node)
+                ordering.append(node)
+                if record_tree_path and node not in node_mgr.hdf_keys:
+                    tree_path.append(list(path))
+                available = True  # layer below works
+            else:
+                # node will not work with available dependencies
+                if record_tree_path:
+                    tree_path.append(path + ['NOT OPERATIONAL'])
+                elif circular[0] == circular_before:
+                    inoperable_nodes.add(node)
+                available = False
+            stack.pop()
+            path.pop()
+            on_path.discard(node)
+            if available and stack:
+                stack[-1][2].add(node)
 
-    ordering = []
-    path = deque()  # current branch path
-    active_nodes = set()  # operational nodes visited for fast lookup
-    path_start_param = []#set()
-    path_start_kpv = []#set()
-    tree_path = [] # For viewing the tree in which nodes are add to path
-    traverse_tree(root)  # start recursion
     return ordering, tree_path
 
 
@@ -346,7 +409,7 @@ def graph_adjacencies(graph):
     data = []
     for n,nbrdict in graph.adjacency_iter():
         # build the dict for this node
-        d = dict(id=n, name=graph.node[n].get('label', n), data=graph.node[n])
+        d = dict(id=n, name=graph.nodes[n].get('label', n), data=graph.nodes[n])
         adj = []
         for nbr, nbrd in nbrdict.items():
             adj.append(dict(nodeTo=nbr, data=nbrd))
@@ -366,7 +429,9 @@ def graph_nodes(node_mgr):
     # (limitation of add_node_attribute())
     gr_all.add_nodes_from(node_mgr.hdf_keys, color='#72f4eb', # turquoise
                           node_type='HDFNode')
-    derived_minus_lfl = dict_filter(node_mgr.derived_nodes,
+    # OPT: Describe nodes from the node registry where available rather than
+    # importing their modules.
+    derived_minus_lfl = dict_filter(node_records(node_mgr.derived_nodes),
                                     remove=node_mgr.hdf_keys)
     # Group into node types to apply colour. TODO: Make colours less garish.
     colors = {
@@ -378,27 +443,28 @@ def graph_nodes(node_mgr):
         KeyPointValueNode: '#bed630',  # fds-green
         KeyTimeInstanceNode: '#fdbb30',  # fds-orange
     }
+    colors = {base.__name__: color for base, color in colors.items()}
     derived_nodes = []
-    for name, node in derived_minus_lfl.items():
+    for name, record in derived_minus_lfl.items():
         # the default is gray, if you see it, something is wrong
         color = '#888888'
-        for base in node.__bases__:
+        for base in record['bases']:
             if base in colors:
                 color = colors[base]
                 break
 
         node_info = (name, {'color': color,
-                            'node_type': node.__base__.__name__})
+                            'node_type': record['node_type']})
         derived_nodes.append(node_info)
     gr_all.add_nodes_from(derived_nodes)
 
     # build list of dependencies
     derived_deps = set()  # list of derived dependencies
-    for node_name, node_obj in six.iteritems(derived_minus_lfl):
-        derived_deps.update(node_obj.get_dependency_names())
+    for node_name, record in six.iteritems(derived_minus_lfl):
+        derived_deps.update(record['dependencies'])
         # Create edges between node and its dependencies
         edges = []
-        for (n, dep) in enumerate(node_obj.get_dependency_names()):
+        for (n, dep) in enumerate(record['dependencies']):
             edges.append((node_name, dep, {'order':n}))
         gr_all.add_edges_from(edges)
 
@@ -461,13 +527,15 @@ def process_order(gr_all, node_mgr, raise_inoperable_requested=False,
     :returns:
     :rtype:
     """
-    process_order, tree_path = dependencies3(gr_all, 'root', node_mgr, raise_cir_dep=raise_cir_dep)
+    process_order, tree_path = dependencies3(
+        gr_all, 'root', node_mgr, raise_cir_dep=raise_cir_dep,
+        record_tree_path=bool(path_tree_file) or None)
     logger.debug("Processing order of %d nodes is: %s", len(process_order), process_order)
     if path_tree_file:
         ordered_tree_to_file(tree_path, name=path_tree_file)
     for n, node in enumerate(process_order):
-        gr_all.node[node]['label'] = '%d: %s' % (n, node)
-        gr_all.node[node]['active'] = True
+        gr_all.nodes[node]['label'] = '%d: %s' % (n, node)
+        gr_all.nodes[node]['active'] = True
 
     inactive_nodes = set(gr_all.nodes()) - set(process_order)
     logger.debug("Inactive nodes: %s", list(sorted(inactive_nodes)))
@@ -476,8 +544,8 @@ def process_order(gr_all, node_mgr, raise_inoperable_requested=False,
 
     for node in inactive_nodes:
         # add attributes to the node to reflect it's inactivity
-        gr_all.node[node]['color'] = '#c0c0c0'  # silver
-        gr_all.node[node]['active'] = False
+        gr_all.nodes[node]['color'] = '#c0c0c0'  # silver
+        gr_all.nodes[node]['active'] = False
         inactive_edges = gr_all.in_edges(node)
         gr_all.add_edges_from(inactive_edges, color='#c0c0c0')  # silver
 
@@ -518,7 +586,187 @@ def remove_floating_nodes(graph):
     return graph
 
 
-def dependency_order(node_mgr, draw=not_windows,
+def can_operate_attribute_names(node):
+    '''
+    :param node: Derived node class.
+    :type node: class
+    :returns: Names of the Attributes passed into the node's can_operate method.
+    :rtype: tuple of str
+    '''
+    return tuple(d.name for d in node.get_can_operate_defaults()
+                 if isinstance(d, Attribute))
+
+
+def describe_node(node):
+    '''
+    Describe a derived node so that its dependencies can be resolved without
+    the node class, as stored within a node registry (see
+    utils.get_node_registry).
+
+    :param node: Derived node class.
+    :type node: class
+    :returns: Module and name of the class, first line of its derive method,
+        node type and base class names, dependency names and the names of the
+        Attributes passed into its can_operate method.
+    :rtype: dict
+    '''
+    node_cls = node if isinstance(node, type) else type(node)
+    derive = getattr(node.derive, '__func__', node.derive)
+    return {
+        'module': node_cls.__module__,
+        'class': node_cls.__name__,
+        'line': six.get_function_code(derive).co_firstlineno,
+        'node_type': node.__base__.__name__,
+        'bases': [base.__name__ for base in node.__bases__],
+        'dependencies': list(node.get_dependency_names()),
+        'can_operate_attributes': list(can_operate_attribute_names(node)),
+    }
+
+
+def node_records(derived_nodes):
+    '''
+    :param derived_nodes: Node names to derived node classes, or registered
+        nodes with records describing them (see utils.RegisteredNodes).
+    :type derived_nodes: dict
+    :returns: Description of each derived node (see describe_node).
+    :rtype: OrderedDict
+    '''
+    records = getattr(derived_nodes, 'records', None)
+    if records is None:
+        records = OrderedDict((name, describe_node(node)) for name, node
+                              in six.iteritems(derived_nodes))
+    return records
+
+
+def _module_version(module_name):
+    '''
+    :returns: Version of a node module from its __version__ and the
+              modification time of its source file.
+    :rtype: tuple
+    '''
+    module = sys.modules.get(module_name)
+    path = getattr(module, '__file__', None)
+    try:
+        mtime = os.path.getmtime(path) if path else None
+    except OSError:
+        mtime = None
+    return module_name, getattr(module, '__version__', None), mtime
+
+
+def _signature_value(value):
+    '''
+    Represent an attribute value consistently between processes so that it
+    may be hashed, e.g. dictionary keys are sorted.
+    '''
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%r: %s' % (k, _signature_value(v))
+                                  for k, v in sorted(value.items()))
+    elif isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(_signature_value(v) for v in value)
+    return repr(value)
+
+
+def dependency_signature(node_mgr):
+    '''
+    Create a signature of everything which determines the dependency order:
+    the valid parameter names, requested and required nodes, available
+    attributes and the values of those read by can_operate methods, and the
+    derived nodes and versions of the modules which define them.
+
+    Flights recorded with the same frame on the same aircraft type will
+    usually share a signature.
+
+    :param node_mgr:
+    :type node_mgr: NodeManager
+    :returns: Hex digest of the signature.
+    :rtype: str
+    '''
+    attributes = set(['HDF Duration'])
+    attributes.update(node_mgr.aircraft_info)
+    attributes.update(node_mgr.achieved_flight_record)
+    attributes.update(node_mgr.segment_info)
+
+    nodes = []
+    modules = set()
+    attribute_names = set()
+    for name, record in six.iteritems(node_records(node_mgr.derived_nodes)):
+        nodes.append((name, record['module'], record['class'],
+                      record['line']))
+        modules.add(record['module'])
+        attribute_names.update(record['can_operate_attributes'])
+    # Registered modules may not have been imported yet.
+    versions = getattr(node_mgr.derived_nodes, 'versions', {})
+
+    attribute_values = []
+    for name in sorted(attribute_names):
+        attribute = node_mgr.get_attribute(name)
+        value = attribute.value if attribute else None
+        attribute_values.append((name, _signature_value(value)))
+
+    signature = (
+        __version__,
+        sorted(node_mgr.hdf_keys),
+        sorted(node_mgr.requested),
+        sorted(node_mgr.required),
+        sorted(attributes),
+        attribute_values,
+        sorted(nodes),
+        sorted(versions.get(m) or _module_version(m) for m in modules),
+    )
+    return hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()
+
+
+def _load_dependency_order(signature):
+    '''
+    :returns: Cached processing order and spanning tree or None.
+    :rtype: (list of str, nx.DiGraph) or None
+    '''
+    cached = _dependency_order_cache.pop(signature, None)
+    if cached is None and settings.DEPENDENCY_ORDER_CACHE_DIR:
+        path = os.path.join(settings.DEPENDENCY_ORDER_CACHE_DIR,
+                            '%s.pickle' % signature)
+        if os.path.isfile(path):
+            try:
+                with open(path, 'rb') as fh:
+                    cached = cPickle.load(fh)
+            except Exception:
+                logger.warning("Could not load dependency order from '%s'.",
+                               path)
+    if cached is not None:
+        _store_dependency_order(signature, cached, write=False)
+    return cached
+
+
+def _store_dependency_order(signature, cached, write=True):
+    '''
+    Store the processing order and spanning tree in memory, evicting the least
+    recently used, and optionally pickle them within the cache directory.
+    '''
+    _dependency_order_cache[signature] = cached
+    while len(_dependency_order_cache) > settings.DEPENDENCY_ORDER_CACHE_SIZE:
+        _dependency_order_cache.popitem(last=False)
+    if not write or not settings.DEPENDENCY_ORDER_CACHE_DIR:
+        return
+    path = os.path.join(settings.DEPENDENCY_ORDER_CACHE_DIR,
+                        '%s.pickle' % signature)
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(temp_path, 'wb') as fh:
+            cPickle.dump(cached, fh, protocol=cPickle.HIGHEST_PROTOCOL)
+        # Rename so that other processes never read a partial file.
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        logger.warning("Could not store dependency order in '%s'.", path)
+
+
+def clear_dependency_order_cache():
+    '''
+    Clear dependency orders cached in memory.
+    '''
+    _dependency_order_cache.clear()
+
+
+def dependency_order(node_mgr, draw=False,
                      raise_inoperable_requested=False, raise_cir_dep=False,
                      path_tree_file=None):
     """
@@ -526,16 +774,39 @@ def dependency_order(node_mgr, draw=not_windows,
 
     :param node_mgr:
     :type node_mgr: NodeManager
-    :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order.
+    :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order. Drawing requires the full graph so the cache is not used.
     :type draw: boolean
     :returns: List of Nodes determining the order for processing and the spanning tree graph.
     :rtype: (list of strings, dict)
+
+    When settings.DEPENDENCY_ORDER_CACHE is enabled, the order and spanning
+    tree are cached by dependency_signature unless drawing, raising on
+    circular dependencies or writing the tree path. The cached spanning tree
+    is shared between flights and must not be modified.
     """
+    use_cache = (settings.DEPENDENCY_ORDER_CACHE and not draw and
+                 not raise_cir_dep and not path_tree_file)
+    if use_cache:
+        signature = dependency_signature(node_mgr)
+        cached = _load_dependency_order(signature)
+        if cached is not None:
+            order, gr_st = cached
+            inoperable_requested = set(node_mgr.requested) - set(order)
+            if inoperable_requested:
+                logger.warning("Found %s inoperable requested parameters.",
+                               len(inoperable_requested))
+                if raise_inoperable_requested:
+                    raise InoperableDependencies(list(inoperable_requested))
+            return list(order), gr_st
+
     _graph = graph_nodes(node_mgr)
     gr_all, gr_st, order = process_order(_graph, node_mgr,
                                          raise_inoperable_requested=raise_inoperable_requested,
                                          raise_cir_dep=raise_cir_dep, path_tree_file=path_tree_file)
 
+    if use_cache:
+        _store_dependency_order(signature, (list(order), gr_st))
+
     if draw:
         from json import dumps
         logger.info("JSON Graph Representation:\n%s", dumps(graph_adjacencies(gr_st), indent=2))
@@ -0,0 +1,153 @@
+'''
+Kernels for sequential algorithms which carry state from one sample to the
+next and so cannot be expressed as whole array operations.
+
+Each kernel is a plain Python loop which writes its result into a
+preallocated output sequence:
+
+    @kernel
+    def running_max(values, out):
+        ...
+
+    result = running_max(array)
+
+When KERNEL_ACCELERATION is enabled and numba is installed the kernel is
+compiled with numba.njit and called with float64 arrays. Otherwise the loop
+runs in Python over lists of floats, which avoids the cost of indexing numpy
+arrays one sample at a time. Both paths perform the same float64 arithmetic
+and so return exactly the same results.
+'''
+import logging
+import threading
+
+import numpy as np
+
+from analysis_engine.settings import KERNEL_ACCELERATION
+
+
+logger = logging.getLogger(name=__name__)
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+class Kernel(object):
+    '''
+    A sequential kernel compiled on first use when acceleration is available.
+    '''
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        self._compiled = None
+        self._compile_failed = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+    def compiled(self):
+        '''
+        :returns: The kernel compiled with numba or None if acceleration is
+            disabled, numba is not installed or compiling failed.
+        :rtype: callable or None
+        '''
+        if not KERNEL_ACCELERATION or numba is None or self._compile_failed:
+            return None
+        with self._lock:
+            if self._compiled is None and not self._compile_failed:
+                try:
+                    self._compiled = numba.njit(self.func)
+                except Exception:
+                    logger.exception("Unable to compile kernel '%s'.",
+                                     self.name)
+                    self._compile_failed = True
+        return self._compiled
+
+    def __call__(self, values, *args, **kwargs):
+        '''
+        Array arguments, including values, are converted to float64.
+
+        :param values: Input samples.
+        :type values: np.ndarray
+        :param accelerate: Use the compiled kernel when available (default
+            True).
+        :type accelerate: bool
+        :returns: Output of the kernel for each sample.
+        :rtype: np.ndarray of float64
+        '''
+        values = np.asarray(values, dtype=np.float64)
+        compiled = self.compiled() if kwargs.get('accelerate', True) else None
+        if compiled is not None:
+            out = np.empty(len(values))
+            arrays = [np.ascontiguousarray(a, dtype=np.float64)
+                      if isinstance(a, np.ndarray) else a for a in args]
+            try:
+                compiled(np.ascontiguousarray(values), out, *arrays)
+                return out
+            except Exception:
+                # Typing errors are only raised on the first call with each
+                # combination of argument types.
+                logger.exception("Compiled kernel '%s' failed, falling back "
+                                 "to Python.", self.name)
+                self._compile_failed = True
+        out = [0.0] * len(values)
+        args = [np.asarray(a, dtype=np.float64).tolist()
+                if isinstance(a, np.ndarray) else a for a in args]
+        self.func(values.tolist(), out, *args)
+        return np.array(out)
+
+
+def kernel(func):
+    '''
+    Decorator creating a Kernel from a function of (values, out, *args).
+    '''
+    return Kernel(func)
+
+
+##############################################################################
+# Kernels
+
+
+@kernel
+def hysteresis_pass(values, out, quarter_range):
+    '''
+    Follow values, only moving once they are more than quarter_range away.
+
+    :param values: Input samples, all unmasked.
+    :param out: Output of each sample.
+    :param quarter_range: Distance values may move without being followed.
+    '''
+    old = values[0]
+    for index in range(len(values)):
+        new = values[index]
+        if new - old > quarter_range:
+            old = new - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        out[index] = old
+
+
+@kernel
+def window_clip(values, out, lower, upper, restart):
+    '''
+    Clip the previous output between the lower and upper bounds of each
+    sample, restarting from the sample value where restart is set.
+
+    :param values: Input samples, only used where restart is set.
+    :param out: Output of each sample.
+    :param lower: Lower bound of each sample.
+    :param upper: Upper bound of each sample.
+    :param restart: Non-zero where the output restarts from the sample value.
+    '''
+    last = 0.0
+    for index in range(len(values)):
+        if restart[index]:
+            last = values[index]
+        if lower[index] > last:
+            last = lower[index]
+        if upper[index] < last:
+            last = upper[index]
+        out[index] = last
@@ -62,6 +62,7 @@ from analysis_engine.library import (ambiguous_runway,
                                      hysteresis,
                                      ils_established,
                                      index_at_value,
+                                     index_at_values,
                                      index_of_first_start,
                                      index_of_last_stop,
                                      integrate,
@@ -73,7 +74,7 @@ from analysis_engine.library import (ambiguous_runway,
                                      mask_outside_slices,
                                      max_abs_value,
                                      max_continuous_unmasked,
-                                     max_maintained_value,
+                                     max_maintained_values,
                                      max_value,
                                      median_value,
                                      min_value,
@@ -3904,8 +3905,7 @@ class AirspeedWithGearDownMax(KeyPointValueNode):
                gear=M('Gear Down'),
                airs=S('Airborne')):
 
-        gear.array[gear.array != 'Down'] = np.ma.masked
-        gear_downs = np.ma.clump_unmasked(gear.array)
+        gear_downs = runs_of_ones(gear.array == 'Down')
         self.create_kpv_from_slices(
             air_spd.array, slices_and(airs.get_slices(), gear_downs), max_value)
 
@@ -5714,8 +5714,7 @@ class AltitudeWithGearDownMax(KeyPointValueNode):
                gear=M('Gear Down'),
                airs=S('Airborne')):
 
-        gear.array[gear.array != 'Down'] = np.ma.masked
-        gear_downs = np.ma.clump_unmasked(gear.array)
+        gear_downs = runs_of_ones(gear.array == 'Down')
         self.create_kpv_from_slices(
             alt_aal.array, slices_and(airs.get_slices(), gear_downs),
             max_value)
@@ -5738,8 +5737,7 @@ class AltitudeSTDWithGearDownMax(KeyPointValueNode):
         just the altitude above the airfield (already covered by
         "Altitude With Gear Down Max")
         '''
-        gear.array[gear.array != 'Down'] = np.ma.masked
-        gear_downs = np.ma.clump_unmasked(gear.array)
+        gear_downs = runs_of_ones(gear.array == 'Down')
         self.create_kpv_from_slices(
             alt_std.array, slices_and(airs.get_slices(), gear_downs),
             max_value)
@@ -8852,8 +8850,7 @@ class MachWithGearDownMax(KeyPointValueNode):
                gear=M('Gear Down'),
                airs=S('Airborne')):
 
-        gear.array[gear.array != 'Down'] = np.ma.masked
-        gear_downs = np.ma.clump_unmasked(gear.array)
+        gear_downs = runs_of_ones(gear.array == 'Down')
         self.create_kpv_from_slices(
             mach.array, slices_and(airs.get_slices(), gear_downs),
             max_value)
@@ -10181,13 +10178,12 @@ class EngGasTempMaxDuringTakeoffMaxMaintained(KeyPointValueNode):
         else:
             t_slices= takeoffs.get_slices()
 
-        for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-            for takeoff in t_slices:
-                arrays = eng_egt_max.array[takeoff]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, samples, hz, takeoff)
-                    if index is not None and value is not None:
-                        self.create_kpv(index, value, durations=duration)
+        results = max_maintained_values(eng_egt_max.array, seconds, hz,
+                                        t_slices)
+        for n, duration in enumerate(self.NAME_VALUES['durations']):
+            for index, value in (r[n] for r in results):
+                if index is not None and value is not None:
+                    self.create_kpv(index, value, durations=duration)
 
 
 class EngGasTempDuringEngStartMax(KeyPointValueNode):
@@ -16149,10 +16145,11 @@ class VerticalSpeedAtAltitude(KeyPointValueNode):
 
     def derive(self, vert_spd=P('Vertical Speed'), alt_agl=P('Altitude AGL'),
                approaches=S('Approach')):
+        altitudes = self.NAME_VALUES['altitude']
         for approach in approaches:
-            for altitude in self.NAME_VALUES['altitude']:
-                index = index_at_value(alt_agl.array, altitude,
-                                       approach.slice, 'nearest')
+            indices = index_at_values(alt_agl.array, altitudes,
+                                      approach.slice, 'nearest')
+            for altitude, index in zip(altitudes, indices):
                 if not index:
                     continue
                 value = value_at_index(vert_spd.array, index)
@@ -18969,9 +18966,10 @@ class WindSpeedAtAltitudeDuringDescent(KeyPointValueNode):
           wrong although is arithmetically "correct".
         '''
 
+        altitudes = self.NAME_VALUES['altitude']
         for descent in alt_aal.slices_from_to(2100, 0):
-            for altitude in self.NAME_VALUES['altitude']:
-                index = index_at_value(alt_aal.array, altitude, descent)
+            indices = index_at_values(alt_aal.array, altitudes, descent)
+            for altitude, index in zip(altitudes, indices):
                 if not index:
                     continue
                 value = value_at_index(wind_spd.array, index)
@@ -18992,9 +18990,10 @@ class WindDirectionAtAltitudeDuringDescent(KeyPointValueNode):
                alt_aal=P('Altitude AAL For Flight Phases'),
                wind_dir=P('Wind Direction Continuous')):
 
+        altitudes = self.NAME_VALUES['altitude']
         for descent in alt_aal.slices_from_to(2100, 0):
-            for altitude in self.NAME_VALUES['altitude']:
-                index = index_at_value(alt_aal.array, altitude, descent)
+            indices = index_at_values(alt_aal.array, altitudes, descent)
+            for altitude, index in zip(altitudes, indices):
                 if not index:
                     continue
                 # Check direction not masked before using % 360:
@@ -19896,23 +19895,18 @@ class EngNpMaxDuringTakeoff(KeyPointValueNode):
                takeoffs=S('Takeoff 5 Min Rating'),
                go_arounds=S('Go Around 5 Min Rating')):
         hz = eng_np_max.frequency
-        for duration in self.NAME_VALUES['seconds']:
-            for takeoff in takeoffs.get_slices():
-                arrays = eng_np_max.array[takeoff]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, duration, hz, takeoff)
+        seconds = self.NAME_VALUES['seconds']
+        phases = [takeoffs.get_slices()]
+        if go_arounds:
+            phases.append(go_arounds.get_slices())
+        for slices in phases:
+            results = max_maintained_values(eng_np_max.array, seconds, hz,
+                                            slices)
+            for n, duration in enumerate(seconds):
+                for index, value in (r[n] for r in results):
                     if index is not None and value is not None:
                         self.create_kpv(index, value, seconds=duration)
 
-        if go_arounds: 
-            for duration in self.NAME_VALUES['seconds']:
-                for go_around in go_arounds.get_slices():
-                    arrays = eng_np_max.array[go_around]
-                    if len(arrays) > 0:
-                        index, value = max_maintained_value(arrays, duration, hz, go_around)
-                        if index is not None and value is not None:
-                            self.create_kpv(index, value, seconds=duration)
-
 
 class EngTorqueMaxDuringTakeoff(KeyPointValueNode):
     '''
@@ -19934,21 +19928,16 @@ class EngTorqueMaxDuringTakeoff(KeyPointValueNode):
                go_arounds=S('Go Around 5 Min Rating')):
         hz = eng_torq_max.frequency
         seconds = np.array([10, 20, 300])
-        for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-            for takeoff in takeoffs.get_slices():
-                arrays = eng_torq_max.array[takeoff]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, samples, hz, takeoff)
+        phases = [takeoffs.get_slices()]
+        if go_arounds:
+            phases.append(go_arounds.get_slices())
+        for slices in phases:
+            results = max_maintained_values(eng_torq_max.array, seconds, hz,
+                                            slices)
+            for n, duration in enumerate(self.NAME_VALUES['durations']):
+                for index, value in (r[n] for r in results):
                     if index is not None and value is not None:
                         self.create_kpv(index, value, durations=duration)
-        if go_arounds:
-            for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-                for go_around in go_arounds.get_slices():
-                    arrays = eng_torq_max.array[go_around]
-                    if len(arrays) > 0:
-                        index, value = max_maintained_value(arrays, samples, hz, go_around)
-                        if index is not None and value is not None:
-                            self.create_kpv(index, value, durations=duration)
 
 
 class EngTorqueMaxDuringMaximumContinuousPower(KeyPointValueNode):
@@ -19970,13 +19959,12 @@ class EngTorqueMaxDuringMaximumContinuousPower(KeyPointValueNode):
                ratings=S('Maximum Continuous Power')):
         hz = eng_torq_max.frequency
         seconds = np.array([10, 20, 300, 600])
-        for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-            for mcp in ratings.get_slices():
-                arrays = eng_torq_max.array[mcp]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, samples, hz, mcp)
-                    if index is not None and value is not None:
-                        self.create_kpv(index, value, durations=duration)
+        results = max_maintained_values(eng_torq_max.array, seconds, hz,
+                                        ratings.get_slices())
+        for n, duration in enumerate(self.NAME_VALUES['durations']):
+            for index, value in (r[n] for r in results):
+                if index is not None and value is not None:
+                    self.create_kpv(index, value, durations=duration)
 
 
 class EngN2DuringTakeoffForXSecMax(KeyPointValueNode):
@@ -19998,21 +19986,16 @@ class EngN2DuringTakeoffForXSecMax(KeyPointValueNode):
                go_arounds=S('Go Around 5 Min Rating')):
         
         seconds = np.array([10, 20, 300])
-        for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-            for takeoff in takeoffs.get_slices():
-                arrays = eng_n2_max.array[takeoff]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, samples, eng_n2_max.hz, takeoff)
+        phases = [takeoffs.get_slices()]
+        if go_arounds:
+            phases.append(go_arounds.get_slices())
+        for slices in phases:
+            results = max_maintained_values(eng_n2_max.array, seconds,
+                                            eng_n2_max.hz, slices)
+            for n, duration in enumerate(self.NAME_VALUES['durations']):
+                for index, value in (r[n] for r in results):
                     if index is not None and value is not None:
                         self.create_kpv(index, value, durations=duration)
-        if go_arounds:
-            for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-                for go_around in go_arounds.get_slices():
-                    arrays = eng_n2_max.array[go_around]
-                    if len(arrays) > 0:
-                        index, value = max_maintained_value(arrays, samples, eng_n2_max.hz, go_around)
-                        if index is not None and value is not None:
-                            self.create_kpv(index, value, durations=duration)
                             
                             
 class EngN2DuringMaximumContinuousPowerForXSecMax(KeyPointValueNode):
@@ -20034,10 +20017,9 @@ class EngN2DuringMaximumContinuousPowerForXSecMax(KeyPointValueNode):
                ratings=S('Maximum Continuous Power')):
         
         seconds = np.array([10, 20, 300, 600])
-        for samples, duration in zip(seconds, self.NAME_VALUES['durations']):
-            for mcp in ratings.get_slices():
-                arrays = eng_n2_max.array[mcp]
-                if len(arrays) > 0:
-                    index, value = max_maintained_value(arrays, samples, eng_n2_max.hz, mcp)
-                    if index is not None and value is not None:
-                        self.create_kpv(index, value, durations=duration)
+        results = max_maintained_values(eng_n2_max.array, seconds,
+                                        eng_n2_max.hz, ratings.get_slices())
+        for n, duration in enumerate(self.NAME_VALUES['durations']):
+            for index, value in (r[n] for r in results):
+                if index is not None and value is not None:
+                    self.create_kpv(index, value, durations=duration)
@@ -16,6 +16,7 @@ from analysis_engine.library import (
     hysteresis,
     index_at_distance,
     index_at_value,
+    index_at_values,
     is_index_within_slice,
     last_valid_sample,
     max_value,
@@ -1746,18 +1747,23 @@ class AltitudeWhenClimbing(KeyTimeInstanceNode):
 
         climbs = list(takeoff) + list(initial_climb) + list(climb)
         climb_slices = slices_remove_small_gaps([c.slice for c in climbs])
+        # Use height above airfield up to the transition altitude and standard
+        # altitudes above.
+        altitudes = self.NAME_VALUES['altitude']
+        alts = (
+            (alt_aal, [a for a in altitudes if a <= TRANSITION_ALTITUDE]),
+            (alt_std, [a for a in altitudes if a > TRANSITION_ALTITUDE]),
+        )
         for climb_slice in climb_slices:
-            for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is crossed)
-                # per climbing phase.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold, climb_slice)
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per climbing phase.
+            indices = {}
+            for alt, thresholds in alts:
+                if thresholds:
+                    indices.update(zip(thresholds, index_at_values(
+                        alt.array, thresholds, climb_slice)))
+            for alt_threshold in altitudes:
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -1772,22 +1778,25 @@ class AltitudeWhenDescending(KeyTimeInstanceNode):
     def derive(self, descending=S('Descent'),
                alt_aal=P('Altitude AAL'),
                alt_std=P('Altitude STD Smoothed')):
+        # Use height above airfield up to the transition altitude and standard
+        # altitudes above.
+        altitudes = self.NAME_VALUES['altitude']
+        alts = (
+            (alt_aal, [a for a in altitudes if a <= TRANSITION_ALTITUDE]),
+            (alt_std, [a for a in altitudes if a > TRANSITION_ALTITUDE]),
+        )
         for descend in descending:
-            for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is
-                # crossed) per descending phase. The altitude array is
-                # scanned backwards to make sure we trap the last instance at
-                # each height.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold,
-                                       slice(descend.slice.stop,
-                                             descend.slice.start, -1))
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per descending phase. The altitude array is scanned backwards
+            # to make sure we trap the last instance at each height.
+            indices = {}
+            for alt, thresholds in alts:
+                if thresholds:
+                    indices.update(zip(thresholds, index_at_values(
+                        alt.array, thresholds,
+                        slice(descend.slice.stop, descend.slice.start, -1))))
+            for alt_threshold in altitudes:
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -1823,11 +1832,12 @@ class AltitudeBeforeLevelFlightWhenClimbing(KeyTimeInstanceNode):
             else:
                 continue  # Must be following a descent
 
-            for height in self.NAME_VALUES['altitude']:
-                index = index_at_value(aal.array, level_height-height,
-                                       _slice=slice(climb_slice.stop,
-                                                    climb_slice.start,
-                                                    -1))
+            heights = self.NAME_VALUES['altitude']
+            indices = index_at_values(aal.array,
+                                      [level_height - h for h in heights],
+                                      _slice=slice(climb_slice.stop,
+                                                   climb_slice.start, -1))
+            for height, index in zip(heights, indices):
                 if index:
                     self.create_kti(index, replace_values={'altitude': height})
 
@@ -1863,11 +1873,12 @@ class AltitudeBeforeLevelFlightWhenDescending(KeyTimeInstanceNode):
             else:
                 continue  # Must be following a climb
 
-            for height in self.NAME_VALUES['altitude']:
-                index = index_at_value(aal.array, level_height+height,
-                                       _slice=slice(descent_slice.stop,
-                                                    descent_slice.start,
-                                                    -1))
+            heights = self.NAME_VALUES['altitude']
+            indices = index_at_values(aal.array,
+                                      [level_height + h for h in heights],
+                                      _slice=slice(descent_slice.stop,
+                                                   descent_slice.start, -1))
+            for height, index in zip(heights, indices):
                 if index:
                     self.create_kti(index, replace_values={'altitude': height})
 
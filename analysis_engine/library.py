@@ -10,13 +10,16 @@ import math
 import numpy as np
 import pytz
 import six
+import threading
 
+from bisect import bisect_left, bisect_right
 from collections import defaultdict, OrderedDict, namedtuple
 from copy import copy, deepcopy
 from datetime import datetime, timedelta
 from decimal import Decimal
 from hashlib import sha256
 from math import ceil, copysign, cos, floor, log, radians, sin, sqrt, pow
+from numbers import Integral
 from operator import attrgetter
 from scipy import interpolate as scipy_interpolate, optimize
 from scipy.ndimage import filters
@@ -32,7 +35,9 @@ from hdfaccess.parameter import MappedArray
 from flightdatautilities import aircrafttables as at, units as ut
 from flightdatautilities.geometry import cross_track_distance, great_circle_distance__haversine
 
+from analysis_engine.kernels import hysteresis_pass, window_clip
 from analysis_engine.settings import (
+    ALIGN_TABLE_CACHE_SIZE,
     BUMP_HALF_WIDTH,
     ILS_CAPTURE,
     ILS_CAPTURE_ROC,
@@ -53,6 +58,11 @@ deg2rad = radians(1.0)
 
 logger = logging.getLogger(name=__name__)
 
+# Alignment tables keyed by scaled sample rates, timing disparity and method
+# in least recently used order.
+_align_tables = OrderedDict()
+_align_tables_lock = threading.Lock()
+
 Value = namedtuple('Value', 'index value')
 
 
@@ -382,6 +392,105 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
         # No alignment is required, return the slave's array unchanged.
         return slave_array
 
+    plan = _align_plan(slave_frequency, slave_offset, master_frequency,
+                       master_offset, len(slave_array), interpolate)
+    method, ws, wm = plan[:3]
+    if method == 'step':
+        # step through slave taking the required samples
+        return slave_array[0::ws // wm]
+    slave_aligned = _align_data(slave_array.data, np.ma.getmask(slave_array),
+                                plan, _dtype)
+
+    if isinstance(original_array, MappedArray) or original_array.dtype.type is np.string_:
+        # return back to mapped array
+        slave_aligned = MappedArray(slave_aligned, values_mapping=mappings)
+
+    if original_array.dtype.type is np.string_:
+        # return back to string array
+        slave_aligned = mapped_array_to_string_array(slave_aligned)
+
+    return slave_aligned
+
+
+def align_many(params, master, interpolate=True):
+    '''
+    Align many parameters to the master. Parameters sharing a sample rate,
+    offset and type are aligned together in a single pass.
+
+    :param params: The parameters to be aligned to the master.
+    :type params: [Parameter objects]
+    :param master: The master parameter.
+    :type master: Parameter object
+    :param interpolate: Whether to interpolate parameters (multistates exempt)
+    :type interpolate: bool
+    :returns: Arrays of params aligned to master in the same order.
+    :rtype: [np.ma.array]
+    '''
+    groups = OrderedDict()
+    arrays = []
+    for index, param in enumerate(params):
+        array = param.array
+        mapped = isinstance(array, MappedArray)
+        if array.dtype.type is np.string_ or not len(array) or \
+           (param.frequency == master.frequency and
+            param.offset == master.offset):
+            # Trivial and string arrays are aligned alone.
+            key = index
+        else:
+            array = array.raw if mapped else straighten_parameter_array(param)
+            key = (param.frequency, param.offset, len(array), array.dtype,
+                   mapped)
+        arrays.append(array)
+        groups.setdefault(key, []).append(index)
+
+    aligned = [None] * len(params)
+    for key, indices in six.iteritems(groups):
+        if len(indices) == 1:
+            aligned[indices[0]] = align(params[indices[0]], master,
+                                        interpolate=interpolate)
+            continue
+        frequency, offset, length, dtype, mapped = key
+        plan = _align_plan(frequency, offset, master.frequency,
+                           master.offset, length,
+                           interpolate and not mapped)
+        if plan[0] == 'step':
+            # Stepping through each slave array is already a view.
+            for index in indices:
+                aligned[index] = align(params[index], master,
+                                       interpolate=interpolate)
+            continue
+        # OPT: Stack the group into a 2-D buffer so that the data and masks
+        # of all parameters are gathered and interpolated together.
+        data = np.empty((len(indices), length), dtype=dtype)
+        mask = np.empty((len(indices), length), dtype=bool)
+        for row, index in enumerate(indices):
+            data[row] = arrays[index].data
+            mask[row] = np.ma.getmaskarray(arrays[index])
+        group_aligned = _align_data(data, mask, plan,
+                                    dtype if mapped else float)
+        for row, index in enumerate(indices):
+            param = params[index]
+            array = group_aligned[row]
+            if mapped:
+                array = MappedArray(
+                    array, values_mapping=param.array.values_mapping)
+            aligned[index] = wrap_array(param.name, array)
+    return aligned
+
+
+def _align_plan(slave_frequency, slave_offset, master_frequency,
+                master_offset, length, interpolate):
+    '''
+    Check the sample rates and offsets may be aligned and choose the method.
+
+    :param length: Number of samples within the slave array.
+    :type length: int
+    :raises ValueError: If the sample rates, offsets or length of the slave
+        array cannot be aligned.
+    :returns: Method, slave and master samples per period, timing disparity in
+        slave sample intervals and number of aligned samples.
+    :rtype: (str, int, int, int or float, int)
+    '''
     # Get the sample rates for the two parameters
     wm = master_frequency
     ws = slave_frequency
@@ -412,96 +521,204 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
     # Compute the sample rate ratio:
     r = wm / float(ws)
 
-    # Here we create a masked array to hold the returned values that will have
-    # the same sample rate and timing offset as the master
-    len_aligned = int(len(slave_array) * r)
-    if len_aligned != (len(slave_array) * r):
+    # The aligned array will have the same sample rate and timing offset as
+    # the master
+    len_aligned = int(length * r)
+    if len_aligned != (length * r):
         raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(len(slave_array) * r, dtype=_dtype)
-
     # Where offsets are equal, the slave_array recorded values remain
     # unchanged and interpolation is performed between these values.
     # - and we do not interpolate mapped arrays!
     if not delta and interpolate and (is_power2(slave_frequency) and
                                       is_power2(master_frequency)):
-        slave_aligned.mask = True
         if master_frequency > slave_frequency:
-            # populate values and interpolate
-            slave_aligned[0::r] = slave_array[0::1]
             # Interpolate and do not extrapolate masked ends or gaps
             # bigger than the duration between slave samples (i.e. where
-            # original slave data is masked).
-            # If array is fully masked, return array of masked zeros
-            dur_between_slave_samples = 1.0 / slave_frequency
-            return repair_mask(
-                slave_aligned,
-                frequency=master_frequency,
-                repair_duration=dur_between_slave_samples,
-                raise_entirely_masked=False,
-            )
-
+            # original slave data is masked) as repair_mask would.
+            method = 'repair'
         else:
-            # step through slave taking the required samples
-            return slave_array[0::1/r]
+            method = 'step'
+    elif interpolate:
+        method = 'interpolate'
+    else:
+        # Cunningly, if we are not interpolating (working with mapped arrays
+        # e.g. discrete or multi-state parameters), we gather the closest
+        # value in time to the master parameter.
+        method = 'nearest'
+    return method, int(ws), int(wm), delta, len_aligned
+
+
+def _align_data(slave_data, slave_mask, plan, dtype):
+    '''
+    Align slave data according to the plan returned by _align_plan.
+
+    :param slave_data: Slave data with samples along the last axis.
+    :type slave_data: np.ndarray
+    :param slave_mask: Slave mask of the same shape or nomask.
+    :type slave_mask: np.ndarray or np.ma.nomask
+    :param plan: Alignment plan returned by _align_plan.
+    :type plan: tuple
+    :param dtype: dtype of the aligned data.
+    :returns: Slave data aligned to master.
+    :rtype: np.ma.MaskedArray
+    '''
+    method, ws, wm, delta, len_aligned = plan
+    # OPT: Each sample within a period of the master parameter is derived
+    # from the same pair of slave samples within the corresponding period,
+    # so the offsets and weights of the pairs are computed once per
+    # combination of sample rates and timing disparity. Aligning is then a
+    # single gather from the slave array rather than a loop over each
+    # sample within the period.
+    starts, stops, weights = _align_table(ws, wm, delta, method)
+    shape = slave_data.shape[:-1] + (-1,)
+    length = slave_data.shape[-1]
+
+    # A sample is masked where either slave sample it is derived from is
+    # masked, including the ends outside of the slave timebase.
+    if slave_mask is np.ma.nomask and not length % ws:
+        # Only the ends outside of the slave timebase are masked.
+        mask = np.zeros(slave_data.shape[:-1] + (length // ws, wm),
+                        dtype=bool)
+        mask[..., 0, :] |= starts < ws
+        mask[..., -1, :] |= stops >= 2 * ws
+        mask = mask.reshape(shape)
+    else:
+        if slave_mask is np.ma.nomask:
+            slave_mask = np.zeros(slave_data.shape, dtype=bool)
+        mask = (_align_gather(slave_mask, starts, ws, True) |
+                _align_gather(slave_mask, stops, ws, True))
+        mask = mask.reshape(shape)[..., :len_aligned]
+
+    if method == 'nearest':
+        nearest = np.where(weights, stops, starts)
+        data = _align_gather(slave_data, nearest, ws, 0)
+        data = data.reshape(shape)[..., :len_aligned].astype(dtype)
+    elif method == 'repair':
+        before = _align_gather(slave_data, starts, ws, 0).astype(np.float64)
+        after = _align_gather(slave_data, stops, ws, 0).astype(np.float64)
+        data = (before + (after - before) * weights)
+        data = data.reshape(shape)[..., :len_aligned]
+    else:
+        # Arithmetic is performed at the precision of the slave array.
+        _dtype = np.result_type(slave_data, 1.0)
+        data = ((1 - weights).astype(_dtype) *
+                _align_gather(slave_data, starts, ws, 0) +
+                weights.astype(_dtype) *
+                _align_gather(slave_data, stops, ws, 0))
+        data = data.reshape(shape)[..., :len_aligned].astype(dtype)
+    # Treat ends and gaps as "padding"; Value of 0 and Masked.
+    data[mask] = 0
+    return np.ma.MaskedArray(data, mask=mask)
+
+
+def _align_gather(array, offsets, ws, fill):
+    '''
+    Gather samples at offsets within windows of three periods of the array
+    starting from the period before each period. Samples outside of the
+    array are the fill value.
+
+    :param array: Slave data or mask with samples along the last axis.
+    :type array: np.ndarray
+    :param offsets: Offsets of samples within each window.
+    :type offsets: np.ndarray
+    :param ws: Samples per period.
+    :type ws: int
+    :param fill: Value of samples outside of the array.
+    :returns: Samples gathered from each period.
+    :rtype: np.ndarray of shape array.shape[:-1] + (periods, len(offsets))
+    '''
+    length = array.shape[-1]
+    outer = array.shape[:-1]
+    periods = -(-length // ws)
+    if periods < 3 or length % ws:
+        # Pad short arrays and those not ending on a period boundary.
+        padded = np.full(outer + ((periods + 2) * ws,), fill,
+                         dtype=array.dtype)
+        padded[..., ws:ws + length] = array
+        stride = padded.strides[-1]
+        windows = np.lib.stride_tricks.as_strided(
+            padded, shape=outer + (periods, 3 * ws),
+            strides=padded.strides[:-1] + (ws * stride, stride))
+        return windows[..., offsets]
+
+    # OPT: Interior periods are gathered from a view of the array, only
+    # the first and last periods are padded.
+    stride = array.strides[-1]
+    windows = np.lib.stride_tricks.as_strided(
+        array, shape=outer + (periods - 2, 3 * ws),
+        strides=array.strides[:-1] + (ws * stride, stride))
+    gathered = np.empty(outer + (periods, len(offsets)), dtype=array.dtype)
+    gathered[..., 1:-1, :] = windows[..., offsets]
+    padding = np.full(outer + (ws,), fill, dtype=array.dtype)
+    gathered[..., 0, :] = np.concatenate(
+        [padding, array[..., :2 * ws]], axis=-1)[..., offsets]
+    gathered[..., -1, :] = np.concatenate(
+        [array[..., -2 * ws:], padding], axis=-1)[..., offsets]
+    return gathered
+
+
+def _align_table(ws, wm, delta, method):
+    '''
+    Offsets of the pair of slave samples each sample within a period of the
+    master parameter is derived from and the weight of the latter sample.
+    Offsets are relative to the start of the slave period before the
+    corresponding period.
+
+    Tables are cached as the same combinations of sample rates and offsets
+    are aligned many times while processing a flight.
+
+    :param ws: Slave samples per period.
+    :type ws: int
+    :param wm: Master samples per period.
+    :type wm: int
+    :param delta: Timing disparity in slave sample intervals.
+    :type delta: int or float
+    :param method: 'interpolate', 'nearest' or 'repair'.
+    :type method: str
+    :raises ValueError: If the timing disparity is too large to align.
+    :returns: Offsets of the earlier and later samples and the weights of the
+        later samples.
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    '''
+    key = (ws, wm, delta, method)
+    with _align_tables_lock:
+        table = _align_tables.pop(key, None)
+        if table is not None:
+            _align_tables[key] = table
+            return table
 
-    # Each sample in the master parameter may need different combination parameters
-    for i in range(int(wm)):
+    r = wm / float(ws)
+    starts = np.empty(wm, dtype=np.intp)
+    stops = np.empty(wm, dtype=np.intp)
+    weights = np.empty(wm, dtype=np.float64)
+    for i in range(wm):
         bracket = (i / r) + delta
         # Interpolate between the hth and (h+1)th samples of the slave array
         h = int(floor(bracket))
         h1 = h + 1
-
-        # Compute the linear interpolation coefficients, b & a
+        # Compute the linear interpolation coefficient of the latter sample.
         b = bracket - h
-
-        # Cunningly, if we are interpolating (working with mapped arrays e.g.
-        # discrete or multi-state parameters), by reverting to 1,0 or 0,1
-        # coefficients we gather the closest value in time to the master
-        # parameter.
-        if not interpolate:
-            b = round(b)
-
-        # Either way, a is the residual part.
-        a = 1 - b
-
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
-
-    if isinstance(original_array, MappedArray) or original_array.dtype.type is np.string_:
-        # return back to mapped array
-        mapped_array = MappedArray(np.ma.zeros(len(slave_aligned)).astype(_dtype), values_mapping=mappings)
-        mapped_array[:] = slave_aligned[:]
-        slave_aligned = mapped_array
-
-    if original_array.dtype.type is np.string_:
-        # return back to string array
-        slave_aligned = mapped_array_to_string_array(slave_aligned)
-
-    return slave_aligned
+        if method == 'nearest':
+            # By reverting to 1,0 or 0,1 coefficients we gather the closest
+            # value in time to the master parameter. Halves are rounded up
+            # as in Python 2.
+            b = floor(b + 0.5)
+        elif method == 'repair' and not b:
+            # Recorded slave values remain unchanged.
+            h1 = h
+        if h < -ws or h1 >= 2 * ws:
+            raise ValueError('Align called with excessive timing mismatch')
+        starts[i] = h + ws
+        stops[i] = h1 + ws
+        weights[i] = b
+    table = (starts, stops, weights)
+
+    with _align_tables_lock:
+        _align_tables[key] = table
+        while len(_align_tables) > ALIGN_TABLE_CACHE_SIZE:
+            _align_tables.popitem(last=False)
+    return table
 
 
 def align_slices(slave, master, slices):
@@ -2939,36 +3156,20 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
+    result = np.zeros(len(array))
 
     # get a list of the unmasked data - allow for array.mask = False (not an array)
     if array.mask is np.False_:
-        notmasked = np.arange(length+1)
+        notmasked = np.arange(len(array))
     else:
         notmasked = np.ma.where(~array.mask)[0]
-    # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
-
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
+    # OPT: Each pass is a sequential kernel compiled with numba when
+    # available. The starting point for the computation is the first notmasked
+    # sample.
+    half_done = hysteresis_pass(array.data[notmasked], quarter_range)
 
     # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    result[notmasked] = hysteresis_pass(half_done[::-1], quarter_range)[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
@@ -3450,6 +3651,357 @@ def pairwise(iterable):
     return zip(a, b)
 
 
+def discard_on_change(attribute):
+    '''
+    Class decorator for subclasses of list which sets attribute to None
+    whenever the list is changed, used to discard arrays built from the list.
+
+    :param attribute: Name of the attribute to discard.
+    :type attribute: str
+    :rtype: func
+    '''
+    def discarding(method):
+        def wrapper(self, *args, **kwargs):
+            setattr(self, attribute, None)
+            return method(self, *args, **kwargs)
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    def decorator(cls):
+        # __setslice__ and __delslice__ are only used by Python 2.
+        for name in ('__setitem__', '__delitem__', '__setslice__',
+                     '__delslice__', '__iadd__', '__imul__', 'append',
+                     'clear', 'extend', 'insert', 'pop', 'remove', 'reverse',
+                     'sort'):
+            if hasattr(list, name):
+                setattr(cls, name, discarding(getattr(cls, name)))
+        return cls
+    return decorator
+
+
+SliceBounds = namedtuple('SliceBounds',
+                         'starts stops start_values stop_values forward')
+
+
+@discard_on_change('_bounds')
+class SliceArray(list):
+    '''
+    A list of slices which also holds the start and stop of each slice in
+    arrays so that sets of slices can be combined without comparing every
+    pair of slices.
+
+    A SliceArray can be used wherever a list of slices is expected. The
+    arrays are created when first needed and discarded whenever the list is
+    changed. Starts of None are held as -inf and stops of None as inf.
+
+    The set operations treat each slice as a forward range of samples and
+    return a SliceArray of sorted slices which do not overlap. Slices which
+    only touch are not joined, matching slices_overlap. The bounds of the
+    result are the bounds of the input slices (or begin and end for
+    complement), so their values and types are unchanged.
+    '''
+    def __init__(self, slices=()):
+        super(SliceArray, self).__init__(slices)
+        self._bounds = None
+
+    @classmethod
+    def from_slices(cls, slices):
+        '''
+        :param slices: Slices, entries of None are dropped.
+        :type slices: [slice] or SliceArray
+        :rtype: SliceArray
+        '''
+        if isinstance(slices, cls):
+            return slices
+        return cls(s for s in slices if s is not None)
+
+    @classmethod
+    def from_bounds(cls, starts, stops):
+        '''
+        :param starts: Start of each slice.
+        :type starts: np.ndarray of int
+        :param stops: Stop of each slice.
+        :type stops: np.ndarray of int
+        :rtype: SliceArray
+        '''
+        # The arrays are only created if they are needed.
+        return cls(map(slice, starts.tolist(), stops.tolist()))
+
+    @classmethod
+    def _create(cls, slices, starts, stops, start_values, stop_values):
+        array = cls(slices)
+        array._bounds = SliceBounds(starts, stops, start_values, stop_values,
+                                    True)
+        return array
+
+    def get_bounds(self):
+        '''
+        :returns: Start and stop of each slice as float arrays, the original
+            start and stop values as object arrays and whether every slice
+            is forward with a step of None or 1.
+        :rtype: SliceBounds
+        '''
+        if self._bounds is None:
+            start_values = np.empty(len(self), dtype=object)
+            stop_values = np.empty(len(self), dtype=object)
+            start_values[:] = [s.start for s in self]
+            stop_values[:] = [s.stop for s in self]
+            starts = np.array([-np.inf if v is None else v
+                               for v in start_values], dtype=np.float64)
+            stops = np.array([np.inf if v is None else v
+                              for v in stop_values], dtype=np.float64)
+            forward = all(s.step is None or s.step == 1 for s in self)
+            self._bounds = SliceBounds(starts, stops, start_values,
+                                       stop_values, forward)
+        return self._bounds
+
+    @property
+    def starts(self):
+        return self.get_bounds().starts
+
+    @property
+    def stops(self):
+        return self.get_bounds().stops
+
+    def is_ordered(self):
+        '''
+        :returns: Whether the slices are non-empty forward ranges, sorted and
+            without overlaps.
+        :rtype: bool
+        '''
+        bounds = self.get_bounds()
+        return (bounds.forward and
+                bool(np.all(bounds.starts < bounds.stops)) and
+                bool(np.all(bounds.stops[:-1] <= bounds.starts[1:])))
+
+    def _ordered(self):
+        return self if self.is_ordered() else self.union()
+
+    def _items(self):
+        items = np.empty(len(self), dtype=object)
+        items[:] = self
+        return items
+
+    def union(self, *others):
+        '''
+        Merge overlapping slices of this and other lists of slices. Empty
+        slices are dropped and slices which are not merged are returned
+        unchanged.
+
+        :param others: Other lists of slices.
+        :type others: [slice] or SliceArray
+        :rtype: SliceArray
+        '''
+        arrays = [self] + [SliceArray.from_slices(o) for o in others]
+        bounds = [a.get_bounds() for a in arrays]
+        if not all(b.forward for b in bounds):
+            raise ValueError('SliceArray only supports forward slices.')
+        starts = np.concatenate([b.starts for b in bounds])
+        stops = np.concatenate([b.stops for b in bounds])
+        start_values = np.concatenate([b.start_values for b in bounds])
+        stop_values = np.concatenate([b.stop_values for b in bounds])
+        items = np.concatenate([a._items() for a in arrays])
+
+        keep = np.flatnonzero(starts < stops)
+        order = keep[np.argsort(starts[keep], kind='mergesort')]
+        starts, stops = starts[order], stops[order]
+        start_values, stop_values = start_values[order], stop_values[order]
+        items = items[order]
+        if not len(order):
+            return SliceArray()
+
+        # A slice starts a new group unless it starts before an earlier
+        # slice of the group stops.
+        reach = np.maximum.accumulate(stops)
+        first = np.ones(len(starts), dtype=bool)
+        first[1:] = starts[1:] >= reach[:-1]
+        firsts = np.flatnonzero(first)
+        lasts = np.append(firsts[1:], len(starts)) - 1
+        group = np.cumsum(first) - 1
+        group_stops = reach[lasts]
+        # The stop of each group is taken from its first slice reaching it.
+        reaching = np.flatnonzero(stops == group_stops[group])
+        stop_index = reaching[np.unique(group[reaching], return_index=True)[1]]
+
+        start_values = start_values[firsts]
+        stop_values = stop_values[stop_index]
+        slices = [items[f] if f == l else slice(start, stop)
+                  for f, l, start, stop in zip(firsts.tolist(), lasts.tolist(),
+                                               start_values, stop_values)]
+        return SliceArray._create(slices, starts[firsts], group_stops,
+                                  start_values, stop_values)
+
+    def intersection(self, other):
+        '''
+        Where the slices of this and another list overlap. Each overlapping
+        pair of slices gives a slice from the later start to the earlier
+        stop.
+
+        :param other: Other list of slices.
+        :type other: [slice] or SliceArray
+        :rtype: SliceArray
+        '''
+        first = self._ordered()
+        second = SliceArray.from_slices(other)._ordered()
+        a, b = first.get_bounds(), second.get_bounds()
+        # Slices of the second list which stop after each first slice starts
+        # and start before it stops.
+        lo = np.searchsorted(b.stops, a.starts, side='right')
+        hi = np.searchsorted(b.starts, a.stops, side='left')
+        counts = np.maximum(hi - lo, 0)
+        i = np.repeat(np.arange(len(first)), counts)
+        j = _section_indices(lo, counts)[0]
+
+        later = a.starts[i] >= b.starts[j]
+        earlier = a.stops[i] <= b.stops[j]
+        start_values = np.where(later, a.start_values[i], b.start_values[j])
+        stop_values = np.where(earlier, a.stop_values[i], b.stop_values[j])
+        slices = [slice(start, stop)
+                  for start, stop in zip(start_values, stop_values)]
+        return SliceArray._create(
+            slices, np.where(later, a.starts[i], b.starts[j]),
+            np.where(earlier, a.stops[i], b.stops[j]),
+            start_values, stop_values)
+
+    def complement(self, begin=None, end=None):
+        '''
+        Ranges between begin and end which are not within any slice.
+
+        :param begin: Start of the range, defaults to the first slice start.
+        :type begin: int or float
+        :param end: Stop of the range, defaults to the last slice stop.
+        :type end: int or float
+        :rtype: SliceArray
+        '''
+        ordered = self._ordered()
+        b = ordered.get_bounds()
+        if begin is None:
+            if not len(ordered):
+                return SliceArray()
+            begin = b.start_values[0]
+        if end is None:
+            if not len(ordered):
+                return SliceArray()
+            end = b.stop_values[-1]
+        lower = -np.inf if begin is None else begin
+        upper = np.inf if end is None else end
+
+        starts = np.append(lower, b.stops)
+        stops = np.append(b.starts, upper)
+        start_values = np.empty(len(starts), dtype=object)
+        stop_values = np.empty(len(stops), dtype=object)
+        start_values[0], start_values[1:] = begin, b.stop_values
+        stop_values[:-1], stop_values[-1] = b.start_values, end
+        # Gaps are clipped to the range.
+        before = starts < lower
+        after = stops > upper
+        starts[before], start_values[before] = lower, begin
+        stops[after], stop_values[after] = upper, end
+        keep = starts < stops
+        starts, stops = starts[keep], stops[keep]
+        start_values, stop_values = start_values[keep], stop_values[keep]
+        slices = [slice(start, stop)
+                  for start, stop in zip(start_values, stop_values)]
+        return SliceArray._create(slices, starts, stops, start_values,
+                                  stop_values)
+
+    def join_gaps(self, samples):
+        '''
+        Join slices separated by gaps shorter than samples.
+
+        :param samples: Gaps shorter than this are removed.
+        :type samples: int or float
+        :rtype: SliceArray
+        '''
+        ordered = self._ordered()
+        b = ordered.get_bounds()
+        if len(ordered) < 2:
+            return ordered
+        first = np.ones(len(ordered), dtype=bool)
+        first[1:] = b.starts[1:] - b.stops[:-1] >= samples
+        firsts = np.flatnonzero(first)
+        lasts = np.append(firsts[1:], len(ordered)) - 1
+        start_values = b.start_values[firsts]
+        stop_values = b.stop_values[lasts]
+        slices = [ordered[f] if f == l else slice(start, stop)
+                  for f, l, start, stop in zip(firsts.tolist(), lasts.tolist(),
+                                               start_values, stop_values)]
+        return SliceArray._create(slices, b.starts[firsts], b.stops[lasts],
+                                  start_values, stop_values)
+
+    def filter_length(self, length):
+        '''
+        :param length: Minimum length of slices.
+        :type length: int or float
+        :returns: Slices at least length samples long.
+        :rtype: SliceArray
+        '''
+        b = self.get_bounds()
+        keep = np.flatnonzero(b.stops - b.starts >= length)
+        slices = [self[k] for k in keep.tolist()]
+        if not b.forward:
+            return SliceArray(slices)
+        return SliceArray._create(slices, b.starts[keep], b.stops[keep],
+                                  b.start_values[keep], b.stop_values[keep])
+
+    def filter_duration(self, duration, frequency=1):
+        '''
+        :param duration: Minimum duration of slices in seconds.
+        :type duration: int or float
+        :param frequency: Frequency of slice start and stop.
+        :type frequency: int or float
+        :returns: Slices lasting at least duration.
+        :rtype: SliceArray
+        '''
+        return self.filter_length(duration * frequency)
+
+    def contains_index(self, index):
+        '''
+        :param index: Index or array of indices.
+        :type index: int or float or np.ndarray
+        :returns: Whether each index is within any of the slices.
+        :rtype: bool or np.ndarray of bool
+        '''
+        b = self._ordered().get_bounds()
+        index = np.asarray(index, dtype=np.float64)
+        k = np.searchsorted(b.starts, index, side='right') - 1
+        within = (k >= 0) & (index < np.append(b.stops, -np.inf)[k])
+        return bool(within) if within.ndim == 0 else within
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def __or__(self, other):
+        return self.union(other)
+
+
+def _as_slice_array(slices, ordered=False):
+    '''
+    Convert slices to a SliceArray when its set operations give the same
+    result as comparing pairs of slices: every slice is a non-empty forward
+    range starting from None or a non-negative index.
+
+    :param slices: Slices to convert.
+    :type slices: [slice]
+    :param ordered: Also require the slices to be sorted without overlaps.
+    :type ordered: bool
+    :returns: The slices or None if they cannot be converted.
+    :rtype: SliceArray or None
+    '''
+    if any(s is None for s in slices):
+        return None
+    array = SliceArray.from_slices(slices)
+    bounds = array.get_bounds()
+    starts, stops = bounds.starts, bounds.stops
+    # Pairwise comparisons treat a start of None as zero.
+    if not bounds.forward or np.any(np.isfinite(starts) & (starts < 0)) or \
+       not np.all(np.maximum(starts, 0) < stops):
+        return None
+    if ordered and not np.all(stops[:-1] <= starts[1:]):
+        return None
+    return array
+
+
 def is_index_within_slice(index, _slice):
     '''
     :type index: int or float
@@ -3483,6 +4035,9 @@ def is_index_within_slices(index, slices):
     :returns: whether index is within any of the slices.
     :rtype: bool
     '''
+    if isinstance(slices, SliceArray) and slices.get_bounds().forward:
+        # OPT: Search the sorted slices rather than checking each in turn.
+        return slices.contains_index(index)
     for _slice in slices:
         if is_index_within_slice(index, _slice):
             return True
@@ -3663,21 +4218,34 @@ def slices_overlap_merge(first_list, second_list, extend_stop=0):
     :param extend_stop: Increment at stop end of the resulting slices_above
     :type extend_stop: Integer
     '''
+    first = _as_slice_array(first_list)
+    second = _as_slice_array(second_list, ordered=True)
+    if first is not None and second is not None and len(second) and \
+       np.isfinite(np.concatenate([first.starts, first.stops,
+                                   second.starts, second.stops])).all():
+        # OPT: Search the sorted second list for the first slice which stops
+        # after each first slice starts rather than comparing every pair.
+        index = np.searchsorted(second.stops, first.starts, side='right')
+        index[index == len(second)] = 0
+        overlaps = (second.starts[index] < first.stops) & \
+            (first.starts < second.stops[index])
+        overlapping = [second[i] if overlap else None
+                       for i, overlap in zip(index.tolist(), overlaps.tolist())]
+    else:
+        overlapping = [next((s for s in second_list
+                             if slices_overlap(first_slice, s)), None)
+                       for first_slice in first_list]
+
     result_list = []
 
-    for first_slice in first_list:
-        overlap = False
-        for second_slice in second_list:
-            if slices_overlap(first_slice, second_slice):
-                overlap = True
-                result_list.append(slice(min(first_slice.start, second_slice.start),
-                                         max(first_slice.stop, second_slice.stop) + extend_stop))
-                break
-        if not overlap:
-            if extend_stop:
-                result_list.append(slice(first_slice.start, first_slice.stop + extend_stop))
-            else:
-                result_list.append(first_slice)
+    for first_slice, second_slice in zip(first_list, overlapping):
+        if second_slice is not None:
+            result_list.append(slice(min(first_slice.start, second_slice.start),
+                                     max(first_slice.stop, second_slice.stop) + extend_stop))
+        elif extend_stop:
+            result_list.append(slice(first_slice.start, first_slice.stop + extend_stop))
+        else:
+            result_list.append(first_slice)
 
     return result_list
 
@@ -3701,6 +4269,16 @@ def slices_and(first_list, second_list):
         else:
             return _slice
 
+    if not first_list or not second_list:
+        return []
+
+    # OPT: Sorted lists are intersected by SliceArray without comparing every
+    # pair of slices.
+    first = _as_slice_array([fwd(s) for s in first_list], ordered=True)
+    second = _as_slice_array([fwd(s) for s in second_list], ordered=True)
+    if first is not None and second is not None:
+        return first & second
+
     result_list = []
     for first_slice in first_list:
         for second_slice in second_list:
@@ -3777,6 +4355,15 @@ def slices_not(slice_list, begin_at=None, end_at=None):
     if end_at is not None and end_at > endpoint:
         endpoint = end_at
 
+    array = _as_slice_array(slice_list)
+    if array is not None and startpoint >= 0:
+        bounds = array.get_bounds()
+        if all(isinstance(v, Integral) for v in itertools.chain(
+                [startpoint, endpoint], bounds.start_values, bounds.stop_values)):
+            # OPT: Find the gaps between the sorted slices rather than marking
+            # every sample covered by a slice.
+            return array.complement(startpoint, endpoint)
+
     workspace = np.ma.zeros(endpoint)
     for each_slice in slice_list:
         workspace[each_slice] = 1
@@ -3785,6 +4372,54 @@ def slices_not(slice_list, begin_at=None, end_at=None):
 
 
 
+def _merge_slices_in_order(slices):
+    '''
+    Merge overlapping slices in the order given by slices_or: slices are
+    merged one at a time and a slice merged with an earlier slice moves to
+    the end of the list.
+
+    :param slices: Slices in the order they are merged.
+    :type slices: SliceArray
+    :returns: Merged slices, or None if a slice overlaps more than one
+        earlier merged slice as slices_or then merges them over more than
+        one pass.
+    :rtype: SliceArray or None
+    '''
+    bounds = slices.get_bounds()
+    # Merged slices sorted by start. As they do not overlap they are also
+    # sorted by stop.
+    starts = []
+    stops = []
+    merged = []
+    positions = []
+    for position, (_slice, start, stop) in enumerate(zip(
+            slices, bounds.starts.tolist(), bounds.stops.tolist())):
+        first = bisect_right(stops, start)
+        last = bisect_left(starts, stop)
+        if last - first > 1:
+            return None
+        elif last > first:
+            other = merged[first]
+            # None is the earliest start and the latest stop.
+            if _slice.start is None or other.start is None:
+                slice_start = None
+            else:
+                slice_start = min(_slice.start, other.start)
+            if _slice.stop is None or other.stop is None:
+                slice_stop = None
+            else:
+                slice_stop = max(_slice.stop, other.stop)
+            _slice = slice(slice_start, slice_stop)
+            start = min(start, starts[first])
+            stop = max(stop, stops[first])
+            del starts[first], stops[first], merged[first], positions[first]
+        starts.insert(first, start)
+        stops.insert(first, stop)
+        merged.insert(first, _slice)
+        positions.insert(first, position)
+    return SliceArray(merged[i] for i in np.argsort(positions))
+
+
 def slices_or(*slice_lists):
     '''
     Logical OR function for lists of slices.
@@ -3798,6 +4433,15 @@ def slices_or(*slice_lists):
     if all(len(s) == 0 or s == [None] for s in slice_lists):
         return slices
 
+    array = _as_slice_array([s for slice_list in slice_lists
+                             for s in slice_list if s is not None])
+    if array is not None:
+        # OPT: Bisect the merged slices for the slice each slice overlaps
+        # rather than comparing every pair of slices.
+        merged = _merge_slices_in_order(array)
+        if merged is not None:
+            return merged
+
     recheck = False
     for slice_list in slice_lists:
         for input_slice in slice_list:
@@ -3870,6 +4514,10 @@ def slices_remove_small_gaps(slice_list, time_limit=10, hz=1, count=None):
         return [slice(None, None, slice_list[0].step)]
 
     sample_limit = count if count is not None else time_limit * hz
+    array = _as_slice_array(slice_list, ordered=True)
+    if array is not None and np.isfinite(array.starts[0]):
+        # OPT: Sorted slices are joined without a loop over every slice.
+        return array.join_gaps(sample_limit)
     slice_list = sorted(slice_list, key=attrgetter('start'))
     new_list = [slice_list[0]]
     for each_slice in slice_list[1:]:
@@ -5694,52 +6342,84 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     else:
         repair_samples = None
 
-    masked_sections = np.ma.clump_masked(array)
+    # OPT: The masked sections are found and repaired together rather than
+    # looping over each section returned by np.ma.clump_masked.
+    edges = np.diff(np.concatenate(([0], array.mask.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    lengths = stops - starts
+
+    if repair_samples:
+        too_long = lengths > repair_samples
+        if raise_duration_exceedance and too_long.any():
+            length = lengths[too_long][0]
+            raise ValueError("Length of masked section '%s' exceeds "
+                             "repair duration '%s'." % (length * frequency,
+                                                        repair_duration))
+        # Too long to repair
+        starts = starts[~too_long]
+        stops = stops[~too_long]
+        lengths = lengths[~too_long]
+
+    at_start = starts == 0
+    at_end = stops == len(array)
+    interior = ~(at_start | at_end)
+    if interior.any() and method not in ('interpolate', 'fill_start',
+                                         'fill_stop'):
+        raise NotImplementedError('Repair method %s not implemented.',
+                                  method)
+
+    data = array.data
+    # Can't interpolate if we don't know the first or last sample.
+    fill_stop = interior if method == 'fill_stop' else np.zeros_like(interior)
+    fill_start = interior if method == 'fill_start' else np.zeros_like(interior)
+    if extrapolate or method == 'fill_stop':
+        fill_stop = fill_stop | at_start
+    if extrapolate or method == 'fill_start':
+        fill_start = fill_start | at_end
+
+    for repair, values in ((fill_stop, data[stops[fill_stop]]),
+                           (fill_start, data[starts[fill_start] - 1])):
+        index = _section_indices(starts[repair], lengths[repair])[0]
+        data[index] = np.repeat(values, lengths[repair])
+        array.mask[index] = False
+
+    if method == 'interpolate':
+        repair = interior.copy()
+        if repair_above is not None:
+            repair[interior] = \
+                (data[starts[interior] - 1] > repair_above) & \
+                (data[stops[interior]] > repair_above)
+        index, position = _section_indices(starts[repair], lengths[repair])
+        # Matches np.linspace(start_value, stop_value, length + 2)[1:-1],
+        # including the precision linspace computes at.
+        dtype = (data.dtype.type(0) * 1.0).dtype
+        start_values = data[starts[repair] - 1].astype(dtype)
+        steps = (data[stops[repair]].astype(dtype) - start_values) / \
+            (lengths[repair] + 1).astype(dtype)
+        data[index] = (position + 1).astype(dtype) * \
+            np.repeat(steps, lengths[repair]) + \
+            np.repeat(start_values, lengths[repair])
+        array.mask[index] = False
 
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples and length > repair_samples:
-            if raise_duration_exceedance:
-                raise ValueError("Length of masked section '%s' exceeds "
-                                 "repair duration '%s'." % (length * frequency,
-                                                            repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate or method == 'fill_stop':
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                array[section] = array[section.stop]
-            else:
-                continue # Can't interpolate if we don't know the first sample
+    return array
 
-        elif section.stop == len(array):
-            if extrapolate or method == 'fill_start':
-                array[section] = array[section.start - 1]
-            else:
-                continue # Can't interpolate if we don't know the last sample
 
-        else:
-            start_value = array[section.start - 1]
-            stop_value = array[section.stop]
-            if method == 'interpolate':
-                if (repair_above is None or
-                    (start_value > repair_above and stop_value > repair_above)):
-                    # XXX: Find neater solution, potentially
-                    # scipy.interpolate.InterpolatedUnivariateSpline, as
-                    # optimisation.
-                    array.data[section] = np.linspace(start_value, stop_value,
-                                                      length+2)[1:-1]
-                    array.mask[section] = False
-            elif method == 'fill_start':
-                array[section] = start_value
-            elif method == 'fill_stop':
-                array[section] = stop_value
-            else:
-                raise NotImplementedError('Repair method %s not implemented.',
-                                          method)
+def _section_indices(starts, lengths):
+    '''
+    Indices of every sample within sections of an array.
 
-    return array
+    :param starts: Start index of each section.
+    :type starts: np.ndarray
+    :param lengths: Number of samples within each section.
+    :type lengths: np.ndarray
+    :returns: Index of each sample within the array and its position within
+        its section.
+    :rtype: (np.ndarray, np.ndarray)
+    '''
+    position = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + position, position
 
 
 def resample(array, orig_hz, resample_hz):
@@ -5818,6 +6498,45 @@ def rms_noise(array, ignore_pc=None):
     return sqrt(np.ma.mean(np.ma.power(to_rms, 2))) # RMS in one line !
 
 
+def _run_bounds(flags):
+    '''
+    :param flags: Boolean array.
+    :type flags: np.ndarray of bool
+    :returns: Start and stop of each run of True.
+    :rtype: (np.ndarray of int, np.ndarray of int)
+    '''
+    edges = np.diff(np.concatenate(([False], flags, [False])).view(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def runs_of_ones_bounds(bits, min_samples=None):
+    '''
+    Start and stop of each run of ones as arrays, rather than a list of
+    slices, so that runs can be filtered and indexed without a Python loop.
+
+    :param bits: Array where runs of ones are found, masked values are not
+        ones.
+    :type bits: np.ma.masked_array or np.ndarray
+    :param min_samples: Only return runs longer than this many samples.
+    :type min_samples: int or None
+    :returns: Start and stop of each run. An empty array has a single empty
+        run at index 0 unless min_samples is given, as found by
+        np.ma.clump_unmasked.
+    :rtype: (np.ndarray of int, np.ndarray of int)
+    '''
+    if not len(bits) and not min_samples:
+        return np.zeros(1, dtype=int), np.zeros(1, dtype=int)
+    ones = np.ma.getdata(bits) == 1
+    mask = np.ma.getmask(bits)
+    if mask is not np.ma.nomask:
+        ones &= ~mask
+    starts, stops = _run_bounds(np.atleast_1d(ones))
+    if min_samples:
+        longer = stops - starts > min_samples
+        starts, stops = starts[longer], stops[longer]
+    return starts, stops
+
+
 def runs_of_ones(bits, min_samples=None):
     '''
     Q: This function used to have a min_len kwarg which was a result of its
@@ -5826,13 +6545,9 @@ def runs_of_ones(bits, min_samples=None):
     frequency rather than samples?
     TODO: Update to return Sections?
     :returns: S
-    :rtype: [slice]
+    :rtype: SliceArray
     '''
-    runs = np.ma.clump_unmasked(np.ma.masked_not_equal(bits, 1))
-    if min_samples:
-        runs = slices_remove_small_slices(runs, count=min_samples)
-
-    return runs
+    return SliceArray.from_bounds(*runs_of_ones_bounds(bits, min_samples))
 
 
 def slices_of_runs(array, min_samples=None, flat=False):
@@ -5851,12 +6566,41 @@ def slices_of_runs(array, min_samples=None, flat=False):
     :param flat: yield a flat list of unordered slices
     :type flat: bool
     '''
-    for value in np.ma.sort(np.ma.unique(array)):
-        if value is np.ma.masked:
-            continue
-        if hasattr(array, 'values_mapping'):
-            value = array.values_mapping[value]
-        runs = runs_of_ones(array == value, min_samples=min_samples)
+    values = [v for v in np.ma.sort(np.ma.unique(array))
+              if v is not np.ma.masked]
+    states = [array.values_mapping[v] for v in values] \
+        if hasattr(array, 'values_mapping') else values
+    # OPT: Find the runs of every value in one pass over the array rather
+    # than comparing the array with each value. States shared by several
+    # raw values are compared with each state instead.
+    by_value = len(set(states)) == len(states)
+    if by_value:
+        data = np.ma.getdata(array)
+        mask = np.ma.getmaskarray(array)
+        changes = np.flatnonzero((data[1:] != data[:-1]) |
+                                 (mask[1:] != mask[:-1])) + 1
+        starts = np.concatenate(([0], changes))
+        stops = np.concatenate((changes, [len(data)]))
+        unmasked = ~mask[starts] if len(data) else np.zeros(1, dtype=bool)
+        if min_samples:
+            unmasked &= stops - starts > min_samples
+        starts, stops = starts[unmasked], stops[unmasked]
+        order = np.argsort(data[starts], kind='mergesort')
+        starts, stops = starts[order], stops[order]
+        run_values = data[starts]
+
+    for value, state in zip(values, states):
+        if not by_value:
+            runs = runs_of_ones(array == state, min_samples=min_samples)
+        elif value != value:
+            # NaN is not equal to itself so has no runs.
+            runs = SliceArray()
+        else:
+            first = np.searchsorted(run_values, value, side='left')
+            last = np.searchsorted(run_values, value, side='right')
+            runs = SliceArray.from_bounds(starts[first:last],
+                                          stops[first:last])
+        value = state
         if flat:
             for run in runs:
                 yield run
@@ -7503,6 +8247,97 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     return (begin + step * (n + r))
 
 
+def index_at_values(array, thresholds, _slice=slice(None), endpoint='exact'):
+    '''
+    index_at_value for many thresholds, scanning the array once.
+
+    The first pair of samples in the scan to cross each threshold is found
+    from the running min and max of each unmasked section of the scan, as
+    the samples scanned so far have crossed every value between them.
+    Thresholds which are not crossed fall back to index_at_value for the
+    'closing' and 'nearest' endpoints.
+
+    :param array: input data
+    :type array: masked array
+    :param thresholds: the values that we expect the array to cross in this
+        slice.
+    :type thresholds: [float]
+    :param _slice: slice where we want to seek the threshold transits, with a
+        negative step to scan backwards.
+    :type _slice: slice
+    :param endpoint: type of end condition being sought, see index_at_value.
+    :type endpoint: str
+    :returns: interpolated time when the array values crossed each threshold
+        or None.
+    :rtype: [float or None]
+    '''
+    assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
+    step = _slice.step or 1
+    max_index = len(array)
+    # Arrange the limits of our scan as index_at_value.
+    if step == 1:
+        begin = max(int(round(_slice.start or 0)), 0)
+        end = min(int(round(_slice.stop or max_index)), max_index)
+        scan = slice(begin, end)
+    elif step == -1:
+        begin = min(int(round(_slice.start or max_index)), max_index-1)
+        end = max(int(_slice.stop or 0),0)
+        scan = slice(begin, end - 1 if end > 0 else None, -1)
+    else:
+        raise ValueError('Step length not 1 in index_at_value')
+
+    scanned = array[scan] if begin != end else array[:0]
+    data = np.ma.getdata(scanned)
+    if len(scanned) < 2 or \
+       (_slice.stop == _slice.start and _slice.start is not None) or \
+       np.isnan(data[~np.ma.getmaskarray(scanned)]).any():
+        # Edge cases are left to index_at_value, including how NaN values
+        # pass every threshold.
+        return [index_at_value(array, t, _slice=_slice, endpoint=endpoint)
+                for t in thresholds]
+
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    crossings = np.full(len(thresholds), -1)
+    for section in np.ma.clump_unmasked(scanned):
+        missing = np.flatnonzero(crossings < 0)
+        if not len(missing):
+            break
+        values = data[section]
+        if len(values) < 2:
+            continue
+        # The pairs up to and including pair n have passed through every
+        # value between the min and max of the first n + 2 samples.
+        above = thresholds[missing] >= values[0]
+        highest = np.maximum.accumulate(values)[1:]
+        lowest = np.minimum.accumulate(values)[1:]
+        pairs = np.where(
+            above,
+            np.searchsorted(highest, thresholds[missing], side='left'),
+            np.searchsorted(-lowest, -thresholds[missing], side='left'))
+        found = pairs < len(values) - 1
+        crossings[missing[found]] = pairs[found] + section.start
+
+    indices = []
+    for threshold, n in zip(thresholds, crossings):
+        if n < 0:
+            if endpoint == 'exact':
+                indices.append(None)
+            else:
+                indices.append(index_at_value(array, threshold, _slice=_slice,
+                                              endpoint=endpoint))
+            continue
+        a = array[begin + (step * n)]
+        b = array[begin + (step * (n + 1))]
+        # Force threshold to float as often passed as an integer.
+        # Also check for b=a as otherwise we get a divide by zero condition.
+        if a == b:
+            r = 0.5
+        else:
+            r = (float(threshold) - a) / (b - a)
+        indices.append(begin + step * (n + r))
+    return indices
+
+
 def index_at_value_or_level_off(array, frequency, value, _slice, abs_threshold=None):
     '''
     Find the index closest to the value unless it doesn't get within 10% of
@@ -7580,6 +8415,125 @@ def _value(array, _slice, operator, start_edge=None, stop_edge=None):
         return Value(None, None)
 
 
+def values_within_slices(array, slices, function):
+    '''
+    Applies max_value, min_value or max_abs_value to many slices of the array
+    in one pass, giving the same results as calling function for each slice.
+
+    Returns None where the slices or array are not supported, in which case
+    function should be called for each slice instead. Only float64
+    np.ma.MaskedArray arrays with finite unmasked values and slices with
+    non-negative integer bounds (or fractional bounds treated as edges) and a
+    step of 1 or None are supported.
+
+    :param array: masked array
+    :type array: np.ma.array
+    :param slices: Slice, start_edge and stop_edge to pass to function for each value.
+    :type slices: [(slice, float or None, float or None)]
+    :param function: max_value, min_value or max_abs_value.
+    :type function: function
+    :returns: Value named tuple of index and value for each slice or None if not supported.
+    :rtype: [Value] or None
+    '''
+    if function is max_abs_value:
+        values = values_within_slices(np.ma.abs(array), slices, max_value)
+        if values is None:
+            return None
+        # Recover sign of the value.
+        return [Value(None, None) if value is None else
+                Value(index, array[index]) for index, value in values]
+    elif function is max_value:
+        reducer, better, fill = np.maximum, np.greater, -np.inf
+    elif function is min_value:
+        reducer, better, fill = np.minimum, np.less, np.inf
+    else:
+        return None
+
+    # Subclasses such as MappedArray may return other values when indexed.
+    if type(array) is not np.ma.MaskedArray or array.ndim != 1 or \
+       array.dtype != np.float64:
+        return None
+
+    size = len(array)
+    starts = []
+    stops = []
+    edges = []
+    for _slice, start_edge, stop_edge in slices:
+        if _slice.step not in (None, 1):
+            return None
+        slice_start = _slice.start
+        slice_stop = _slice.stop
+        # Fractional slice bounds are edges, as within _value.
+        if slice_start and slice_start % 1:
+            start_edge = slice_start
+            slice_start = ceil(slice_start)
+        if slice_stop and slice_stop % 1:
+            stop_edge = slice_stop
+            slice_stop = floor(slice_stop)
+        slice_start = 0 if slice_start is None else slice_start
+        slice_stop = size if slice_stop is None else slice_stop
+        if not isinstance(slice_start, Integral) or \
+           not isinstance(slice_stop, Integral) or \
+           slice_start < 0 or slice_stop < 0:
+            return None
+        starts.append(min(slice_start, size))
+        stops.append(min(slice_stop, size))
+        # Edges are only used where they are truthy.
+        edges.append((start_edge or None, stop_edge or None))
+
+    starts = np.array(starts, dtype=np.intp)
+    lengths = np.maximum(np.array(stops, dtype=np.intp) - starts, 0)
+    offsets = np.cumsum(lengths) - lengths
+    filled = lengths > 0
+    # OPT: Gather every slice into one array and reduce each segment with
+    # reduceat rather than masking and searching each slice in turn.
+    positions = np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+    data = array.data[positions]
+    mask = np.ma.getmaskarray(array)[positions]
+    if not np.isfinite(data[~mask]).all():
+        return None
+    data = np.where(mask, fill, data)
+
+    counts = np.zeros(len(lengths), dtype=np.intp)
+    counts[filled] = np.add.reduceat(~mask, offsets[filled], dtype=np.intp)
+    extremes = np.full(len(lengths), fill)
+    extremes[filled] = reducer.reduceat(data, offsets[filled])
+    # The first sample within each slice equal to its extreme.
+    matches = np.flatnonzero(data == np.repeat(extremes, lengths))
+    indices = np.zeros(len(lengths), dtype=np.intp)
+    indices[filled] = positions[matches[np.searchsorted(matches, offsets[filled])]]
+
+    edge_indices = np.array([[np.inf if edge is None else edge for edge in pair]
+                             for pair in edges], dtype=np.float64).reshape(-1, 2)
+    absent = np.array([[edge is None for edge in pair] for pair in edges],
+                      dtype=bool).reshape(-1, 2)
+    if not np.isfinite(edge_indices[~absent]).all():
+        return None
+    # Edges which are not used have a NaN index and so are masked.
+    edge_indices[absent] = np.nan
+    edge_values = values_at_times(array, 1, 0, edge_indices.ravel()).reshape(-1, 2)
+    edge_masks = np.ma.getmaskarray(edge_values).tolist()
+    edge_values = edge_values.data
+
+    values = []
+    for number, (start_edge, stop_edge) in enumerate(edges):
+        if not counts[number]:
+            values.append(Value(None, None))
+            continue
+        index = indices[number]
+        value = extremes[number]
+        # The first of the start edge, slice and stop edge with the extreme
+        # value, as the operator within _value would choose.
+        start_masked, stop_masked = edge_masks[number]
+        start_value, stop_value = edge_values[number]
+        if not start_masked and not better(value, start_value):
+            index, value = start_edge, start_value
+        if not stop_masked and better(stop_value, value):
+            index, value = stop_edge, stop_value
+        values.append(Value(index, value))
+    return values
+
+
 def value_at_time(array, hz, offset, time_index):
     '''
     Finds the value of the data in array at the time given by the time_index.
@@ -7609,6 +8563,44 @@ def value_at_time(array, hz, offset, time_index):
     return value_at_index(array, location_in_array)
 
 
+
+def values_at_times(array, hz, offset, time_indices):
+    '''
+    Finds the values of the data in array at many times, giving the same
+    values as calling value_at_time for each time.
+
+    :param array: input data
+    :type array: masked array
+    :param hz: sample rate for the input data (sec-1)
+    :type hz: float
+    :param offset: fdr offset for the array (sec)
+    :type offset: float
+    :param time_indices: times into the array where we want to find the array values.
+    :type time_indices: np.ndarray or [float]
+    :returns: interpolated values from the array, masked where value_at_time returns None or a masked value or where the time is NaN.
+    :rtype: np.ma.masked_array
+    '''
+    time_indices = np.asarray(time_indices, dtype=np.float64)
+    # Timedelta truncates to 6 digits, therefore round offset down.
+    locations = (time_indices - round(offset - 0.0000005, 6)) * hz
+    invalid = np.isnan(locations)
+    # Trap overruns which arise from compensation for timing offsets.
+    locations = np.clip(np.where(invalid, 0, locations), 0, len(array) - 1)
+
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+    low = locations.astype(int)
+    high = np.minimum(low + 1, len(array) - 1)
+    ratio = locations - low
+    exact = ratio == 0
+    values = np.where(exact, data[low],
+                      ratio * data[high] + (1 - ratio) * data[low])
+    # Where one of the two samples is masked use the other sample.
+    values = np.where(mask[low] & ~mask[high] & ~exact, data[high], values)
+    values = np.where(mask[high] & ~mask[low], data[low], values)
+    masked = invalid | (mask[low] & (exact | mask[high]))
+    return np.ma.array(values, mask=masked)
+
 def value_at_datetime(start_datetime, array, hz, offset, value_datetime):
     '''
     Finds the value of the data in array at the time given by value_datetime.
@@ -7688,7 +8680,20 @@ def vstack_params(*params):
     :rtype: np.ma.array
     :raises: ValueError if all params are None (concatenation of zero-length sequences is impossible)
     '''
-    return np.ma.vstack([getattr(p, 'array', p) for p in params if p is not None])
+    arrays = [getattr(p, 'array', p) for p in params if p is not None]
+    if not arrays or any(np.ndim(a) != 1 for a in arrays) or \
+       len(set(len(a) for a in arrays)) > 1:
+        return np.ma.vstack(arrays)
+    # OPT: Fill preallocated data and mask rather than concatenating a copy of
+    # each mask.
+    datas = [np.ma.getdata(a) for a in arrays]
+    data = np.empty((len(arrays), len(arrays[0])),
+                    dtype=np.result_type(*datas))
+    mask = np.empty(data.shape, dtype=bool)
+    for row, array in enumerate(arrays):
+        data[row] = datas[row]
+        mask[row] = np.ma.getmask(array)
+    return np.ma.MaskedArray(data, mask=mask)
 
 
 def vstack_params_filtered(window, *params, **kw):
@@ -7720,6 +8725,10 @@ def vstack_params_filtered(window, *params, **kw):
         else:
             [p.array for p in params]
     elif method == 'second_window':
+        if len(set((p.hz, len(p.array)) for p in params)) == 1:
+            # OPT: Parameters sharing a sample rate are windowed together.
+            return second_window(vstack_params(*params), params[0].hz, window,
+                                 extend_window=True)
         arrays = [
             second_window(p.array, p.hz, window, extend_window=True) for p in params]
 
@@ -7795,59 +8804,83 @@ def second_window(array, frequency, seconds, extend_window=False):
 
     samples = int(frequency * seconds)
 
-    window_array = np_ma_masked_zeros_like(array)
+    length = array.shape[-1]
+    window_array = np.ma.array(np.zeros(array.shape),
+                               mask=np.ones(array.shape, dtype=bool))
 
-    if array.size < samples:
-        # Array size is less than the window sample size.
+    if length <= samples:
+        # Array size is not greater than the window sample size.
         return window_array
 
-    # Make a view of a sliding window using a different stride.
-    # For 3 samples, the array [1, 2, 3, 4, 5, 6, 7, 8, 9] will become
-    # [[1, 2, 3],
-    #  [2, 3, 4],
-    #  [3, 4, 5],
-    #  [4, 5, 6],
-    #  [5, 6, 7],
-    #  [6, 7, 8],
-    #  [7, 8, 9]]
-
-    sliding_window = np.lib.stride_tricks.as_strided(
-        array, shape=(len(array) - samples, samples + 1),
-        strides=array.strides * 2)
-
-    # Calculate min and max over the last axis (for each sliding window)
-    # Optimization: convert array to list for indexing (161 ms -> 124 ms)
-    min_ = np.min(sliding_window, axis=-1).tolist()
-    max_ = np.max(sliding_window, axis=-1).tolist()
-
-    unmasked_slices = np.ma.clump_unmasked(array)
-
-    # Optimization: local namespace (17 ms -> 6 ms)
-    window_array_data = window_array.data
+    # OPT: The min and max of each window of samples + 1 starting at each
+    # index are found in O(n) and the values are clipped between them by a
+    # sequential kernel. Each row of a 2-D array is processed separately
+    # within the same pass.
+    windows = length - samples
+    data = np.ma.getdata(array).reshape(-1, length)
+    min_, max_ = _sliding_min_max(data, samples + 1)
+
+    # Find the unmasked sections of at least samples, separating each row by a
+    # masked sample. Each section is clipped from its start up to stop-samples.
+    mask = np.ones((len(data), length + 1), dtype=bool)
+    mask[:, :-1] = np.ma.getmaskarray(array).reshape(-1, length)
+    edges = np.diff(np.concatenate(([1], mask.ravel().view(np.int8))))
+    starts = np.flatnonzero(edges == -1)
+    stops = np.flatnonzero(edges == 1)
+    sections = stops - starts > samples
+    rows, starts = np.divmod(starts[sections], length + 1)
+    stops = stops[sections] - rows * (length + 1) - samples
+
+    # Index the sections within the flattened rows of windows.
+    starts += rows * windows
+    stops += rows * windows
+    restart = np.zeros(len(data) * windows)
+    restart[starts] = 1
+    clipped = np.zeros(len(data) * windows + 1, dtype=np.int8)
+    clipped[starts] += 1
+    clipped[stops] -= 1
+    clipped = np.cumsum(clipped[:-1]).astype(bool)
+
+    out = window_clip(data[:, :windows].ravel(), min_.ravel(), max_.ravel(),
+                      restart)
+    window_data = window_array.data.reshape(-1, length)
+    window_mask = window_array.mask.reshape(-1, length)
+    window_data[:, :windows] = np.where(clipped, out, 0).reshape(-1, windows)
+    window_mask[:, :windows] = ~clipped.reshape(-1, windows)
+    return window_array
 
-    for unmasked_slice in filter_slices_length(unmasked_slices, samples):
-        start = unmasked_slice.start
-        last_value = array[start]
-        window_stop = unmasked_slice.stop - samples
-        # We set already the mask to False where we are going to insert
-        # values. That is from start up to stop-sample_idx
-        # Much faster than setting the value in the masked array item by item
-        window_array.mask[start:window_stop] = False
-        for idx in range(start, window_stop):
-            # Clip the last value between sliding window min and max
-            last_value = min(max(last_value, min_[idx]), max_[idx])
-            # Set this value in the data object of the masked array.
-            # Much faster than using window_array[start+i] = last_value
-            window_array_data[idx] = last_value
 
-    '''
-    import matplotlib.pyplot as plt
-    plt.plot(array)
-    plt.plot(window_array)
-    plt.show()
-    '''
-
-    return window_array
+def _sliding_min_max(data, width):
+    '''
+    Min and max of each window of width samples along the last axis using the
+    van Herk/Gil-Werman algorithm: the max of a window is the max of the
+    suffix of the block it starts in and the prefix of the block it ends in.
+
+    :param data: Data with samples along the last axis.
+    :type data: np.ndarray
+    :param width: Number of samples within each window.
+    :type width: int
+    :returns: Min and max of the windows starting at each of the first
+        len - width + 1 samples.
+    :rtype: (np.ndarray, np.ndarray)
+    '''
+    length = data.shape[-1]
+    windows = length - width + 1
+    blocks = -(-length // width)
+    # Padding is never within a window as windows end within the data.
+    padded = np.empty(data.shape[:-1] + (blocks * width,), dtype=data.dtype)
+    padded[..., :length] = data
+    padded[..., length:] = data[..., -1:]
+    padded = padded.reshape(data.shape[:-1] + (blocks, width))
+    result = []
+    for ufunc in (np.minimum, np.maximum):
+        prefix = ufunc.accumulate(padded, axis=-1).reshape(
+            data.shape[:-1] + (-1,))
+        suffix = ufunc.accumulate(padded[..., ::-1], axis=-1)[..., ::-1]
+        suffix = suffix.reshape(data.shape[:-1] + (-1,))
+        result.append(ufunc(suffix[..., :windows],
+                            prefix[..., width - 1:width - 1 + windows]))
+    return tuple(result)
 
 #---------------------------------------------------------------------------
 # Air data calculations adapted from AeroCalc V0.11 to suit POLARIS Numpy
@@ -8517,29 +9550,119 @@ def max_maintained_value(arrays, seconds, frequency, phase):
     as if we return the minimum value within this slice, we ensure that all other values 
     will be higher than this. 
     """
-    indices = []
-    values = []
     samples = int(frequency * seconds)
-    for unmasked_slice in np.ma.clump_unmasked(arrays):
-        array = arrays[unmasked_slice]
-        if samples <= len(array):
-            max_value = array.max()
-            min_difference_index = 0
-            min_difference = np.ma.sum(max_value - array[:samples])
-            for i in range(1, len(array) - samples + 1):
-                sum = np.ma.sum(max_value - array[i:i + samples])
-                if sum < min_difference:
-                    min_difference = sum
-                    min_difference_index = i
-            index, value = min_value(array[min_difference_index:min_difference_index+samples])
-            indices.append(min_difference_index + index + phase.start + unmasked_slice.start)
-            values.append(value)
-            
-    if len(values) == 1:
-        return indices[0], values[0]
-    elif len(values) > 1:
-        value = max(values)
-        index = indices[int(index_at_value(np.array(values), value))]
-        return index, value
-    else:
-        return None, None
+    return _max_maintained(arrays, [samples], phase.start)[0]
+
+
+def max_maintained_values(array, seconds, frequency, phases):
+    '''
+    max_maintained_value for several durations within several phases of an
+    array or of each row of a 2-D array, e.g. each engine. The differences
+    from the maximum value within each phase are summed once and shared by all
+    durations.
+
+    :param array: Array or 2-D array with a row per parameter.
+    :type array: np.ma.masked_array
+    :param seconds: Durations the values must be maintained for.
+    :type seconds: [int or float]
+    :param frequency: Frequency of the array.
+    :type frequency: int or float
+    :param phases: Phases to find the maximum maintained values within.
+    :type phases: [slice]
+    :returns: Index and value (or None, None) of each duration within each
+        phase, results[phase][duration], with an additional leading dimension
+        for each row of a 2-D array.
+    :rtype: [[(int, float)]]
+    '''
+    samples = [int(frequency * s) for s in seconds]
+    if np.ndim(array) == 2:
+        return [max_maintained_values(row, seconds, frequency, phases)
+                for row in array]
+    return [_max_maintained(array[phase], samples, phase.start)
+            for phase in phases]
+
+
+def _max_maintained(array, samples, offset):
+    '''
+    :param array: Array within the phase.
+    :type array: np.ma.masked_array
+    :param samples: Number of samples of each duration.
+    :type samples: [int]
+    :param offset: Index of the start of the phase.
+    :type offset: int
+    :returns: Index and value (or None, None) of each duration.
+    :rtype: [(int, float)]
+    '''
+    if len(array) == 0:
+        # Empty or beyond the end of the array. clump_unmasked raises
+        # IndexError for an empty array with a mask.
+        return [(None, None)] * len(samples)
+    indices = [[] for _ in samples]
+    values = [[] for _ in samples]
+    for unmasked_slice in np.ma.clump_unmasked(array):
+        section = array[unmasked_slice]
+        if min(samples) > len(section):
+            continue
+        # OPT: The sum of the differences from the max value within every
+        # window is found from cumulative sums rather than summing each window.
+        differences = section.max() - section.data
+        sums = np.concatenate(([0], np.cumsum(
+            differences,
+            dtype=None if differences.dtype.kind in 'iub' else np.float64)))
+        nonzero = np.concatenate(([0], np.cumsum(differences != 0)))
+        for n, window in enumerate(samples):
+            if window > len(section):
+                continue
+            start = _min_window_sum(differences, sums, nonzero, window)
+            index, value = min_value(section[start:start + window])
+            indices[n].append(start + index + offset + unmasked_slice.start)
+            values[n].append(value)
+
+    results = []
+    for n in range(len(samples)):
+        if len(values[n]) == 1:
+            results.append((indices[n][0], values[n][0]))
+        elif len(values[n]) > 1:
+            value = max(values[n])
+            index = indices[n][int(index_at_value(np.array(values[n]), value))]
+            results.append((index, value))
+        else:
+            results.append((None, None))
+    return results
+
+
+def _min_window_sum(differences, sums, nonzero, samples):
+    '''
+    Find the first window of samples with the minimum sum of differences.
+
+    :param differences: Non-negative differences from the max value.
+    :type differences: np.ndarray
+    :param sums: Cumulative sums of differences, starting from 0.
+    :type sums: np.ndarray
+    :param nonzero: Cumulative counts of non-zero differences, starting from 0.
+    :type nonzero: np.ndarray
+    :param samples: Number of samples within each window.
+    :type samples: int
+    :returns: Start index of the window.
+    :rtype: int
+    '''
+    if not samples:
+        return 0
+    # A window without differences has the minimum sum as none are negative.
+    zero = nonzero[samples:] == nonzero[:-samples]
+    if zero.any():
+        return int(zero.argmax())
+    window_sums = sums[samples:] - sums[:-samples]
+    if differences.dtype.kind in 'iub':
+        # Integer sums are exact.
+        return int(window_sums.argmin())
+    # Cumulative sums accumulate rounding errors, so windows within the error
+    # of the minimum are summed separately to choose the same window as
+    # summing every window would.
+    tolerance = 2 * len(differences) * np.finfo(differences.dtype).eps * \
+        sums[-1]
+    candidates = np.flatnonzero(window_sums <= window_sums.min() + tolerance)
+    if len(candidates) == 1:
+        return int(candidates[0])
+    exact = [np.sum(differences[i:i + samples]) for i in candidates]
+    return int(candidates[int(np.argmin(exact))])
@@ -1,4 +1,3 @@
-import copy
 try:
     import cPickle
 except ImportError:
@@ -11,26 +10,33 @@ import numpy as np
 import pprint
 import re
 import six
+import threading
+import time
 
 from abc import ABCMeta
 from collections import namedtuple, Iterable, OrderedDict
+from copy import deepcopy
 from functools import total_ordering
 from itertools import product
 from operator import attrgetter
 
 from analysis_engine.library import (
     align,
+    align_many,
     align_slices,
     all_deps,
+    discard_on_change,
     find_edges,
     is_index_within_slice,
     is_index_within_slices,
     is_slice_within_slice,
     repair_mask,
     runs_of_ones,
+    runs_of_ones_bounds,
     slice_duration,
     slice_multiply,
     slice_round,
+    SliceArray,
     slices_above,
     slices_below,
     slices_between,
@@ -38,9 +44,15 @@ from analysis_engine.library import (
     slices_remove_small_gaps,
     value_at_index,
     value_at_time,
+    values_within_slices,
 )
 from analysis_engine.recordtype import recordtype
-from analysis_engine.settings import NODE_CACHE_OFFSET_DP
+from analysis_engine.tracing import add_span, span
+from analysis_engine.settings import (
+    CAN_OPERATE_CACHE_SIZE,
+    NODE_CACHE_MAX_BYTES,
+    NODE_CACHE_OFFSET_DP,
+)
 
 # FIXME: a better place for this class
 from hdfaccess.parameter import MappedArray
@@ -59,6 +71,10 @@ KeyTimeInstance = recordtype('KeyTimeInstance',
                              'index name datetime latitude longitude',
                              default=None)
 Section = namedtuple('Section', 'name slice start_edge stop_edge')  # Q: rename mask -> slice/section
+NameRegistry = namedtuple('NameRegistry', 'key names name_set name_ids')
+SectionIndex = namedtuple('SectionIndex',
+                          'starts stops start_order stop_order sorted_starts '
+                          'sorted_stops names forward')
 
 
 # Ref: django/db/models/options.py:20
@@ -174,6 +190,275 @@ def get_param_kwarg_names(method):
     return defaults
 
 
+def node_nbytes(node):
+    '''
+    :param node: Node to measure.
+    :type node: Node
+    :returns: Number of bytes consumed by the Node's array and mask.
+    :rtype: int
+    '''
+    array = getattr(node, 'array', None)
+    if array is None:
+        return 0
+    nbytes = np.ma.getdata(array).nbytes
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        nbytes += mask.nbytes
+    return nbytes
+
+
+def reduce_within_slices(array, edges, function):
+    '''
+    Values of function within each slice of array.
+
+    :param array: Array to source values from.
+    :type array: np.ma.masked_array
+    :param edges: Slice, start_edge and stop_edge to pass to function for each value.
+    :type edges: [(slice, float or None, float or None)]
+    :param function: Function which will return an index and value from the array, e.g. max_value.
+    :type function: function
+    :returns: Index and value within each slice.
+    :rtype: [Value]
+    '''
+    # OPT: Reduce every slice in one pass where the function allows. A
+    # single slice is quicker to pass to the function directly.
+    values = None
+    if len(edges) > 1:
+        values = values_within_slices(array, edges, function)
+    if values is None:
+        values = [function(array, s, start_edge=start_edge,
+                           stop_edge=stop_edge)
+                  for s, start_edge, stop_edge in edges]
+    return values
+
+
+class NodeCache(object):
+    '''
+    Cache of aligned Nodes keyed by Node.cache_key which is limited to a total
+    number of array bytes. The least recently used Nodes are evicted first,
+    preferring Nodes which had no remaining consumers when they were cached or
+    last used (see set_consumers). Nodes should be released once no consumers
+    remain.
+
+    The values of functions such as max_value within the slices of a phase
+    are also memoized for the arrays of cached Nodes (see
+    values_within_slices) so that they are reduced once per flight.
+
+    Access is thread-safe so that the cache may be shared by nodes derived
+    concurrently.
+    '''
+    def __init__(self, max_bytes=NODE_CACHE_MAX_BYTES):
+        '''
+        :param max_bytes: Maximum number of array bytes to cache. A value of
+            None does not limit the size of the cache.
+        :type max_bytes: int or None
+        '''
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()  # key: (node, nbytes, id(array))
+        # OPT: Keys of Nodes without consumers in least recently used order
+        # and keys by Node name so that evicting and releasing do not scan
+        # every item.
+        self._unused = OrderedDict()  # key: None
+        self._names = {}  # name: set of keys
+        self._consumers = {}
+        # keys of cached Nodes by the id of their array and values within
+        # slices by key.
+        self._arrays = {}  # id(array): key
+        self._statistics = {}  # key: {(edges, function): values}
+        self.statistics_hits = 0
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '%s(%d items, %d bytes, %d hits, %d misses, %d evictions)' % (
+            self.__class__.__name__, len(self), self.nbytes, self.hits,
+            self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __getitem__(self, key):
+        node = self.get(key)
+        if node is None:
+            raise KeyError(key)
+        return node
+
+    def __setitem__(self, key, node):
+        nbytes = node_nbytes(node)
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                return
+            array = getattr(node, 'array', None)
+            array_id = None if array is None else id(array)
+            self._items[key] = (node, nbytes, array_id)
+            self.nbytes += nbytes
+            self._names.setdefault(key[0], set()).add(key)
+            if array_id is not None:
+                self._arrays[array_id] = key
+            self._used(key)
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if self._pop(key) is None:
+                raise KeyError(key)
+
+    def get(self, key, default=None):
+        '''
+        Get a Node from the cache, marking it as the most recently used.
+
+        :param key: Cache key (see Node.cache_key).
+        :type key: tuple
+        :returns: Cached Node if it exists, else default.
+        '''
+        with self._lock:
+            try:
+                item = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = item
+            self._used(key)
+            self.hits += 1
+            return item[0]
+
+    def _used(self, key):
+        '''
+        Mark a cached key as the most recently used Node without consumers if
+        nothing remains to consume it.
+        '''
+        self._unused.pop(key, None)
+        if not self._consumers.get(key[0]):
+            self._unused[key] = None
+
+    def _pop(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.nbytes -= item[1]
+            self._unused.pop(key, None)
+            keys = self._names[key[0]]
+            keys.discard(key)
+            if not keys:
+                del self._names[key[0]]
+            if self._arrays.get(item[2]) == key:
+                del self._arrays[item[2]]
+            self._statistics.pop(key, None)
+        return item
+
+    def _evict(self):
+        '''
+        Evict Nodes until the cache is within max_bytes.
+        '''
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and self._items:
+            key = next(iter(self._unused or self._items))
+            self._pop(key)
+            self.evictions += 1
+
+    def clear(self):
+        '''
+        Remove all Nodes from the cache.
+        '''
+        with self._lock:
+            self._items.clear()
+            self._unused.clear()
+            self._names.clear()
+            self._arrays.clear()
+            self._statistics.clear()
+            self.nbytes = 0
+
+    def release(self, name):
+        '''
+        Remove all aligned copies of a Node from the cache, e.g. once no
+        remaining Node depends upon it.
+
+        :param name: Name of Node.
+        :type name: str
+        '''
+        with self._lock:
+            for key in list(self._names.get(name, ())):
+                self._pop(key)
+
+    def _array_key(self, array):
+        '''
+        :returns: Key of the cached Node whose array is array, if any.
+        :rtype: tuple or None
+        '''
+        key = self._arrays.get(id(array))
+        item = self._items.get(key) if key is not None else None
+        # The array of a cached Node may have been replaced.
+        if item is not None and getattr(item[0], 'array', None) is array:
+            return key
+        return None
+
+    def values_within_slices(self, array, edges, function):
+        '''
+        Values of function within each slice of array (see
+        reduce_within_slices). Where array is the array of a cached Node the
+        values are memoized, keyed by the Node, slices and function, until
+        the Node is removed from the cache or its array is replaced. Cached
+        Nodes are shared by the Nodes depending upon them and their arrays
+        must not be modified in place.
+
+        :param array: Array to source values from.
+        :type array: np.ma.masked_array
+        :param edges: Slice, start_edge and stop_edge to pass to function for each value.
+        :type edges: [(slice, float or None, float or None)]
+        :param function: Function which will return an index and value from the array.
+        :type function: function
+        :returns: Index and value within each slice.
+        :rtype: [Value]
+        '''
+        statistic = (tuple((s.start, s.stop, s.step, start_edge, stop_edge)
+                           for s, start_edge, stop_edge in edges), function)
+        with self._lock:
+            key = self._array_key(array)
+            if key is not None:
+                values = self._statistics.get(key, {}).get(statistic)
+                if values is not None:
+                    self.statistics_hits += 1
+                    return values
+        values = reduce_within_slices(array, edges, function)
+        if key is not None:
+            with self._lock:
+                if self._array_key(array) == key:
+                    self._statistics.setdefault(key, {})[statistic] = values
+        return values
+
+    def set_consumers(self, consumers):
+        '''
+        Set the number of Nodes which remain to consume each Node so that
+        Nodes with no remaining consumers are evicted first. The mapping is
+        referenced rather than copied so that it may be updated as Nodes are
+        derived. A Node's consumers are read when it is cached or used.
+
+        :param consumers: Number of remaining consumers keyed by Node name.
+        :type consumers: dict
+        '''
+        self._consumers = consumers
+
+    def stats(self):
+        '''
+        :returns: Cache statistics.
+        :rtype: dict
+        '''
+        return {
+            'items': len(self),
+            'nbytes': self.nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
 #------------------------------------------------------------------------------
 # Abstract Node Classes
 # =====================
@@ -273,20 +558,37 @@ class Node(six.with_metaclass(ABCMeta, object)):
 
         :rtype: str
         """
-        return cls.name or get_verbose_name(cls.__name__).title()
+        if cls.name:
+            return cls.name
+        # OPT: The verbose name is formatted by regular expression once per
+        # class rather than for every Node created.
+        cached = cls.__dict__.get('_verbose_name')
+        if cached is None or cached[0] != cls.__name__:
+            cached = (cls.__name__, get_verbose_name(cls.__name__).title())
+            cls._verbose_name = cached
+        return cached[1]
 
     @classmethod
     def get_dependency_names(cls):
         """
+        The names are found by inspecting the derive method once per class and
+        only inspected again if derive is replaced.
+
         :returns: A list of dependency names.
         :rtype: [str]
         """
+        derive = getattr(cls.derive, '__func__', cls.derive)
+        cached = cls.__dict__.get('_dependency_names')
+        if cached is not None and cached[0] is derive:
+            return list(cached[1])
         # TypeError:'ABCMeta' object is not iterable?
         # this probably means dependencies for this class isn't a list!
         params = get_param_kwarg_names(cls.derive)
         # Here due to an AttributeError? Derive kwarg is a string not a Node:
         # e.g. derive(a='String') instead of derive(a=P('String'))
-        return [d.name or d.get_name() for d in params]
+        names = tuple(d.name or d.get_name() for d in params)
+        cls._dependency_names = (derive, names)
+        return list(names)
 
     @classmethod
     def can_operate(cls, available):
@@ -324,6 +626,72 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         # ensure all names are strings
         return all_deps(cls, available)
 
+    @classmethod
+    def _can_operate_info(cls):
+        """
+        :returns: The can_operate function, the defaults of its keyword arguments and an OrderedDict of its most recently used results, kept once per class and rebuilt if can_operate is replaced.
+        :rtype: (function, tuple, OrderedDict)
+        """
+        can_operate = getattr(cls.can_operate, '__func__', cls.can_operate)
+        info = cls.__dict__.get('_can_operate')
+        if info is None or info[0] is not can_operate:
+            try:
+                defaults = inspect.getargspec(cls.can_operate).defaults
+            except AttributeError:
+                defaults = inspect.getfullargspec(cls.can_operate).defaults
+            info = (can_operate, tuple(defaults or ()), OrderedDict())
+            cls._can_operate = info
+        return info
+
+    @classmethod
+    def get_can_operate_defaults(cls):
+        """
+        Keyword arguments of can_operate are the Attributes it requires, e.g.
+        can_operate(cls, available, ac_type=A('Aircraft Type')).
+
+        :returns: Default values of the keyword arguments of can_operate.
+        :rtype: tuple
+        """
+        return cls._can_operate_info()[1]
+
+    @classmethod
+    def can_operate_memoized(cls, available, *attributes):
+        """
+        Calls can_operate, reusing the result of a previous call with the same
+        available names and Attribute values.
+
+        can_operate must be a pure function of the available names and the
+        Attribute values; it must not read any other state, e.g. settings or
+        globals which change between flights, nor have side effects. Results
+        are only memoized when the Attribute values are hashable. The
+        CAN_OPERATE_CACHE_SIZE most recently used results are kept per class
+        so that long running processes, e.g. pool workers, do not grow with
+        every frame and aircraft they process.
+
+        :param available: Available parameters from the dependency tree
+        :type available: list of strings
+        :param attributes: Attributes passed into can_operate in order of its keyword arguments.
+        :type attributes: Attribute or None
+        :returns: Result of can_operate.
+        :rtype: bool
+        """
+        results = cls._can_operate_info()[2]
+        key = (frozenset(available),
+               tuple(None if a is None else a.value for a in attributes))
+        try:
+            # Reinsert to mark as most recently used.
+            result = results[key] = results.pop(key)
+            return result
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable Attribute value.
+            return cls.can_operate(available, *attributes)
+        result = results[key] = cls.can_operate(available, *attributes)
+        while len(results) > CAN_OPERATE_CACHE_SIZE:
+            results.popitem(last=False)
+        return result
+
     @classmethod
     def get_operational_combinations(cls, **kwargs):
         """
@@ -364,7 +732,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         :returns: Cached Node if it exists, else None.
         :rtype: Node or None
         '''
-        return self._cache.get(key) if self._cache else None
+        return self._cache.get(key) if self._cache is not None else None
 
     def set_cache(self, key, node):
         '''
@@ -404,6 +772,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             [d for d in args if d is not None and d.frequency]
 
         if dependencies_to_align and self.align:
+            align_start = time.time()
 
             if self.align_frequency and self.align_offset is not None:
                 # align to the class declared frequency and offset
@@ -426,25 +795,45 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
 
             # align the dependencies
             aligned_args = []
+            params = []
             for arg in args:
                 if arg in dependencies_to_align:
-                    try:
-                        aligned_arg = arg.get_aligned(self)
-                    except AttributeError:
+                    if not hasattr(arg, 'get_aligned'):
                         # If parameter came from an HDF its missing get_aligned
                         arg = derived_param_from_hdf(arg, cache=self._cache)
-                        aligned_arg = arg.get_aligned(self)
-                    aligned_args.append(aligned_arg)
-                else:
-                    aligned_args.append(arg)
+                    if isinstance(arg, DerivedParameterNode):
+                        # OPT: parameters are aligned together below.
+                        params.append((len(aligned_args), arg))
+                    else:
+                        arg = arg.get_aligned(self)
+                aligned_args.append(arg)
+            if params:
+                indices, params = zip(*params)
+                for index, aligned_arg in zip(
+                        indices, get_aligned_many(params, self)):
+                    aligned_args[index] = aligned_arg
             args = aligned_args
+            align_stop = time.time()
+            if '_profile' in self.__dict__:
+                # record time spent aligning when profiling (see
+                # process_flight.derive_parameters).
+                self._profile['align'] += align_stop - align_start
+            add_span(self.name, 'align', align_start, align_stop)
 
         elif dependencies_to_align:
             self.frequency = dependencies_to_align[0].frequency
             self.offset = dependencies_to_align[0].offset
 
+        if '_copy_dependencies' in self.__dict__:
+            # derived on a worker thread (see
+            # process_flight.derive_parameters). Dependencies and cached
+            # aligned copies may be passed to several nodes at the same time,
+            # so derive is given its own copies which it may modify.
+            args = [deepcopy(arg) for arg in args]
+
         try:
-            res = self.derive(*args)
+            with span(self.name, 'derive'):
+                res = self.derive(*args)
         except Exception:
             self.exception('Failed to derive node `%s`.\n'
                            'Nodes used to derive:\n  %s',
@@ -679,6 +1068,21 @@ class DerivedParameterNode(Node):
         if cached_node:
             return cached_node
 
+        # Align the array for the temporary parameter:
+        return self.aligned_copy(param, align(self, param))
+
+    def aligned_copy(self, param, array):
+        '''
+        Copy self with an array which has already been aligned to param, e.g.
+        by library.align_many, and cache the copy for get_aligned.
+
+        :param param: Node the array was aligned to.
+        :type param: Node subclass
+        :param array: Array of self aligned to param.
+        :type array: np.ma.masked_array
+        :returns: A cached copy of self with the aligned array.
+        :rtype: DerivedParameterNode
+        '''
         # Create temporary new aligned parameter of correct type:
         aligned_param = self.__class__(
             name=self.name,
@@ -686,10 +1090,7 @@ class DerivedParameterNode(Node):
             offset=param.offset,
             lfl=self.lfl,
         )
-
-        # Align the array for the temporary parameter:
-        a = align(self, param)
-        aligned_param.array = a
+        aligned_param.array = array
 
         # Ensure that we copy attributes required for multi-states:
         if hasattr(self, 'values_mapping'):
@@ -697,7 +1098,9 @@ class DerivedParameterNode(Node):
         if hasattr(self, 'state'):
             aligned_param.state = self.state
 
-        self.set_cache(cache_key, aligned_param)
+        self.set_cache(
+            self.cache_key(self.name, param.frequency, param.offset),
+            aligned_param)
 
         return aligned_param
 
@@ -969,6 +1372,33 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
 M = MultistateDerivedParameterNode  # shorthand
 
 
+def get_aligned_many(params, param):
+    '''
+    Align copies of many parameters to param together, using cached copies
+    where available.
+
+    :param params: Parameters to align copies of.
+    :type params: [DerivedParameterNode]
+    :param param: Node to align copies to.
+    :type param: Node subclass
+    :returns: Copies of params aligned to param in the same order.
+    :rtype: [DerivedParameterNode]
+    '''
+    aligned = [None] * len(params)
+    uncached = []
+    for index, p in enumerate(params):
+        cached_node = p.get_cache(
+            p.cache_key(p.name, param.frequency, param.offset))
+        if cached_node:
+            aligned[index] = cached_node
+        else:
+            uncached.append(index)
+    arrays = align_many([params[i] for i in uncached], param)
+    for index, array in zip(uncached, arrays):
+        aligned[index] = params[index].aligned_copy(param, array)
+    return aligned
+
+
 def derived_param_from_hdf(hdf_parameter, cache=None):
     '''
     Loads and wraps an HDF parameter with either DerivedParameterNode or
@@ -995,14 +1425,20 @@ def derived_param_from_hdf(hdf_parameter, cache=None):
         )
 
 
+@discard_on_change('_index')
 class SectionNode(Node, list):
     '''
     Derives from list to implement iteration and list methods.
 
     Is a list of Section namedtuples, each with attributes .name, .slice,
     .start_edge and .stop_edge
+
+    Lookups are answered by binary search of an index of the section slices
+    which is built when first needed and discarded whenever the list is
+    changed.
     '''
     node_type_abbr = 'Phase'
+    _index = None
 
     def __init__(self, *args, **kwargs):
         '''
@@ -1091,6 +1527,73 @@ class SectionNode(Node, list):
     slice_attrgetters = {'start': attrgetter('slice.start'),
                          'stop': attrgetter('slice.stop')}
 
+    def __getstate__(self):
+        '''
+        Do not pickle the _index attr when saving nodes.
+        '''
+        state = super(SectionNode, self).__getstate__()
+        if '_index' in state:
+            state = state.copy()
+            del state['_index']
+        return state
+
+    def _get_index(self):
+        '''
+        Index of the section slices. Starts of None are held as -inf and stops
+        of None as inf.
+
+        :rtype: SectionIndex
+        '''
+        if self._index is None:
+            starts = np.array([-np.inf if s.slice.start is None
+                               else s.slice.start for s in self],
+                              dtype=np.float64)
+            stops = np.array([np.inf if s.slice.stop is None
+                              else s.slice.stop for s in self],
+                             dtype=np.float64)
+            # Stable sorts keep sections with equal bounds in list order.
+            start_order = np.argsort(starts, kind='mergesort')
+            stop_order = np.argsort(stops, kind='mergesort')
+            names = {}
+            for position, section in enumerate(self):
+                names.setdefault(section.name, []).append(position)
+            names = {name: np.array(positions)
+                     for name, positions in names.items()}
+            forward = all(s.slice.step is None or s.slice.step >= 1
+                          for s in self)
+            self._index = SectionIndex(starts, stops, start_order, stop_order,
+                                       starts[start_order], stops[stop_order],
+                                       names, forward)
+        return self._index
+
+    def _get_bounds(self, use):
+        '''
+        :param use: Either 'start' or 'stop' of slice.
+        :type use: str
+        :returns: The start or stop of each section slice.
+        :rtype: np.ndarray
+        '''
+        index = self._get_index()
+        return {'start': index.starts, 'stop': index.stops}[use]
+
+    def _convert_lookup(self, within_slice=None, containing_index=None,
+                        param=None):
+        '''
+        Converts within_slice and containing_index from the frequency of param
+        to the frequency of self.
+
+        :returns: Converted within_slice and containing_index.
+        :rtype: (slice, int or float)
+        '''
+        if param is not None:
+            if within_slice:
+                # FIXME: This does not account for different offsets.
+                within_slice = slice_multiply(within_slice, param.hz)
+            if containing_index is not None:
+                containing_index = \
+                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+        return within_slice, containing_index
+
     def _get_condition(self, name=None, containing_index=None,
                        within_slice=None, within_use='slice', param=None):
         '''
@@ -1112,13 +1615,8 @@ class SectionNode(Node, list):
         '''
         # Function for testing if Section is within a slice depending on
         # within_use.
-        if param is not None:
-            if within_slice:
-                # FIXME: This does not account for different offsets.
-                within_slice = slice_multiply(within_slice, param.hz)
-            if containing_index is not None:
-                containing_index = \
-                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+        within_slice, containing_index = self._convert_lookup(
+            within_slice, containing_index, param)
         if within_slice:
             within_func = lambda s, within: is_slice_within_slice(
                 s.slice, within, within_use=within_use)
@@ -1134,6 +1632,106 @@ class SectionNode(Node, list):
         return lambda e: (within_func(e, within_slice) and name_func(e) and
                           index_func(e))
 
+    def _get_candidates(self, name=None, containing_index=None,
+                        within_slice=None, within_use='slice', param=None):
+        '''
+        Finds the sections which may match the lookup by binary search of the
+        index. Candidates must still be checked with the condition from
+        _get_condition.
+
+        :param kwargs: See _get_condition.
+        :returns: Positions of candidate sections in ascending order.
+        :rtype: np.ndarray
+        '''
+        within_slice, containing_index = self._convert_lookup(
+            within_slice, containing_index, param)
+        index = self._get_index()
+        candidates = index.names.get(name, np.arange(0)) if name else None
+        # Sections with a negative step are compared with reversed bounds
+        # and raise ValueError when checked for overlap, so only the
+        # condition is used for them.
+        if index.forward and containing_index is not None:
+            # Sections starting at or before the index which stop after it.
+            count = np.searchsorted(index.sorted_starts, containing_index,
+                                    side='right')
+            within = index.start_order[:count]
+            within = within[index.stops[within] > containing_index]
+            candidates = self._intersect(candidates, within)
+        if index.forward and within_slice and \
+           (within_slice.step is None or within_slice.step >= 1):
+            lower = -np.inf if within_slice.start is None else within_slice.start
+            upper = np.inf if within_slice.stop is None else within_slice.stop
+            within = None
+            if within_use in ('slice', 'start'):
+                within = index.start_order[
+                    np.searchsorted(index.sorted_starts, lower, side='left'):
+                    np.searchsorted(index.sorted_starts, upper, side='right')]
+            elif within_use == 'stop':
+                within = index.stop_order[
+                    np.searchsorted(index.sorted_stops, lower, side='left'):
+                    np.searchsorted(index.sorted_stops, upper, side='right')]
+            elif within_use == 'any':
+                # Overlap treats a start of None as 0.
+                within = index.start_order[
+                    :np.searchsorted(index.sorted_starts, upper, side='left')]
+                within = within[index.stops[within] > (within_slice.start or 0)]
+            if within is not None:
+                candidates = self._intersect(candidates, within)
+        return np.arange(len(self)) if candidates is None else candidates
+
+    @staticmethod
+    def _intersect(candidates, positions):
+        '''
+        :param candidates: Positions in ascending order or None for all.
+        :type candidates: np.ndarray or None
+        :param positions: Unique positions in any order.
+        :type positions: np.ndarray
+        :returns: Positions in both in ascending order.
+        :rtype: np.ndarray
+        '''
+        if candidates is None:
+            return np.sort(positions)
+        return np.intersect1d(candidates, positions, assume_unique=True)
+
+    def _get_positions(self, **kwargs):
+        '''
+        :param kwargs: Passed into _get_condition (see docstring).
+        :returns: Positions of the sections matching the lookup in ascending order.
+        :rtype: np.ndarray
+        '''
+        if not kwargs:
+            return np.arange(len(self))
+        condition = self._get_condition(**kwargs)
+        candidates = self._get_candidates(**kwargs).tolist()
+        return np.array([p for p in candidates if condition(self[p])],
+                        dtype=int)
+
+    def _get_ordered_positions(self, order_by='start', **kwargs):
+        '''
+        :param order_by: Index of slice to use when ordering, either 'start' or 'stop'.
+        :type order_by: str
+        :param kwargs: Passed into _get_condition (see docstring).
+        :returns: Positions of the sections matching the lookup ordered by index.
+        :rtype: np.ndarray
+        '''
+        bounds = self._get_bounds(order_by)
+        if not kwargs:
+            index = self._get_index()
+            return index.start_order if order_by == 'start' else index.stop_order
+        positions = self._get_positions(**kwargs)
+        return positions[np.argsort(bounds[positions], kind='mergesort')]
+
+    def _from_positions(self, positions):
+        '''
+        :param positions: Positions of sections within self.
+        :type positions: np.ndarray
+        :returns: An object of the same type as self containing the sections.
+        :rtype: self.__class__
+        '''
+        return self.__class__(name=self.name, frequency=self.frequency,
+                              offset=self.offset,
+                              items=[self[p] for p in positions.tolist()])
+
     def get(self, **kwargs):
         '''
         Gets elements either within_slice or with name. Duplicated from
@@ -1144,10 +1742,7 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing matching elements.
         :rtype: Section
         '''
-        condition = self._get_condition(**kwargs)
-        matching = [s for s in self if condition(s)]
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=matching)
+        return self._from_positions(self._get_positions(**kwargs))
 
     def get_first(self, first_by='start', **kwargs):
         '''
@@ -1185,11 +1780,8 @@ class SectionNode(Node, list):
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: Section
         '''
-        matching = self.get(**kwargs)
-        ordered_by_start = sorted(matching,
-                                  key=self.slice_attrgetters[order_by])
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=ordered_by_start)
+        return self._from_positions(
+            self._get_ordered_positions(order_by=order_by, **kwargs))
 
     def get_next(self, index, frequency=None, use='start', **kwargs):
         '''
@@ -1208,11 +1800,16 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in ordered:
-            if getattr(elem.slice, use) > index:
-                return elem
-        return None
+        order_by = kwargs.pop('order_by', 'start')
+        ordered = self._get_ordered_positions(order_by=order_by, **kwargs)
+        bounds = self._get_bounds(use)[ordered]
+        if use == order_by:
+            # OPT: Bounds are sorted so the next can be found by bisection.
+            position = np.searchsorted(bounds, index, side='right')
+        else:
+            later = np.flatnonzero(bounds > index)
+            position = later[0] if later.size else len(bounds)
+        return self[ordered[position]] if position < len(bounds) else None
 
     def get_previous(self, index, frequency=None, use='stop', **kwargs):
         '''
@@ -1231,11 +1828,16 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
-        ordered = self.get_ordered_by_index(**kwargs)
-        for elem in reversed(ordered):
-            if getattr(elem.slice, use) < index:
-                return elem
-        return None
+        order_by = kwargs.pop('order_by', 'start')
+        ordered = self._get_ordered_positions(order_by=order_by, **kwargs)
+        bounds = self._get_bounds(use)[ordered]
+        if use == order_by:
+            # OPT: Bounds are sorted so the previous can be found by bisection.
+            position = np.searchsorted(bounds, index, side='left') - 1
+        else:
+            earlier = np.flatnonzero(bounds < index)
+            position = earlier[-1] if earlier.size else -1
+        return self[ordered[position]] if position >= 0 else None
 
     def get_longest(self, **kwargs):
         '''
@@ -1273,27 +1875,26 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
-        surrounded = []
-        for section in self:
-            if section.slice.start <= index <= section.slice.stop or\
-               section.slice.start <= index and section.slice.stop is None or\
-               section.slice.start is None and index <= section.slice.stop:
-                surrounded.append(section)
-        return self.__class__(name=self.name, frequency=self.frequency,
-                              offset=self.offset, items=surrounded)
+        # OPT: Sections starting at or before the index are found by
+        # bisection, then those stopping before it are removed.
+        sections = self._get_index()
+        count = np.searchsorted(sections.sorted_starts, index, side='right')
+        positions = np.sort(sections.start_order[:count])
+        positions = positions[sections.stops[positions] >= index]
+        return self._from_positions(positions)
 
     def get_slices(self, edges=True):
         '''
         :param edges: Return start and stop edge rather than slice start and stop, using edges results in section[0].slice.start != section.get_slices()[0].start
         :type edges: bool
         :returns: A list of slices from the SectionNode.
-        :rtype: [slice]
+        :rtype: SliceArray
         '''
         if edges:
-            slices = [slice(section.start_edge, section.stop_edge)
-                      for section in self]
+            slices = SliceArray(slice(section.start_edge, section.stop_edge)
+                                for section in self)
         else:
-            slices = [section.slice for section in self]
+            slices = SliceArray(section.slice for section in self)
         return slices
 
 
@@ -1349,24 +1950,52 @@ class FormattedNameNode(ListNode):
         super(FormattedNameNode, self).__init__(*args, **kwargs)
         self.restrict_names = kwargs.get('restrict_names', True)
 
+    @classmethod
+    def get_name_registry(cls):
+        """
+        Registry of the names this class can create: the names in order, a
+        frozenset of the names and an integer ID for each name.
+
+        The registry is built once per class and only rebuilt if NAME_FORMAT
+        or NAME_VALUES are replaced, or values are added to or removed from
+        NAME_VALUES.
+
+        :rtype: NameRegistry
+        """
+        # OPT: Checking NAME_FORMAT and NAME_VALUES are the same objects, and
+        # the sizes of the values, is far cheaper than copying NAME_VALUES or
+        # building the product of all NAME_VALUES for every name lookup.
+        name_values = cls.NAME_VALUES
+        sizes = [(id(v), len(v)) for v in name_values.values()]
+        registry = cls.__dict__.get('_name_registry')
+        if registry is not None:
+            name, name_format, values, values_sizes = registry.key
+            if name_format is cls.NAME_FORMAT and values is name_values and \
+               values_sizes == sizes and name == cls.get_name():
+                return registry
+        key = (cls.get_name(), cls.NAME_FORMAT, name_values, sizes)
+        if not cls.NAME_FORMAT and not cls.NAME_VALUES:
+            names = (cls.get_name(),)
+        else:
+            names = []
+            for a in product(*cls.NAME_VALUES.values()):
+                name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
+                names.append(six.moves.intern(name))
+            names = tuple(names)
+        name_ids = {}
+        for name in names:
+            name_ids.setdefault(name, len(name_ids))
+        registry = NameRegistry(key, names, frozenset(names), name_ids)
+        cls._name_registry = registry
+        return registry
+
     @classmethod
     def names(cls):
         """
         :returns: The product of all NAME_VALUES name combinations
         :rtype: list
         """
-        # XXX: cache option below disabled until required. Should we create this
-        # on init and remove the property instead?
-        ##if hasattr(cls, 'names'):
-        ##    return cls.names
-        if not cls.NAME_FORMAT and not cls.NAME_VALUES:
-            return [cls.get_name()]
-        names = []
-        for a in product(*cls.NAME_VALUES.values()):
-            name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
-            names.append(name)
-        ##cls.names = names  #cache
-        return names
+        return list(cls.get_name_registry().names)
 
     def _validate_name(self, name):
         """
@@ -1375,7 +2004,7 @@ class FormattedNameNode(ListNode):
         :type name: str
         :rtype: bool
         """
-        return name in self.names()
+        return name in self.get_name_registry().name_set
 
     def format_name(self, replace_values={}, **kwargs):
         """
@@ -1431,7 +2060,8 @@ class FormattedNameNode(ListNode):
         elif name:
             #Q: If restrict names BUT the named item is in the list of objects
             # contained, should we not return it anyway rather than raise?
-            if self.restrict_names and name not in self.names():
+            if self.restrict_names and \
+               name not in self.get_name_registry().name_set:
                 raise ValueError("Attempted to filter by invalid name '%s' "
                                  "within '%s'." % (name,
                                                    self.__class__.__name__))
@@ -1439,6 +2069,37 @@ class FormattedNameNode(ListNode):
         else:
             return None
 
+    def get_indices(self):
+        '''
+        :returns: The index of each item.
+        :rtype: np.ndarray
+        '''
+        return np.array([item.index for item in self], dtype=np.float64)
+
+    def _get_aligned_items(self, param):
+        '''
+        Copies the items with their index aligned to the frequency and offset
+        of param.
+
+        :param param: Node to align the items to.
+        :type param: Node subclass
+        :returns: Aligned copies of the items.
+        :rtype: list
+        '''
+        multiplier = param.frequency / self.frequency
+        offset = (self.offset - param.offset) * param.frequency
+        # OPT: Align every index in one array operation and copy items from
+        # their fields which is several times faster than copy.copy.
+        # TODO: check for negative index following downsampling if use
+        # case arrises
+        indices = (self.get_indices() * multiplier + offset).tolist()
+        aligned_items = []
+        for item, index in zip(self, indices):
+            aligned_item = item.__class__(*item)
+            aligned_item.index = index
+            aligned_items.append(aligned_item)
+        return aligned_items
+
     def get(self, **kwargs):
         '''
         Gets elements either within_slice or with name.
@@ -1745,19 +2406,8 @@ class KeyTimeInstanceNode(FormattedNameNode):
         :returns: An copy of the KeyTimeInstanceNode with its contents aligned to the frequency and offset of param.
         :rtype: KeyTimeInstanceNode
         '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency,
-                                      param.offset)
-        for kti in self:
-            aligned_kti = copy.copy(kti)
-            index_aligned = (kti.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            aligned_kti.index = index_aligned
-            aligned_node.append(aligned_kti)
-
-        return aligned_node
+        return self.__class__(self.name, param.frequency, param.offset,
+                              items=self._get_aligned_items(param))
 
 
 class KeyPointValueNode(FormattedNameNode):
@@ -1846,18 +2496,8 @@ class KeyPointValueNode(FormattedNameNode):
         :returns: An copy of the KeyPointValueNode with its contents aligned to the frequency and offset of param.
         :rtype: KeyPointValueNode
         '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency, param.offset)
-        for kpv in self:
-            aligned_kpv = copy.copy(kpv)
-            aligned_kpv.index = (aligned_kpv.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            ##if aligned_kpv.slice:
-            ##    aligned_kpv.slice = align_slice(param, self, aligned_kpv.slice)
-            aligned_node.append(aligned_kpv)
-        return aligned_node
+        return self.__class__(self.name, param.frequency, param.offset,
+                              items=self._get_aligned_items(param))
 
     def get_max(self, **kwargs):
         '''
@@ -1946,21 +2586,33 @@ class KeyPointValueNode(FormattedNameNode):
         if min_duration:
             assert freq
 
+        slices = list(slices)
+        edges = []
         for slice_ in slices:
 
             if isinstance(slice_, Section):
-                index, value = function(array, slice_.slice,
-                                        start_edge=slice_.start_edge,
-                                        stop_edge=slice_.stop_edge)
-                begin = slice_.start_edge
-                end = slice_.stop_edge
+                edges.append((slice_.slice, slice_.start_edge,
+                              slice_.stop_edge))
             else:
                 # Where slice.stop is not a whole number, it is assumed that the
                 # value is an stop_edge rather than an inclusive pythonic end to a
                 # range (stop+1) as a slice should be.
                 stop = slice_.stop if slice_.stop % 1 else None
-                index, value = function(array, slice_, start_edge=slice_.start,
-                                        stop_edge=stop)
+                edges.append((slice_, slice_.start, stop))
+
+        # OPT: Nodes sharing a cached dependency reduce it within the same
+        # phase once per flight.
+        if isinstance(self._cache, NodeCache):
+            values = self._cache.values_within_slices(array, edges, function)
+        else:
+            values = reduce_within_slices(array, edges, function)
+
+        for slice_, (index, value) in zip(slices, values):
+
+            if isinstance(slice_, Section):
+                begin = slice_.start_edge
+                end = slice_.stop_edge
+            else:
                 begin = slice_.start
                 end = slice_.stop
 
@@ -2182,18 +2834,18 @@ class KeyPointValueNode(FormattedNameNode):
             # NOTE: TypeError: 'bool' object is not subscriptable:
             #     If condition is False check Values Mapping has correct
             #     state being checked against in condition.
-            events = runs_of_ones(condition[_slice])
-            # for each period where the condition is met within the phase slice
-            for event in events:
-                index = event.start
-                if index == 0 and exclude_leading_edge:
-                    logger.debug("Excluding leading edge at index %d", start)
-                    continue
-                #TODO: If Section, ensure we check decimal start/stop edges
-                duration = (event.stop - event.start) / float(frequency)
-                if duration >= min_duration:
-                    self.create_kpv(start + index, duration)
-            #endfor
+            # OPT: Filter the periods where the condition is met within the
+            # phase slice as arrays rather than looping over every period.
+            starts, stops = runs_of_ones_bounds(condition[_slice])
+            #TODO: If Section, ensure we check decimal start/stop edges
+            durations = (stops - starts) / float(frequency)
+            valid = durations >= min_duration
+            if exclude_leading_edge and len(starts) and starts[0] == 0:
+                logger.debug("Excluding leading edge at index %d", start)
+                valid[0] = False
+            for index, duration in zip((starts[valid] + start).tolist(),
+                                       durations[valid].tolist()):
+                self.create_kpv(index, duration)
         #endfor
         return
 
@@ -2530,16 +3182,26 @@ class NodeManager(object):
             derived_node = self.derived_nodes[name]
             # NOTE: Raises "Unbound method" here due to can_operate being
             # overridden without wrapping with @classmethod decorator
+            memoize = isinstance(derived_node, type) and \
+                issubclass(derived_node, Node)
+            # OPT: Node classes keep their can_operate defaults and results
+            # rather than being inspected for every visit.
+            if memoize:
+                defaults = derived_node.get_can_operate_defaults()
+            else:
+                defaults = inspect.getargspec(derived_node.can_operate).defaults
             attributes = []
-            argspec = inspect.getargspec(derived_node.can_operate)
-            if argspec.defaults:
-                for default in argspec.defaults:
+            if defaults:
+                for default in defaults:
                     if not isinstance(default, Attribute):
                         raise TypeError('Only Attributes may be keyword '
                                         'arguments in can_operate methods.')
                     attributes.append(self.get_attribute(default.name))
             # can_operate expects attributes.
-            res = derived_node.can_operate(available, *attributes)
+            if memoize:
+                res = derived_node.can_operate_memoized(available, *attributes)
+            else:
+                res = derived_node.can_operate(available, *attributes)
             ##if not res:
             ##    logger.debug("Derived Node '%s' cannot operate with available nodes: %s",
             ##                 name, available)
@@ -1,15 +1,29 @@
 from __future__ import print_function
 
 import argparse
+import collections
 import itertools
 import json
 import logging
+import multiprocessing
+import numpy as np
 import os
 import six
 import sys
+import time
+import traceback
 
+from collections import namedtuple, OrderedDict
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
 from networkx.readwrite import json_graph
+from six.moves import queue
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2: memory is not profiled.
+    tracemalloc = None
 
 from flightdatautilities.filesystem_tools import copy_file
 
@@ -18,21 +32,41 @@ from hdfaccess.file import hdf_file
 from analysis_engine import hooks, settings, __version__
 from analysis_engine.dependency_graph import dependency_order
 from analysis_engine.json_tools import json_to_process_flight, process_flight_to_nodes
-from analysis_engine.library import np_ma_masked_zeros, repair_mask
+from analysis_engine.library import (np_ma_masked_zeros, repair_mask,
+                                     values_at_times)
 from analysis_engine.node import (ApproachNode, Attribute,
                                   derived_param_from_hdf,
                                   DerivedParameterNode,
                                   FlightAttributeNode,
                                   KeyPointValueNode,
                                   KeyTimeInstanceNode,
-                                  NodeManager, P, Section, SectionNode,
-                                  NODE_SUBCLASSES)
+                                  NodeCache, NodeManager, P, Section,
+                                  SectionNode,
+                                  NODE_SUBCLASSES,
+                                  node_nbytes)
 from analysis_engine.settings import NODE_CACHE
-from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+from analysis_engine.tracing import span, trace
+from analysis_engine.utils import get_aircraft_info, get_registered_nodes
 
 
 logger = logging.getLogger(__name__)
 
+# CPU time of the calling thread where supported.
+cpu_time = getattr(time, 'thread_time', None) or \
+    getattr(time, 'process_time', None) or time.clock
+
+# Derived nodes keyed by tuples of node module paths. Only populated within
+# process_flights worker processes so that node modules are imported and
+# inspected once per worker rather than once per segment.
+_derived_nodes_cache = None
+
+# Result of processing a segment with process_flights. results is None and
+# error is a SegmentError if processing the segment failed.
+SegmentResult = namedtuple('SegmentResult', 'segment_info results error')
+
+# Error raised while processing a segment within a process_flights worker.
+# The exception is described by strings as it may not be pickleable.
+SegmentError = namedtuple('SegmentError', 'type message traceback')
 
 
 def geo_locate(hdf, items):
@@ -63,9 +97,17 @@ def geo_locate(hdf, items):
     lat_pos.array = repair_mask(lat_pos.array, repair_duration=None, extrapolate=True)
     lon_pos.array = repair_mask(lon_pos.array, repair_duration=None, extrapolate=True)
     
-    for item in itertools.chain.from_iterable(six.itervalues(items)):
-        item.latitude = lat_pos.at(item.index) or None
-        item.longitude = lon_pos.at(item.index) or None
+    located = list(itertools.chain.from_iterable(six.itervalues(items)))
+    indices = np.array([item.index for item in located], dtype=np.float64)
+    # OPT: Interpolate the position of every item in one array operation
+    # rather than calling lat_pos.at and lon_pos.at for each item.
+    latitudes = values_at_times(lat_pos.array, lat_pos.frequency,
+                                lat_pos.offset, indices).tolist()
+    longitudes = values_at_times(lon_pos.array, lon_pos.frequency,
+                                 lon_pos.offset, indices).tolist()
+    for item, latitude, longitude in zip(located, latitudes, longitudes):
+        item.latitude = latitude or None
+        item.longitude = longitude or None
     return items
 
 
@@ -94,11 +136,142 @@ def get_node_type(node, node_subclasses):
     return node.__class__.__name__
 
 
-def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
+def derive_order_dependencies(process_order, derived, gr_st=None):
+    '''
+    Determine the dependencies each derived node must wait for before it can
+    be derived concurrently with other nodes.
+
+    When nodes are derived serially, a dependency which appears later in the
+    process_order than the node depending upon it (the result of avoiding a
+    circular dependency) is not yet available and None is passed into the
+    derive method in its place. To preserve this behaviour, only
+    dependencies appearing earlier in the process_order are waited for and
+    the remainder are returned as unavailable.
+
+    :param process_order: Parameter / Node class names in the required order to
+        be processed.
+    :type process_order: [str]
+    :param derived: Derived node classes keyed by name which will be derived.
+    :type derived: dict
+    :param gr_st: Spanning tree of active nodes. Dependencies are sourced from
+        the derive methods of the node classes if not provided.
+    :type gr_st: nx.DiGraph or None
+    :returns: Dependencies to wait for and unavailable dependencies keyed by
+        node name.
+    :rtype: dict, dict
+    '''
+    positions = {n: i for i, n in enumerate(process_order) if n in derived}
+    waits_for = {}
+    unavailable = {}
+    for param_name, position in six.iteritems(positions):
+        if gr_st is not None and param_name in gr_st:
+            dep_names = gr_st[param_name]
+        else:
+            dep_names = derived[param_name].get_dependency_names()
+        waits_for[param_name] = set()
+        unavailable[param_name] = set()
+        for dep_name in dep_names:
+            if dep_name not in positions:
+                continue
+            elif positions[dep_name] < position:
+                waits_for[param_name].add(dep_name)
+            else:
+                unavailable[param_name].add(dep_name)
+    return waits_for, unavailable
+
+
+def profile_node(param_name, node, deps, profile, trace_memory=False):
+    '''
+    Derive a node recording the wall time, CPU time, time spent aligning
+    dependencies, peak memory allocated and size of the result in profile.
+
+    :param param_name: Name of the node.
+    :type param_name: str
+    :param node: Node to derive.
+    :type node: Node
+    :param deps: Dependencies to derive the node with.
+    :type deps: list
+    :param profile: Profile to store the node's statistics within.
+    :type profile: dict
+    :param trace_memory: Whether to record peak memory allocated using
+        tracemalloc which must already be tracing. Peak memory is shared
+        between threads so is only accurate when deriving serially.
+    :type trace_memory: bool
+    :returns: Derived node.
+    :rtype: Node
+    '''
+    stats = {'type': get_node_type(node, NODE_SUBCLASSES), 'align': 0.0}
+    node._profile = stats
+    if trace_memory:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start_time = time.time()
+    start_cpu = cpu_time()
+    try:
+        return node.get_derived(deps)
+    finally:
+        stats['wall'] = time.time() - start_time
+        stats['cpu'] = cpu_time() - start_cpu
+        stats['peak_memory'] = \
+            tracemalloc.get_traced_memory()[1] - start_memory \
+            if trace_memory else None
+        del node._profile
+        stats['nbytes'] = node_nbytes(node)
+        stats['items'] = len(node) if isinstance(node, list) else None
+        profile[param_name] = stats
+
+
+def _derive_node(param_name, node, deps, results, profile=None):
+    '''
+    Derive a node within a worker thread, putting the result into the
+    results queue rather than raising so that the calling thread can decide
+    whether to re-raise. The node derives from copies of its dependencies
+    (see Node.get_derived).
+    '''
+    node._copy_dependencies = True
+    try:
+        if profile is None:
+            node.get_derived(deps)
+        else:
+            profile_node(param_name, node, deps, profile)
+    except:
+        exc_info = sys.exc_info()
+    else:
+        exc_info = None
+    del node._copy_dependencies
+    results.put((param_name, node, exc_info))
+
+
+def derive_parameters(hdf, node_mgr, process_order, params=None, force=False,
+                      gr_st=None, workers=None, profile=None,
+                      cache_params=()):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
 
+    If more than one worker is requested, nodes are derived concurrently on a
+    pool of threads as soon as the nodes they depend upon have been derived.
+    Reading dependencies from and saving parameters to the HDF file is always
+    performed by the calling thread and the results are ordered by
+    process_order.
+
+    Objects shared between threads when deriving concurrently:
+
+    * hdf, node_mgr, params and the results are only read and modified by
+      the calling thread. Worker threads only call get_derived with the
+      dependencies prepared for them.
+    * The NodeCache is shared by every node aligning its dependencies and is
+      locked so that it may be used from several threads.
+    * Dependency nodes, including aligned copies within the NodeCache, may
+      be passed to several nodes derived at the same time. Nodes derived by
+      a worker thread are given deep copies of their dependencies, so derive
+      methods which modify their dependencies in place do not change the
+      dependencies of other nodes. This costs a copy of every dependency,
+      and phase statistics are not shared between nodes (see
+      NodeCache.values_within_slices).
+    * The debug accessors node._p, node._h and node._n refer to objects
+      modified by the calling thread and must not be used by derive methods.
+
     :param hdf: Data file accessor used to get and save parameter data and
         attributes
     :type hdf: hdf_file
@@ -107,12 +280,26 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     :param process_order: Parameter / Node class names in the required order to
         be processed
     :type process_order: list of strings
+    :param gr_st: Spanning tree of active nodes used to schedule nodes when
+        deriving concurrently.
+    :type gr_st: nx.DiGraph or None
+    :param workers: Number of threads to derive nodes with. Defaults to
+        settings.NODE_WORKERS.
+    :type workers: int or None
+    :param profile: If provided, the statistics of each derived node are
+        stored within it by name in process order (see profile_node).
+    :type profile: dict or None
+    :param cache_params: Names of parameters to keep in memory once read from
+        the HDF file until no remaining node depends upon them.
+    :type cache_params: iterable of str
     '''
     if not params:
         params = {}
+    if workers is None:
+        workers = settings.NODE_WORKERS
     # OPT: local lookup is faster than module-level (small).
     node_subclasses = NODE_SUBCLASSES
-    
+
     # store all derived params that aren't masked arrays
     approaches = {}
     # duplicate storage, but maintaining types
@@ -122,33 +309,30 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     sections = {}
     flight_attrs = {}
     # cache of nodes to avoid repeated array alignment
-    cache = {} if NODE_CACHE else None
+    cache = NodeCache() if NODE_CACHE else None
+    # parameters read from the HDF file which are kept in memory.
+    cache_params = set(cache_params)
+    hdf_params = {}
     duration = hdf.duration
 
-    for param_name in process_order:
-        if param_name in node_mgr.hdf_keys:
-            continue
-        
-        elif param_name in params:
-            node = params[param_name]
-            # populate output already at 1Hz
-            if node.node_type is KeyPointValueNode:
-                kpvs[param_name] = list(node)
-            elif node.node_type is KeyTimeInstanceNode:
-                ktis[param_name] = list(node)
-            elif node.node_type is FlightAttributeNode:
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            elif node.node_type is SectionNode:
-                sections[param_name] = list(node)
-            # DerivedParameterNodes are not supported in initial data.
-            continue
-
-        elif node_mgr.get_attribute(param_name) is not None:
-            # add attribute to dictionary of available params
-            ###params[param_name] = node_mgr.get_attribute(param_name)
-            #TODO: optimise with only one call to get_attribute
-            continue
-
+    def store_initial(param_name, node):
+        '''
+        Populate output from initial nodes already at 1Hz.
+        '''
+        if node.node_type is KeyPointValueNode:
+            kpvs[param_name] = list(node)
+        elif node.node_type is KeyTimeInstanceNode:
+            ktis[param_name] = list(node)
+        elif node.node_type is FlightAttributeNode:
+            flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        elif node.node_type is SectionNode:
+            sections[param_name] = list(node)
+        # DerivedParameterNodes are not supported in initial data.
+
+    def prepare_node(param_name, unavailable=()):
+        '''
+        Build ordered dependencies and initialise the node.
+        '''
         #NB raises KeyError if Node is "unknown"
         node_class = node_mgr.derived_nodes[param_name]
 
@@ -156,7 +340,9 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
         deps = []
         node_deps = node_class.get_dependency_names()
         for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
+            if dep_name in unavailable:  # not yet derived in process_order
+                deps.append(None)
+            elif dep_name in params:  # already calculated KPV/KTI/Phase
                 deps.append(params[dep_name])
             elif node_mgr.get_attribute(dep_name) is not None:
                 deps.append(node_mgr.get_attribute(dep_name))
@@ -165,8 +351,14 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
                 # all parameters (LFL or other) need get_aligned which is
                 # available on DerivedParameterNode
                 try:
-                    dp = derived_param_from_hdf(hdf.get_param(
-                        dep_name, valid_only=True), cache=cache)
+                    hdf_param = hdf_params.get(dep_name)
+                    if hdf_param is None:
+                        with span(dep_name, 'hdf.get_param'):
+                            hdf_param = hdf.get_param(dep_name,
+                                                      valid_only=True)
+                        if dep_name in cache_params:
+                            hdf_params[dep_name] = hdf_param
+                    dp = derived_param_from_hdf(hdf_param, cache=cache)
                 except KeyError:
                     # Parameter is invalid.
                     dp = None
@@ -186,21 +378,19 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
         node._h = hdf
         node._n = node_mgr
         logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
-        # Derive the resulting value
-        
-        try:
-            node = node.get_derived(deps)
-        except:
-            if not force:
-                raise
-        
+        return node, deps
+
+    def store_node(param_name, node):
+        '''
+        Validate the derived node and store its 1Hz aligned result.
+        '''
         del node._p
         del node._h
         del node._n
 
         if node.node_type is KeyPointValueNode:
             params[param_name] = node
-            
+
             aligned_kpvs = []
             for one_hz in node.get_aligned(P(frequency=1, offset=0)):
                 if not (0 <= one_hz.index <= duration+4):
@@ -211,7 +401,7 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
             kpvs[param_name] = aligned_kpvs
         elif node.node_type is KeyTimeInstanceNode:
             params[param_name] = node
-            
+
             aligned_ktis = []
             for one_hz in node.get_aligned(P(frequency=1, offset=0)):
                 if not (0 <= one_hz.index <= duration+4):
@@ -238,27 +428,27 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
                 # or hdf.duration.
                 fallback = lambda x, y: x if x is not None else y
 
-                duration = fallback(duration, 0)
+                section_duration = fallback(duration, 0)
 
                 start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
+                stop = fallback(one_hz.slice.stop, section_duration)
                 start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
+                stop_edge = fallback(one_hz.stop_edge, section_duration)
 
                 slice_ = slice(start, stop)
                 one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
                 aligned_section[index] = one_hz
 
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                if not (0 <= start <= section_duration and 0 <= stop <= section_duration + 4):
                     msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
                     raise IndexError(
-                        msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
+                        msg % (one_hz.name, start, stop, section_duration))
+                if not 0 <= start_edge <= section_duration:
                     msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
+                    raise IndexError(msg % (one_hz.name, start_edge, section_duration))
+                if not 0 <= stop_edge <= section_duration + 4:
                     msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
+                    raise IndexError(msg % (one_hz.name, stop_edge, section_duration))
                 #section_list.append(one_hz)
             params[param_name] = aligned_section
             sections[param_name] = list(aligned_section)
@@ -296,7 +486,8 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
                                                        expected_length,
                                                        array_length))
 
-            hdf.set_param(node)
+            with span(param_name, 'hdf.set_param'):
+                hdf.set_param(node)
             # Keep hdf_keys up to date.
             node_mgr.hdf_keys.append(param_name)
         elif issubclass(node.node_type, ApproachNode):
@@ -321,10 +512,154 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
             approaches[param_name] = list(aligned_approach)
         else:
             raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
+
+    derived = {}
+    initial = set()
+    for param_name in process_order:
+        if param_name in node_mgr.hdf_keys:
+            continue
+        elif param_name in params:
+            initial.add(param_name)
+        elif node_mgr.get_attribute(param_name) is not None:
+            continue
+        else:
+            #NB raises KeyError if Node is "unknown"
+            derived[param_name] = node_mgr.derived_nodes[param_name]
+    waits_for, unavailable = \
+        derive_order_dependencies(process_order, derived, gr_st=gr_st)
+    # dependencies read by each node; derived dependencies and those within
+    # the HDF file.
+    hdf_keys = set(node_mgr.hdf_keys)
+    consumes = {}
+    for param_name, node_class in six.iteritems(derived):
+        if gr_st is not None and param_name in gr_st:
+            dep_names = gr_st[param_name]
+        else:
+            dep_names = node_class.get_dependency_names()
+        consumes[param_name] = waits_for[param_name].union(
+            d for d in dep_names if d in hdf_keys)
+    # number of nodes yet to be derived which depend upon each node.
+    consumers = collections.Counter(
+        itertools.chain.from_iterable(six.itervalues(consumes)))
+    if cache is not None:
+        cache.set_consumers(consumers)
+
+    def release_dependencies(param_name):
+        '''
+        Release aligned and cached arrays of dependencies which no remaining
+        node depends upon once param_name has been derived.
+        '''
+        for dep_name in consumes[param_name]:
+            consumers[dep_name] -= 1
+            if consumers[dep_name]:
+                continue
+            if cache is not None:
+                cache.release(dep_name)
+            hdf_params.pop(dep_name, None)
+
+    if workers > 1:
+        for param_name in process_order:
+            if param_name in initial:
+                store_initial(param_name, params[param_name])
+
+        # consumers of each node which are waiting for it to be derived
+        pending_deps = {}
+        waiting = {}
+        for param_name, dep_names in six.iteritems(waits_for):
+            pending_deps[param_name] = set(dep_names)
+            for dep_name in dep_names:
+                waiting.setdefault(dep_name, []).append(param_name)
+        positions = {n: i for i, n in enumerate(process_order)}
+        ready = [n for n in process_order if n in derived and not waits_for[n]]
+        results = queue.Queue()
+        pool = ThreadPool(workers)
+        try:
+            pending = 0
+            while ready or pending:
+                # submit ready nodes in process order for determinism.
+                for param_name in sorted(ready, key=positions.get):
+                    node, deps = prepare_node(
+                        param_name, unavailable=unavailable[param_name])
+                    pool.apply_async(_derive_node,
+                                     (param_name, node, deps, results,
+                                      profile))
+                    pending += 1
+                ready = []
+
+                param_name, node, exc_info = results.get()
+                pending -= 1
+                if exc_info and not force:
+                    six.reraise(*exc_info)
+                store_node(param_name, node)
+                release_dependencies(param_name)
+                for consumer in waiting.get(param_name, []):
+                    pending_deps[consumer].discard(param_name)
+                    if not pending_deps[consumer]:
+                        ready.append(consumer)
+        finally:
+            pool.terminate()
+
+        # merge results back in process order regardless of when each node
+        # completed.
+        ktis, kpvs, sections, approaches, flight_attrs = [
+            OrderedDict((n, d[n]) for n in process_order if n in d)
+            for d in (ktis, kpvs, sections, approaches, flight_attrs)]
+        if profile is not None:
+            stats = dict(profile)
+            profile.clear()
+            profile.update((n, stats[n]) for n in process_order if n in stats)
+    else:
+        trace_memory = bool(tracemalloc and tracemalloc.is_tracing() and
+                            hasattr(tracemalloc, 'reset_peak'))
+        for param_name in process_order:
+            if param_name in initial:
+                store_initial(param_name, params[param_name])
+                continue
+            elif param_name not in derived:
+                continue
+
+            node, deps = prepare_node(param_name)
+            # Derive the resulting value
+
+            try:
+                if profile is None:
+                    node = node.get_derived(deps)
+                else:
+                    node = profile_node(param_name, node, deps, profile,
+                                        trace_memory=trace_memory)
+            except:
+                if not force:
+                    raise
+
+            store_node(param_name, node)
+            release_dependencies(param_name)
+
+    if cache is not None:
+        logger.info("Node cache: %s", cache)
     return ktis, kpvs, sections, approaches, flight_attrs
 
 
+def _get_derived_nodes(modules):
+    '''
+    Get derived nodes from modules, reusing the derived nodes previously
+    found within this worker process if available.
+
+    When settings.NODE_REGISTRY_PATH is set, node modules are only imported
+    once their nodes are needed to resolve dependencies or are derived.
+
+    :param modules: Module paths to import nodes from.
+    :type modules: [str]
+    :returns: Node names to Node classes.
+    :rtype: dict or RegisteredNodes
+    '''
+    if _derived_nodes_cache is None:
+        return get_registered_nodes(modules)
+    key = tuple(modules)
+    if key not in _derived_nodes_cache:
+        _derived_nodes_cache[key] = get_registered_nodes(modules)
+    return _derived_nodes_cache[key]
+
+
 def parse_analyser_profiles(analyser_profiles, filter_modules=None):
     '''
     Parse analyser profiles into additional_modules and required nodes as
@@ -351,14 +686,15 @@ def parse_analyser_profiles(analyser_profiles, filter_modules=None):
                 continue
             additional_modules.append(import_path)
             if is_required:
-                required_nodes.extend(get_derived_nodes([import_path]))
+                required_nodes.extend(get_registered_nodes([import_path]))
     return additional_modules, required_nodes
 
 
 def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
                    additional_modules=[], pre_flight_kwargs={}, force=False,
-                   initial={}, reprocess=False, requested_only=False):
+                   initial={}, reprocess=False, requested_only=False,
+                   workers=None, profile=False, trace_path=None):
     '''
     Processes the HDF file (segment_info['File']) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -392,6 +728,12 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     :type reprocess: bool
     :param requested_only: Process only requested parameters, not dependencies or children.
     :type requested_only: bool
+    :param workers: Number of threads to derive nodes with concurrently. Defaults to settings.NODE_WORKERS.
+    :type workers: int or None
+    :param profile: Profile each derived node, returning the statistics as 'profile' within the results (see profile_node). Memory is traced with tracemalloc when available which slows processing.
+    :type profile: bool
+    :param trace_path: Path to write a trace-event JSON of the processing timeline to, viewable within chrome://tracing or Perfetto.
+    :type trace_path: str or None
 
     :returns: See below:
     :rtype: Dict
@@ -569,7 +911,7 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     else:
         node_modules = settings.NODE_MODULES + additional_modules
     # go through modules to get derived nodes
-    derived_nodes = get_derived_nodes(node_modules)
+    derived_nodes = _get_derived_nodes(node_modules)
 
     if requested:
         requested_subset = \
@@ -583,7 +925,7 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     # include all flight attributes as requested
     if include_flight_attributes:
         requested_subset = list(set(
-            requested_subset + list(get_derived_nodes(
+            requested_subset + list(_get_derived_nodes(
                 ['analysis_engine.flight_attribute']).keys())))
 
     initial = process_flight_to_nodes(initial)
@@ -591,7 +933,7 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         initial.pop(node_name, None)
 
     # open HDF for reading
-    with hdf_file(hdf_path) as hdf:
+    with trace(trace_path), hdf_file(hdf_path) as hdf:
         hdf.start_datetime = segment_info['Start Datetime']
         hook = hooks.PRE_FLIGHT_ANALYSIS
         if hook:
@@ -605,8 +947,10 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         # Merge Params
         param_names = hdf.valid_lfl_param_names() if reprocess else \
             hdf.valid_param_names()
-        pre_process_parameters(hdf, segment_info, param_names, required,
-                               aircraft_info, achieved_flight_record, force=force)
+        with span('pre_process_parameters', 'process_flight'):
+            pre_process_parameters(hdf, segment_info, param_names, required,
+                                   aircraft_info, achieved_flight_record,
+                                   force=force)
 
         if requested_only:
             param_names = list(set(param_names) - set(requested_subset))
@@ -615,54 +959,186 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             segment_info, hdf.duration, param_names,
             requested_subset, required, derived_nodes, aircraft_info,
             achieved_flight_record)
+        cache_params = []
         if requested_only:
             # TODO: derive dependencies which are unavailable
             # XXX: maintain ordering of requested iterable
             process_order = [r for r in requested if r in requested_subset]
+            gr_st = None
         else:
             # calculate dependency tree
-            process_order, gr_st = dependency_order(node_mgr, draw=False)
+            with span('dependency_order', 'process_flight'):
+                process_order, gr_st = dependency_order(node_mgr, draw=False)
             if settings.CACHE_PARAMETER_MIN_USAGE:
                 # find params used more than CACHE_PARAMETER_MIN_USAGE
                 for node in gr_st.nodes():
                     if node in node_mgr.derived_nodes:
-                        # this includes KPV/KTIs but they'll be ignored by HDF
-                        qty = len(gr_st.predecessors(node))
+                        # this includes KPV/KTIs but they're not read from
+                        # the HDF file
+                        qty = gr_st.in_degree(node)
                         if qty > settings.CACHE_PARAMETER_MIN_USAGE:
-                            hdf.cache_param_list.append(node)
-                logging.info("HDF set to cache parameters: %s",
-                             hdf.cache_param_list)
+                            cache_params.append(node)
+                logging.info("Caching parameters: %s", cache_params)
 
         # derive parameters
-        ktis, kpvs, sections, approaches, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force)
-
-        # geo locate KTIs
-        ktis = geo_locate(hdf, ktis)
-        ktis = _timestamp(segment_info['Start Datetime'], ktis)
-
-        # geo locate KPVs
-        kpvs = geo_locate(hdf, kpvs)
-        kpvs = _timestamp(segment_info['Start Datetime'], kpvs)
+        node_profile = OrderedDict() if profile else None
+        trace_memory = bool(profile and tracemalloc and
+                            not tracemalloc.is_tracing())
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            with span('derive_parameters', 'process_flight'):
+                ktis, kpvs, sections, approaches, flight_attrs = \
+                    derive_parameters(hdf, node_mgr, process_order,
+                                      params=initial, force=force,
+                                      gr_st=gr_st, workers=workers,
+                                      profile=node_profile,
+                                      cache_params=cache_params)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+
+        with span('geo_locate', 'process_flight'):
+            # geo locate KTIs
+            ktis = geo_locate(hdf, ktis)
+            ktis = _timestamp(segment_info['Start Datetime'], ktis)
+
+            # geo locate KPVs
+            kpvs = geo_locate(hdf, kpvs)
+            kpvs = _timestamp(segment_info['Start Datetime'], kpvs)
 
         if not requested_only:
-            # Store version of FlightDataAnalyser
-            hdf.analysis_version = __version__
+            with span('attributes', 'hdf.set_attr'):
+                # Store version of FlightDataAnalyser
+                hdf.analysis_version = __version__
 
-            # Store dependency tree
-            hdf.dependency_tree = json.dumps(json_graph.node_link_data(gr_st))
+                # Store dependency tree
+                hdf.dependency_tree = \
+                    json.dumps(json_graph.node_link_data(gr_st))
 
-            # Store aircraft info
-            hdf.set_attr('aircraft_info', aircraft_info)
-            hdf.set_attr('achieved_flight_record', achieved_flight_record)
+                # Store aircraft info
+                hdf.set_attr('aircraft_info', aircraft_info)
+                hdf.set_attr('achieved_flight_record', achieved_flight_record)
 
-    return {
+    res = {
         'flight': flight_attrs,
         'kti': ktis,
         'kpv': kpvs,
         'approach': approaches,
         'phases': sections,
     }
+    if profile:
+        res['profile'] = node_profile
+    return res
+
+
+PROFILE_FIELDS = ('name', 'type', 'wall', 'cpu', 'align', 'peak_memory',
+                  'nbytes', 'items')
+
+
+def write_profile(profile, dest_path):
+    '''
+    Write a node profile returned by process_flight as JSON if dest_path has
+    a .json extension, otherwise as CSV.
+
+    :param profile: Statistics of each node keyed by name.
+    :type profile: dict
+    :param dest_path: Path to write the profile to.
+    :type dest_path: str
+    '''
+    rows = [dict(stats, name=name) for name, stats in six.iteritems(profile)]
+    if os.path.splitext(dest_path)[1].lower() == '.json':
+        with open(dest_path, 'w') as fh:
+            json.dump(rows, fh, indent=2)
+        return
+    import csv
+    with open(dest_path, 'w') as fh:
+        writer = csv.DictWriter(fh, PROFILE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _init_process_flights_worker(additional_modules):
+    '''
+    Initialise a process_flights worker process by finding the derived
+    nodes once for all of the segments the worker will process.
+
+    :param additional_modules: Additional module paths to import.
+    :type additional_modules: [str]
+    '''
+    global _derived_nodes_cache
+    _derived_nodes_cache = {}
+    _get_derived_nodes(settings.NODE_MODULES + additional_modules)
+    _get_derived_nodes(['analysis_engine.flight_attribute'])
+    _get_derived_nodes(settings.PRE_PROCESSING_MODULE_PATHS)
+
+
+def _process_flight_worker(kwargs):
+    '''
+    Process a single segment within a process_flights worker process.
+
+    Exceptions are returned as a SegmentError rather than raised so that a
+    single segment failing does not stop the other segments from being
+    processed.
+
+    :param kwargs: Keyword arguments for process_flight.
+    :type kwargs: dict
+    :returns: Segment info with either process_flight results or the error raised.
+    :rtype: SegmentResult
+    '''
+    segment_info = kwargs['segment_info']
+    try:
+        res = process_flight(**kwargs)
+    except Exception as err:
+        logger.exception("Failed to process segment: %s", segment_info.get('File'))
+        error = SegmentError(type(err).__name__, str(err),
+                             traceback.format_exc())
+        return SegmentResult(segment_info, None, error)
+    return SegmentResult(segment_info, res, None)
+
+
+def process_flights(segments, processes=None, maxtasksperchild=None, **kwargs):
+    '''
+    Processes many segments on a pool of worker processes. Each worker
+    imports the node modules once and is reused for many segments. Results
+    are yielded in the order of segments.
+
+    A segment which fails to process does not stop the others; its result
+    has error set to a SegmentError describing the exception raised.
+
+    :param segments: Segments to process. Each segment is a dict of keyword arguments for process_flight which must include 'segment_info' and 'tail_number'.
+    :type segments: iterable of dict
+    :param processes: Number of worker processes. Defaults to the number of CPUs.
+    :type processes: int or None
+    :param maxtasksperchild: Number of segments a worker will process before being replaced. Defaults to the lifetime of the pool.
+    :type maxtasksperchild: int or None
+    :param kwargs: Keyword arguments for process_flight shared by all segments. Segment keyword arguments take precedence.
+    :type kwargs: dict
+    :returns: Generator of SegmentResult (segment_info, results, error) tuples where results is None and error is a SegmentError if processing the segment failed.
+    :rtype: generator
+    '''
+    def segment_kwargs():
+        for segment in segments:
+            segment_kwargs = dict(kwargs)
+            segment_kwargs.update(segment)
+            yield segment_kwargs
+
+    additional_modules = list(kwargs.get('additional_modules', []))
+    pool = multiprocessing.Pool(processes=processes,
+                                initializer=_init_process_flights_worker,
+                                initargs=(additional_modules,),
+                                maxtasksperchild=maxtasksperchild)
+    try:
+        for result in pool.imap(_process_flight_worker, segment_kwargs(),
+                                chunksize=1):
+            yield result
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
 
 def pre_process_parameters(hdf, segment_info, param_names, required,
                      aircraft_info, achieved_flight_record, force=False):
@@ -673,7 +1149,7 @@ def pre_process_parameters(hdf, segment_info, param_names, required,
     removing circular dependacies.
     '''
 
-    pre_processing_nodes = get_derived_nodes(settings.PRE_PROCESSING_MODULE_PATHS)
+    pre_processing_nodes = _get_derived_nodes(settings.PRE_PROCESSING_MODULE_PATHS)
     requested = list(pre_processing_nodes.keys())
 
     node_mgr = NodeManager(
@@ -696,8 +1172,8 @@ def main():
     logger.setLevel(logging.INFO)
     logger.addHandler(logging.StreamHandler(stream=sys.stdout))
     parser = argparse.ArgumentParser(description="Process a flight.")
-    parser.add_argument('file', type=str,
-                        help='Path of file to process.')
+    parser.add_argument('file', type=str, nargs='+',
+                        help='Path of file(s) to process.')
     help = 'Disable writing a CSV of the processing results.'
     parser.add_argument('-disable-csv', dest='disable_csv',
                         action='store_true', help=help)
@@ -718,6 +1194,18 @@ def main():
                         help='Strip the HDF5 file to only the LFL parameters')
     parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
                         help='Verbose logging')
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help='Number of threads to derive nodes with '
+                        'concurrently.')
+    parser.add_argument('--processes', dest='processes', type=int,
+                        default=None, help='Number of worker processes to '
+                        'process multiple files with.')
+    parser.add_argument('--trace', dest='trace', action='store_true',
+                        help='Write a trace-event JSON of the processing '
+                        'timeline for chrome://tracing or Perfetto.')
+    parser.add_argument('--profile', dest='profile', action='store_true',
+                        help='Write the time and memory used deriving each '
+                        'node as JSON and CSV.')
 
     # Aircraft info
     parser.add_argument('-aircraft-family', dest='aircraft_family', type=str,
@@ -814,12 +1302,13 @@ def main():
     if args.engine_type:
         aircraft_info['Engine Type'] = args.engine_type
 
-    # Derive parameters to new HDF
-    hdf_copy = copy_file(args.file, postfix='_process')
+    # Derive parameters to new HDFs
+    hdf_copies = [copy_file(f, postfix='_process') for f in args.file]
     if args.strip:
-        with hdf_file(hdf_copy) as hdf:
-            hdf.delete_params(hdf.derived_keys())
-    
+        for hdf_copy in hdf_copies:
+            with hdf_file(hdf_copy) as hdf:
+                hdf.delete_params(hdf.derived_keys())
+
     if args.initial:
         if not os.path.exists(args.initial):
             parser.error('Path for initial json data not found: %s' % args.initial)
@@ -827,34 +1316,63 @@ def main():
     else:
         initial = {}
 
-    segment_info = {
-        'File': hdf_copy,
-        'Segment Type': args.segment_type,
-    }
-    res = process_flight(
-        segment_info, args.tail_number, aircraft_info=aircraft_info,
-        requested=args.requested, required=args.required, initial=initial,
-        include_flight_attributes=False,
+    kwargs = dict(
+        aircraft_info=aircraft_info, requested=args.requested,
+        required=args.required, initial=initial,
+        include_flight_attributes=False, workers=args.workers,
+        profile=args.profile,
     )
-    # Flatten results.
-    res = {k: list(itertools.chain.from_iterable(six.itervalues(v)))
-           for k, v in six.iteritems(res)}
-    
-    logger.info("Derived parameters stored in hdf: %s", hdf_copy)
-    # Write CSV file
-    if not args.disable_csv:
-        csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
-        csv_flight_details(hdf_copy, res['kti'], res['kpv'], res['phases'],
-                           dest_path=csv_dest)
-        logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
-    # Write KML file
-    if not args.disable_kml:
-        kml_dest = os.path.splitext(hdf_copy)[0] + '.kml'
-        dest = track_to_kml(
-            hdf_copy, res['kti'], res['kpv'], res['approach'],
-            dest_path=kml_dest)
-        if dest:
-            logger.info("Flight Track with attributes writen to kml: %s", dest)
+    segments = [{'segment_info': {'File': hdf_copy,
+                                  'Segment Type': args.segment_type},
+                 'tail_number': args.tail_number,
+                 'trace_path': os.path.splitext(hdf_copy)[0] + '_trace.json'
+                 if args.trace else None}
+                for hdf_copy in hdf_copies]
+    if len(segments) > 1 or args.processes:
+        results = process_flights(segments, processes=args.processes, **kwargs)
+    else:
+        segment = segments[0]
+        results = [SegmentResult(
+            segment['segment_info'],
+            process_flight(segment['segment_info'], segment['tail_number'],
+                           trace_path=segment['trace_path'], **kwargs),
+            None)]
+
+    for segment_info, res, error in results:
+        hdf_copy = segment_info['File']
+        if error:
+            logger.error("Failed to process '%s': %s: %s\n%s", hdf_copy,
+                         error.type, error.message, error.traceback)
+            continue
+        if args.profile:
+            profile = res.pop('profile')
+            for ext in ('.json', '.csv'):
+                profile_dest = \
+                    os.path.splitext(hdf_copy)[0] + '_profile' + ext
+                write_profile(profile, profile_dest)
+                logger.info("Node profile written to: %s", profile_dest)
+        # Flatten results.
+        res = {k: list(itertools.chain.from_iterable(six.itervalues(v)))
+               for k, v in six.iteritems(res)}
+
+        logger.info("Derived parameters stored in hdf: %s", hdf_copy)
+        if args.trace:
+            logger.info("Processing trace written to: %s",
+                        os.path.splitext(hdf_copy)[0] + '_trace.json')
+        # Write CSV file
+        if not args.disable_csv:
+            csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
+            csv_flight_details(hdf_copy, res['kti'], res['kpv'], res['phases'],
+                               dest_path=csv_dest)
+            logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
+        # Write KML file
+        if not args.disable_kml:
+            kml_dest = os.path.splitext(hdf_copy)[0] + '.kml'
+            dest = track_to_kml(
+                hdf_copy, res['kti'], res['kpv'], res['approach'],
+                dest_path=kml_dest)
+            if dest:
+                logger.info("Flight Track with attributes writen to kml: %s", dest)
 
     # - END -
 
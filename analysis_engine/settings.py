@@ -63,7 +63,8 @@ API_HANDLER = API_FILE_HANDLER
 # User's home directory, override in analyser_custom_settings.py
 WORKING_DIR = os.path.expanduser('~')
 
-# Cache parameters which are used more than n times in HDF
+# Keep parameters used by more than n nodes in memory once read from the HDF
+# file until no remaining node depends upon them. 0 disables caching.
 CACHE_PARAMETER_MIN_USAGE = 0
 
 
@@ -105,6 +106,70 @@ NODE_CACHE = True
 # accurate to. A value of None will retain full accuracy.
 NODE_CACHE_OFFSET_DP = None
 
+# Maximum number of bytes of aligned arrays held within the node cache. The
+# least recently used nodes are evicted first, preferring those which no
+# remaining node depends upon. A value of None does not limit the cache.
+NODE_CACHE_MAX_BYTES = 1024 ** 3  # 1 GiB
+
+# Maximum number of alignment tables, the gather offsets and interpolation
+# weights for each combination of sample rates and timing offsets, kept in
+# memory by align.
+ALIGN_TABLE_CACHE_SIZE = 1024
+
+# Maximum number of can_operate results, for each combination of available
+# dependencies and Attribute values, kept in memory per node class.
+CAN_OPERATE_CACHE_SIZE = 64
+
+
+##############################################################################
+# Dependency Order Cache
+
+
+# Cache the processing order and spanning tree of the dependency graph. Flights
+# recorded with the same frame, requesting the same nodes with the same
+# attributes share a signature and skip dependency resolution.
+DEPENDENCY_ORDER_CACHE = True
+
+# Maximum number of dependency orders kept in memory.
+DEPENDENCY_ORDER_CACHE_SIZE = 32
+
+# Directory where dependency orders are pickled so that they are shared between
+# processes and runs. A value of None only caches in memory.
+DEPENDENCY_ORDER_CACHE_DIR = None
+
+
+##############################################################################
+# Node Registry
+
+
+# Path to a node registry written by "python -m analysis_engine.utils registry
+# <path>". Nodes within registered modules are found and their dependencies
+# resolved from the registry, importing a module only once one of its Nodes is
+# needed. Modules missing from the registry or changed since it was written
+# are imported as usual. A value of None imports every node module.
+NODE_REGISTRY_PATH = None
+
+
+##############################################################################
+# Concurrency
+
+
+# Number of threads used to derive nodes concurrently once the nodes they
+# depend upon have been derived. Much of the numpy processing within library
+# functions releases the GIL. A value of 0 or 1 derives nodes serially in the
+# process order.
+NODE_WORKERS = 0
+
+
+##############################################################################
+# Kernel Acceleration
+
+
+# Compile the sequential kernels within analysis_engine.kernels, such as
+# hysteresis, with numba when it is installed. Otherwise, or if compiling
+# fails, the kernels run as Python loops over lists of floats.
+KERNEL_ACCELERATION = True
+
 
 ##############################################################################
 # Parameter Analysis
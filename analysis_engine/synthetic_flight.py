@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Generate HDF files of synthetic flights containing plausible LFL parameters
+for measuring how processing scales with flight duration and the number of
+recorded parameters.
+
+    python -m analysis_engine.synthetic_flight synthetic.hdf5 --duration 36000 --params 500
+
+Parameters are generated from a seed so that files are reproducible. Each
+flight taxis, takes off, climbs, cruises, descends and lands; long durations
+may be split into many flights with ground time in between.
+'''
+
+##############################################################################
+# Imports
+
+
+from __future__ import division, print_function
+
+import argparse
+import logging
+import numpy as np
+
+from datetime import datetime
+
+from hdfaccess.file import hdf_file
+
+from analysis_engine.node import M, P
+
+
+##############################################################################
+# Constants
+
+
+logger = logging.getLogger(name=__name__)
+
+# Sample rates supported by align (Hz).
+FREQUENCIES = (0.25, 0.5, 1, 2, 4, 8, 16)
+
+# Recorded frequencies of the core parameters.
+CORE_FREQUENCIES = {
+    'Airspeed': 1,
+    'Altitude STD': 1,
+    'Heading': 1,
+    'Latitude': 0.25,
+    'Longitude': 0.25,
+    'Pitch': 4,
+    'Roll': 4,
+    'Acceleration Normal': 8,
+    'Eng (*) N1': 1,
+    'Eng (*) N2': 1,
+    'Gear Down': 1,
+    'AP Engaged': 1,
+    'Eng (*) Fire': 0.25,
+}
+
+GEAR_DOWN_MAPPING = {0: 'Up', 1: 'Down'}
+AP_ENGAGED_MAPPING = {0: '-', 1: 'Engaged'}
+FIRE_MAPPING = {0: '-', 1: 'Fire'}
+
+# Fraction of each flight spent within each phase: (phase, fraction,
+# airspeed kts, altitude fraction of cruise, N1 %) at the end of the phase.
+FLIGHT_PROFILE = (
+    ('start', 0.0, 0, 0.0, 20),
+    ('taxi out', 0.06, 15, 0.0, 25),
+    ('takeoff', 0.08, 150, 0.0, 92),
+    ('climb', 0.25, 280, 1.0, 88),
+    ('cruise', 0.70, 280, 1.0, 80),
+    ('descent', 0.88, 180, 0.05, 35),
+    ('landing', 0.91, 20, 0.0, 60),
+    ('taxi in', 1.0, 0, 0.0, 20),
+)
+
+# Fraction of each flight cycle spent on the ground between flights.
+GROUND_FRACTION = 0.2
+
+
+##############################################################################
+# Generation
+
+
+def _flight_cycles(duration, flights):
+    '''
+    :returns: Fraction of the current flight and whether on the ground
+        between flights for each second.
+    :rtype: (np.ndarray, np.ndarray)
+    '''
+    seconds = np.arange(duration, dtype=np.float64)
+    cycle_length = duration / flights
+    position = (seconds % cycle_length) / cycle_length
+    if flights == 1:
+        return position, np.zeros(duration, dtype=bool)
+    # The end of each cycle (except the last) is spent on the ground.
+    flying = (1 - GROUND_FRACTION)
+    between = (position > flying) & (seconds < cycle_length * (flights - 1))
+    return np.minimum(position / flying, 1.0), between
+
+
+def _resample(array, frequency, offset):
+    '''
+    Linearly resample a 1Hz array at frequency with the first sample at
+    offset seconds.
+    '''
+    times = np.arange(int(len(array) * frequency)) / frequency + offset
+    return np.interp(times, np.arange(len(array)), array)
+
+
+def _mask_runs(array, density, state, max_run=16):
+    '''
+    Mask random runs of samples covering approximately density of the array.
+    '''
+    if not density:
+        return array
+    mask = np.zeros(len(array), dtype=bool)
+    target = int(len(array) * density)
+    while mask.sum() < target:
+        count = max(1, (target - mask.sum()) * 2 // max_run)
+        starts = state.randint(0, len(array), count)
+        lengths = state.randint(1, max_run + 1, count)
+        for start, length in zip(starts, lengths):
+            mask[start:start + length] = True
+    array.mask = mask
+    return array
+
+
+def synthetic_parameters(duration=3600, param_count=None, flights=1,
+                         frequencies=FREQUENCIES, mask_density=0.0,
+                         engine_count=2, cruise_altitude=35000, seed=0):
+    '''
+    Generate synthetic LFL parameters.
+
+    :param duration: Duration of the data in seconds.
+    :type duration: int
+    :param param_count: Total number of parameters. Additional parameters are
+        generated at the frequencies provided to reach the count. If None,
+        only the core parameters are generated.
+    :type param_count: int or None
+    :param flights: Number of flights within the duration.
+    :type flights: int
+    :param frequencies: Sample rates of additional parameters in Hz.
+    :type frequencies: iterable of float
+    :param mask_density: Fraction of samples masked in random runs, between
+        0 and 1.
+    :type mask_density: float
+    :param engine_count: Number of engines.
+    :type engine_count: int
+    :param cruise_altitude: Cruise altitude in feet.
+    :type cruise_altitude: int
+    :param seed: Seed of the random number generator.
+    :type seed: int
+    :returns: Parameters recorded with an LFL.
+    :rtype: [DerivedParameterNode]
+    :raises ValueError: If mask_density is not between 0 and 1.
+    '''
+    if not 0 <= mask_density <= 1:
+        raise ValueError('Mask density must be between 0 and 1, got %r.'
+                         % mask_density)
+    duration = int(duration)
+    state = np.random.RandomState(seed)
+    position, between = _flight_cycles(duration, flights)
+    times, _, airspeeds, altitudes, n1s = zip(*[
+        (t, p, a, h, n) for p, t, a, h, n in FLIGHT_PROFILE])
+    airspeed = np.interp(position, times, airspeeds)
+    altitude = np.interp(position, times, altitudes) * cruise_altitude
+    n1 = np.interp(position, times, n1s)
+    airspeed[between] = 0
+    altitude[between] = 0
+    n1[between] = 0
+    airborne = altitude > 0
+
+    # A new heading on each leg of the flight with gentle turns.
+    heading = np.cumsum(state.normal(0, 0.5, duration) * airborne) + \
+        state.uniform(0, 360)
+    roll = np.gradient(heading) * 10
+    pitch = np.gradient(altitude) / 10
+    # Ground speed in nautical miles per second moves the aircraft.
+    distance = airspeed / 3600
+    latitude = 50 + np.cumsum(distance * np.cos(np.radians(heading))) / 60
+    longitude = np.cumsum(distance * np.sin(np.radians(heading))) / \
+        (60 * np.cos(np.radians(latitude)))
+
+    core = [
+        ('Airspeed', airspeed + state.normal(0, 0.5, duration)),
+        ('Altitude STD', altitude + state.normal(0, 5, duration)),
+        ('Heading', heading % 360),
+        ('Latitude', latitude),
+        ('Longitude', longitude),
+        ('Pitch', pitch + state.normal(0, 0.2, duration)),
+        ('Roll', roll + state.normal(0, 0.2, duration)),
+        ('Acceleration Normal', 1 + state.normal(0, 0.02, duration)),
+    ]
+    for engine in range(1, engine_count + 1):
+        engine_n1 = n1 + state.normal(0, 0.3, duration)
+        core.append(('Eng (%d) N1' % engine, engine_n1))
+        core.append(('Eng (%d) N2' % engine, 60 + engine_n1 * 0.4))
+
+    params = []
+    for name, array in core:
+        frequency = CORE_FREQUENCIES.get(
+            name, CORE_FREQUENCIES.get('Eng (*) %s' % name[-2:], 1))
+        offset = state.uniform(0, 1 / frequency)
+        array = np.ma.array(_resample(array, frequency, offset))
+        params.append(P(name, _mask_runs(array, mask_density, state),
+                        frequency=frequency, offset=offset, lfl=True))
+
+    multistates = [
+        ('Gear Down', airborne & (altitude < 2000) | ~airborne,
+         GEAR_DOWN_MAPPING, CORE_FREQUENCIES['Gear Down']),
+        ('AP Engaged', altitude > 1000, AP_ENGAGED_MAPPING,
+         CORE_FREQUENCIES['AP Engaged']),
+    ]
+    for engine in range(1, engine_count + 1):
+        multistates.append(('Eng (%d) Fire' % engine,
+                            np.zeros(duration, dtype=bool), FIRE_MAPPING,
+                            CORE_FREQUENCIES['Eng (*) Fire']))
+    for name, states, mapping, frequency in multistates:
+        offset = state.uniform(0, 1 / frequency)
+        raw = np.round(_resample(states.astype(np.float64), frequency,
+                                 offset)).astype(np.int64)
+        array = _mask_runs(np.ma.array(raw), mask_density, state)
+        params.append(M(name, array, frequency=frequency, offset=offset,
+                        values_mapping=mapping, lfl=True))
+
+    frequencies = list(frequencies)
+    for index in range(max(0, (param_count or 0) - len(params))):
+        frequency = frequencies[index % len(frequencies)]
+        offset = state.uniform(0, 1 / frequency)
+        size = int(duration * frequency)
+        period = state.uniform(60, 3600)
+        array = np.ma.array(
+            np.sin(np.arange(size) / (frequency * period)) * 100 +
+            state.normal(0, 1, size))
+        params.append(P('Synthetic Parameter (%d)' % (index + 1),
+                        _mask_runs(array, mask_density, state),
+                        frequency=frequency, offset=offset, lfl=True))
+    return params
+
+
+def write_synthetic_flight(dest_path, start_datetime=None, **kwargs):
+    '''
+    Write synthetic LFL parameters to an HDF file.
+
+    :param dest_path: Path of HDF file to create.
+    :type dest_path: str
+    :param start_datetime: Datetime of the start of the data.
+    :type start_datetime: datetime or None
+    :param kwargs: Keyword arguments for synthetic_parameters.
+    :returns: dest_path
+    :rtype: str
+    '''
+    params = synthetic_parameters(**kwargs)
+    with hdf_file(dest_path, create=True) as hdf:
+        hdf.duration = int(kwargs.get('duration', 3600))
+        hdf.start_datetime = start_datetime or datetime(2000, 1, 1)
+        for param in params:
+            hdf.set_param(param)
+    logger.info("Synthetic flight with %d parameters written to: %s",
+                len(params), dest_path)
+    return dest_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate an HDF file of synthetic flight data.')
+    parser.add_argument('file', type=str, help='Path of HDF file to create.')
+    parser.add_argument('--duration', type=int, default=3600,
+                        help='Duration in seconds (default: %(default)s).')
+    parser.add_argument('--params', dest='param_count', type=int,
+                        default=None, help='Total number of parameters.')
+    parser.add_argument('--flights', type=int, default=1,
+                        help='Number of flights (default: %(default)s).')
+    parser.add_argument('--frequencies', type=float, nargs='+',
+                        default=FREQUENCIES, help='Sample rates of '
+                        'additional parameters in Hz.')
+    parser.add_argument('--mask-density', dest='mask_density', type=float,
+                        default=0.0, help='Fraction of samples masked.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed (default: %(default)s).')
+    args = parser.parse_args()
+    if not 0 <= args.mask_density <= 1:
+        parser.error('--mask-density must be between 0 and 1.')
+    logging.basicConfig(level=logging.INFO)
+    write_synthetic_flight(
+        args.file, duration=args.duration, param_count=args.param_count,
+        flights=args.flights, frequencies=args.frequencies,
+        mask_density=args.mask_density, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+'''
+Trace-event recording of the processing timeline which can be viewed within
+chrome://tracing or Perfetto (https://ui.perfetto.dev).
+
+Spans are only recorded while a trace is active, otherwise span returns a
+shared context manager which does nothing:
+
+    start_trace()
+    with span('Airspeed', 'derive'):
+        ...
+    stop_trace('trace.json')
+'''
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+
+# The active Tracer, None when not tracing.
+_tracer = None
+
+
+class _NullSpan(object):
+    '''
+    Context manager returned when not tracing.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    '''
+    Context manager recording a complete ('X') trace event on exit.
+    '''
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add(self.name, self.category, self.start, time.time(),
+                        self.args)
+        return False
+
+
+class Tracer(object):
+    '''
+    Collects trace events from all threads of the current process.
+    '''
+    def __init__(self):
+        self.start = time.time()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+
+    def add(self, name, category, start, stop, args=None):
+        '''
+        Add a complete event.
+
+        :param name: Name of the event.
+        :type name: str
+        :param category: Comma separated categories of the event.
+        :type category: str
+        :param start: Start time in seconds since the epoch.
+        :type start: float
+        :param stop: Stop time in seconds since the epoch.
+        :type stop: float
+        :param args: Arguments displayed with the event.
+        :type args: dict or None
+        '''
+        thread = threading.current_thread()
+        self.threads[thread.ident] = thread.name
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.start) * 1e6,  # microseconds
+            'dur': (stop - start) * 1e6,
+            'pid': self.pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        # OPT: list.append is atomic so threads do not need a lock.
+        self.events.append(event)
+
+    def trace_events(self):
+        '''
+        :returns: Trace events including thread name metadata.
+        :rtype: list of dict
+        '''
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                     'tid': tid, 'args': {'name': name}}
+                    for tid, name in self.threads.items()]
+        return metadata + self.events
+
+
+def is_tracing():
+    '''
+    :returns: Whether a trace is active.
+    :rtype: bool
+    '''
+    return _tracer is not None
+
+
+def span(name, category='', **args):
+    '''
+    Record the duration of a with block as a trace event if tracing.
+
+    :param name: Name of the event.
+    :type name: str
+    :param category: Comma separated categories of the event.
+    :type category: str
+    :param args: Arguments displayed with the event.
+    :returns: Context manager.
+    '''
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return _Span(tracer, name, category, args)
+
+
+def add_span(name, category, start, stop, **args):
+    '''
+    Record a trace event which has already been timed if tracing.
+
+    :param name: Name of the event.
+    :type name: str
+    :param category: Comma separated categories of the event.
+    :type category: str
+    :param start: Start time in seconds since the epoch (time.time).
+    :type start: float
+    :param stop: Stop time in seconds since the epoch (time.time).
+    :type stop: float
+    :param args: Arguments displayed with the event.
+    '''
+    tracer = _tracer
+    if tracer is not None:
+        tracer.add(name, category, start, stop, args)
+
+
+def start_trace():
+    '''
+    Start recording trace events unless a trace is already active.
+
+    :returns: Whether a new trace was started.
+    :rtype: bool
+    '''
+    global _tracer
+    if _tracer is not None:
+        return False
+    _tracer = Tracer()
+    return True
+
+
+def stop_trace(dest_path=None):
+    '''
+    Stop recording trace events.
+
+    :param dest_path: Path to write the trace-event JSON to.
+    :type dest_path: str or None
+    :returns: Trace events recorded.
+    :rtype: list of dict
+    '''
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return []
+    events = tracer.trace_events()
+    if dest_path:
+        with open(dest_path, 'w') as fh:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fh)
+    return events
+
+
+@contextmanager
+def trace(dest_path=None):
+    '''
+    Trace the with block, writing the trace-event JSON to dest_path. Does
+    nothing if dest_path is not set or a trace is already active.
+
+    :param dest_path: Path to write the trace-event JSON to.
+    :type dest_path: str or None
+    '''
+    started = bool(dest_path) and start_trace()
+    try:
+        yield
+    finally:
+        if started:
+            stop_trace(dest_path)
@@ -6,9 +6,15 @@ import os
 import re
 import simplejson
 import six
+import sys
 import zipfile
 
-from collections import defaultdict
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+from collections import defaultdict, OrderedDict
+from importlib import import_module
 from inspect import getargspec, isclass, ismodule
 
 from hdfaccess.file import hdf_file
@@ -16,7 +22,8 @@ from hdfaccess.utils import strip_hdf
 
 from flightdatautilities import api
 
-from analysis_engine.dependency_graph import dependencies3, graph_nodes
+from analysis_engine.dependency_graph import (
+    dependencies3, describe_node, graph_nodes)
 # node classes required for unpickling
 from analysis_engine.node import (
     loads, save, Node, NodeManager,
@@ -200,6 +207,217 @@ def get_derived_nodes(modules):
     return nodes
 
 
+class RegisteredNodes(Mapping):
+    '''
+    Node names to Node classes, as returned by get_derived_nodes, where the
+    Nodes found within a node registry are only imported when looked up.
+
+    records describes every Node (see describe_node) and versions holds the
+    version of each registered module (see dependency_signature) so that
+    dependencies may be resolved without importing the Nodes.
+    '''
+    def __init__(self, records, versions=None, nodes=None):
+        '''
+        :param records: Description of each Node keyed by name.
+        :type records: OrderedDict
+        :param versions: Name, __version__ and modification time of each registered module.
+        :type versions: dict
+        :param nodes: Node classes which have already been imported keyed by name.
+        :type nodes: dict
+        '''
+        self.records = records
+        self.versions = versions or {}
+        self._nodes = dict(nodes or {})
+
+    def __repr__(self):
+        return '%s(%d nodes, %d imported)' % (
+            self.__class__.__name__, len(self.records), len(self._nodes))
+
+    def __getitem__(self, name):
+        try:
+            return self._nodes[name]
+        except KeyError:
+            record = self.records[name]
+        module = import_module(record['module'])
+        node = self._nodes[name] = getattr(module, record['class'])
+        return node
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+def _source_version(module_name):
+    '''
+    :returns: Path, size, modification time and __version__ of an imported module.
+    :rtype: dict
+    '''
+    module = sys.modules[module_name]
+    path = os.path.abspath(module.__file__)
+    stat = os.stat(path)
+    return {'path': path, 'size': stat.st_size, 'mtime': stat.st_mtime,
+            'version': getattr(module, '__version__', None)}
+
+
+def get_node_registry(modules):
+    '''
+    Describe the Nodes within modules so that processing can find them and
+    resolve their dependencies without importing the modules (see
+    get_registered_nodes).
+
+    Modules are described separately, preserving the order of Nodes within
+    each so that registered Nodes override each other as within
+    get_derived_nodes. The source of each module is recorded so that changes
+    made after the registry is written can be detected.
+
+    :param modules: Module names to import Nodes from.
+    :type modules: [str]
+    :returns: Node registry which may be written as JSON.
+    :rtype: dict
+    '''
+    registry = {'modules': OrderedDict(), 'sources': {}}
+    for module_name in modules:
+        records = OrderedDict()
+        for name, node in six.iteritems(get_derived_nodes([module_name])):
+            record = describe_node(node)
+            if getattr(sys.modules.get(record['module']), record['class'],
+                       None) is not node:
+                logger.warning("Node '%s' cannot be imported by name so "
+                               "module '%s' will not be registered.", name,
+                               module_name)
+                break
+            if hasattr(node, 'names'):
+                # FormattedNameNode (KPV/KTI) can have many names
+                record['names'] = node.names()
+            else:
+                record['names'] = [node.get_name()]
+            records[name] = record
+        else:
+            registry['modules'][module_name] = records
+            for source in set([module_name]).union(
+                    r['module'] for r in records.values()):
+                registry['sources'][source] = _source_version(source)
+    return registry
+
+
+def write_node_registry(path, modules=None):
+    '''
+    Write a node registry (see get_node_registry) to be used by setting
+    settings.NODE_REGISTRY_PATH.
+
+    :param path: Path to write the registry to as JSON.
+    :type path: str
+    :param modules: Module names to import Nodes from. Defaults to every node module within settings.
+    :type modules: [str] or None
+    :returns: The registry written.
+    :rtype: dict
+    '''
+    if modules is None:
+        modules = settings.NODE_MODULES + \
+            settings.NODE_HELICOPTER_MODULE_PATHS + \
+            settings.PRE_PROCESSING_MODULE_PATHS
+    registry = get_node_registry(OrderedDict.fromkeys(modules))
+    temp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(temp_path, 'w') as fh:
+        simplejson.dump(registry, fh)
+    # Rename so that processes never read a partial registry.
+    os.rename(temp_path, path)
+    return registry
+
+
+# Node registries loaded from each path with the modification time of the file.
+_node_registries = {}
+
+
+def load_node_registry(path):
+    '''
+    :param path: Path of a node registry written by write_node_registry.
+    :type path: str
+    :returns: The node registry or None if it cannot be read.
+    :rtype: dict or None
+    '''
+    try:
+        mtime = os.path.getmtime(path)
+        loaded = _node_registries.get(path)
+        if loaded is not None and loaded[0] == mtime:
+            return loaded[1]
+        with open(path) as fh:
+            registry = simplejson.load(fh, object_pairs_hook=OrderedDict)
+    except (IOError, OSError, ValueError):
+        logger.warning("Could not load node registry from '%s'.", path)
+        return None
+    _node_registries[path] = (mtime, registry)
+    return registry
+
+
+def _registered_records(registry, module):
+    '''
+    :returns: Records of the Nodes within module or None if the module is not registered or has changed since the registry was written.
+    :rtype: OrderedDict or None
+    '''
+    if not isinstance(module, six.string_types) or \
+       module not in registry['modules']:
+        return None
+    records = registry['modules'][module]
+    for source in set([module]).union(r['module'] for r in records.values()):
+        version = registry['sources'][source]
+        try:
+            stat = os.stat(version['path'])
+        except OSError:
+            stat = None
+        if stat is None or stat.st_size != version['size'] or \
+           stat.st_mtime != version['mtime']:
+            logger.info("Node registry is out of date for module '%s'.",
+                        source)
+            return None
+    return records
+
+
+def get_registered_nodes(modules, registry_path=None):
+    '''
+    Get Node classes from modules as get_derived_nodes does, finding the
+    Nodes of modules within the node registry without importing them. A
+    module is imported once one of its Nodes is looked up. Modules missing
+    from the registry or changed since it was written are imported.
+
+    :param modules: Modules or module names to import Nodes from.
+    :type modules: [str or module]
+    :param registry_path: Path of the node registry. Defaults to settings.NODE_REGISTRY_PATH.
+    :type registry_path: str or None
+    :returns: Node names to Node classes, as from get_derived_nodes if there is no registry.
+    :rtype: RegisteredNodes or dict
+    '''
+    registry_path = registry_path or settings.NODE_REGISTRY_PATH
+    registry = load_node_registry(registry_path) if registry_path else None
+    if registry is None:
+        return get_derived_nodes(modules)
+
+    if isinstance(modules, six.string_types) or ismodule(modules):
+        modules = [modules]
+    records = OrderedDict()
+    versions = {}
+    nodes = {}
+    for module in modules:
+        module_records = _registered_records(registry, module)
+        if module_records is None:
+            for name, node in six.iteritems(get_derived_nodes([module])):
+                records[name] = describe_node(node)
+                nodes[name] = node
+            continue
+        for name, record in six.iteritems(module_records):
+            records[name] = record
+            nodes.pop(name, None)
+            source = registry['sources'][record['module']]
+            versions[record['module']] = (
+                record['module'], source['version'], source['mtime'])
+    return RegisteredNodes(records, versions, nodes)
+
+
 def derived_trimmer(hdf_path, node_names, dest):
     '''
     Trims an HDF file of parameters which are not dependencies of nodes in
@@ -239,22 +457,57 @@ def _get_names(module_locations, fetch_names=True, fetch_dependencies=False,
     :param fetch_dependencies: Return names of the arguments in derive methods
     :type fetch_dependencies: Bool
     '''
-    nodes = get_derived_nodes(module_locations)
+    # OPT: Read names from the node registry where available rather than
+    # importing node modules.
+    nodes = get_registered_nodes(module_locations)
+    records = getattr(nodes, 'records', {})
     names = []
-    for name, node in six.iteritems(nodes):
+    for name in nodes:
         if filter_nodes and name not in filter_nodes:
             continue
+        record = records.get(name, {})
         if fetch_names:
-            if hasattr(node, 'names'):
+            if 'names' in record:
+                names.extend(record['names'])
+            elif hasattr(nodes[name], 'names'):
                 # FormattedNameNode (KPV/KTI) can have many names
-                names.extend(node.names())
+                names.extend(nodes[name].names())
             else:
-                names.append(node.get_name())
+                names.append(nodes[name].get_name())
         if fetch_dependencies:
-            names.extend(node.get_dependency_names())
+            if 'dependencies' in record:
+                names.extend(record['dependencies'])
+            else:
+                names.extend(nodes[name].get_dependency_names())
     return sorted(names)
 
 
+def get_name_registries(module_locations, filter_nodes=None):
+    '''
+    Get the names each FormattedNameNode can create so that they can be
+    exported, e.g. to tools building a schema of KPVs and KTIs. The ID of
+    each name is its position within the names.
+
+    :param module_locations: list of locations to fetch modules from
+    :type module_locations: list of strings
+    :param filter_nodes: Only include these nodes.
+    :type filter_nodes: list of strings
+    :returns: NAME_FORMAT and names keyed by node name.
+    :rtype: dict
+    '''
+    registries = {}
+    for name, node in six.iteritems(get_derived_nodes(module_locations)):
+        if filter_nodes and name not in filter_nodes:
+            continue
+        if hasattr(node, 'get_name_registry'):
+            registry = node.get_name_registry()
+            registries[name] = {
+                'name_format': node.NAME_FORMAT,
+                'names': sorted(registry.name_ids, key=registry.name_ids.get),
+            }
+    return registries
+
+
 def list_parameters():
     '''
     Return an ordered list of parameters.
@@ -334,7 +587,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     subparser = parser.add_subparsers(dest='command',
                                       description="Utility command, currently "
-                                      "'trimmer' and 'list' are supported",
+                                      "'trimmer', 'list', 'names' and "
+                                      "'registry' are supported",
                                       help='Additional help')
     trimmer_parser = subparser.add_parser('trimmer')
     trimmer_parser.add_argument('input_file_path', help='Input hdf filename.')
@@ -352,6 +606,17 @@ if __name__ == '__main__':
     #list_parser.add_argument('--list', action='store_true',
     #                         help='Output as Python list')
 
+    names_parser = subparser.add_parser('names')
+    names_parser.add_argument('--filter-nodes', nargs='+', help='Node names')
+    names_parser.add_argument('--additional-modules', nargs='+',
+                              help='Additional modules')
+
+    registry_parser = subparser.add_parser('registry')
+    registry_parser.add_argument('output_file_path',
+                                 help='Output node registry filename.')
+    registry_parser.add_argument('--additional-modules', nargs='+',
+                                 help='Additional modules')
+
     args = parser.parse_args()
     if args.command == 'trimmer':
         if not os.path.isfile(args.input_file_path):
@@ -376,5 +641,20 @@ if __name__ == '__main__':
         if args.additional_modules:
             modules += args.additional_modules
         print(_get_names(modules, **kwargs))
+    elif args.command == 'names':
+        modules = list(settings.NODE_MODULES)
+        if args.additional_modules:
+            modules += args.additional_modules
+        print(simplejson.dumps(
+            get_name_registries(modules, filter_nodes=args.filter_nodes),
+            indent=2, sort_keys=True))
+    elif args.command == 'registry':
+        modules = settings.NODE_MODULES + \
+            settings.NODE_HELICOPTER_MODULE_PATHS + \
+            settings.PRE_PROCESSING_MODULE_PATHS
+        if args.additional_modules:
+            modules += args.additional_modules
+        registry = write_node_registry(args.output_file_path, modules)
+        print('Registered %d modules.' % len(registry['modules']))
     else:
         parser.error("'%s' is not a known command." % args.command)
@@ -0,0 +1,5 @@
+'''
+Performance benchmarks of the FlightDataAnalyzer.
+
+Run from the root of the repository with "python -m benchmarks --help".
+'''
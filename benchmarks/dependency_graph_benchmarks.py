@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Benchmarks of resolving the processing order of synthetic node sets larger
+than the node modules, as custom node modules and profiles grow.
+
+Nodes are generated from a fixed seed so that runs are reproducible.
+'''
+
+##############################################################################
+# Imports
+
+
+import types
+
+from datetime import datetime
+
+import numpy as np
+
+from analysis_engine.dependency_graph import dependencies3, graph_nodes
+from analysis_engine.library import any_deps
+from analysis_engine.node import DerivedParameterNode, NodeManager, P
+
+from benchmarks.runner import benchmark
+
+
+##############################################################################
+# Constants
+
+
+# Number of derived nodes generated.
+NODE_COUNT = 12000
+
+# Number of recorded parameters within the LFL.
+LFL_COUNT = 1000
+
+# Nodes depend upon nodes generated up to this many nodes before them, which
+# builds dependency trees thousands of nodes deep.
+WINDOW = 200
+
+# Ratio of nodes which also depend upon a node generated after them, forming
+# circular dependencies which must be avoided.
+CIRCULAR_RATIO = 0.02
+
+
+##############################################################################
+# Helpers
+
+
+def random_state():
+    return np.random.RandomState(0)
+
+
+def _derive_template(count):
+    '''
+    :returns: A derive function accepting count keyword arguments.
+    :rtype: function
+    '''
+    namespace = {}
+    exec('def derive(self, %s):\n    pass\n' % ', '.join(
+        'd%d=None' % n for n in range(count)), namespace)
+    return namespace['derive']
+
+
+def synthetic_nodes(count=NODE_COUNT, lfl_count=LFL_COUNT):
+    '''
+    Generate derived node classes with dependencies upon recorded parameters,
+    earlier nodes and occasionally later nodes. Half of the nodes can operate
+    with any of their dependencies.
+
+    :returns: LFL parameter names and derived node classes keyed by name.
+    :rtype: ([str], dict)
+    '''
+    state = random_state()
+    lfl_params = ['Raw %04d' % n for n in range(lfl_count)]
+    names = ['Node %05d' % n for n in range(count)]
+    templates = {}
+    derived_nodes = {}
+    for index, name in enumerate(names):
+        dependencies = [lfl_params[state.randint(lfl_count)]]
+        earlier = names[max(index - WINDOW, 0):index]
+        if earlier:
+            dependencies.extend(earlier[n] for n in state.randint(
+                len(earlier), size=state.randint(1, 4)))
+        if index + 1 < count and state.uniform() < CIRCULAR_RATIO:
+            dependencies.append(names[state.randint(index + 1, count)])
+        dependencies = list(dict.fromkeys(dependencies))
+        state.shuffle(dependencies)
+        template = templates.get(len(dependencies))
+        if template is None:
+            template = templates[len(dependencies)] = \
+                _derive_template(len(dependencies))
+        derive = types.FunctionType(
+            template.__code__, template.__globals__, 'derive',
+            tuple(P(d) for d in dependencies))
+        attrs = {'name': name, 'derive': derive, '__module__': __name__}
+        if state.uniform() < 0.5:
+            attrs['can_operate'] = classmethod(any_deps)
+        derived_nodes[name] = type(str(name.replace(' ', '')),
+                                   (DerivedParameterNode,), attrs)
+    return lfl_params, derived_nodes
+
+
+def node_manager():
+    '''
+    :returns: Node manager requesting every synthetic node.
+    :rtype: NodeManager
+    '''
+    lfl_params, derived_nodes = synthetic_nodes()
+    return NodeManager({'Start Datetime': datetime(2012, 12, 30)}, 3600,
+                       lfl_params, sorted(derived_nodes), [], derived_nodes,
+                       {}, {})
+
+
+##############################################################################
+# Benchmarks
+
+
+@benchmark('dependency_graph.graph_nodes.synthetic_12k', repeat=3)
+def graph_nodes_synthetic():
+    node_mgr = node_manager()
+    return lambda: graph_nodes(node_mgr)
+
+
+@benchmark('dependency_graph.dependencies3.synthetic_12k', repeat=3)
+def dependencies3_synthetic():
+    node_mgr = node_manager()
+    graph = graph_nodes(node_mgr)
+    return lambda: dependencies3(graph, 'root', node_mgr)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Benchmarks of processing whole flights and splitting data files into
+segments using the specimen flight within tests/test_data and synthetic
+flights generated by analysis_engine.synthetic_flight.
+
+The specimen flight is copied before each run as processing saves derived
+parameters to the file. Copying takes a small fraction of the run time.
+'''
+
+##############################################################################
+# Imports
+
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from datetime import datetime
+
+from benchmarks.runner import SkipBenchmark, benchmark
+
+
+##############################################################################
+# Constants
+
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'tests', 'test_data')
+
+SPECIMEN_PATH = os.path.join(DATA_PATH, 'Specimen_Flight.hdf5')
+
+SPECIMEN_AIRCRAFT_INFO = {
+    'Tail Number': 'G-ABCD',
+    'Aircraft Type': 'aeroplane',
+    'Model': 'B737-301',
+    'Series': 'B737-300',
+    'Family': 'B737 Classic',
+    'Manufacturer': 'Boeing',
+    'Precise Positioning': False,
+    'Frame': '737-5',
+    'Frame Qualifier': 'Altitude_Radio_EFIS',
+}
+
+SPECIMEN_START_DATETIME = datetime(2012, 12, 30, 19, 9, 6)
+
+
+##############################################################################
+# Helpers
+
+
+def setup_environment():
+    '''
+    Use local API files and disable hooks as in the specimen flight test.
+
+    :returns: Temporary directory for processed files.
+    :rtype: str
+    '''
+    if not os.path.exists(SPECIMEN_PATH):
+        raise SkipBenchmark('Specimen flight not found: %s' % SPECIMEN_PATH)
+    from analysis_engine import hooks, settings
+    settings.API_HANDLER = 'analysis_engine.api_handler.FileHandler'
+    hooks.PRE_FILE_ANALYSIS = None
+    hooks.PRE_FLIGHT_ANALYSIS = None
+    temp_dir = tempfile.mkdtemp(prefix='fda_benchmark_')
+    atexit.register(shutil.rmtree, temp_dir, True)
+    return temp_dir
+
+
+##############################################################################
+# Benchmarks
+
+
+@benchmark('flight.process_flight.specimen', repeat=3, number=1)
+def process_specimen_flight():
+    from analysis_engine.process_flight import process_flight
+    temp_dir = setup_environment()
+    hdf_path = os.path.join(temp_dir, 'specimen.hdf5')
+
+    def run():
+        shutil.copy(SPECIMEN_PATH, hdf_path)
+        segment_info = {
+            'File': hdf_path,
+            'Start Datetime': SPECIMEN_START_DATETIME,
+            'Segment Type': 'START_AND_STOP',
+        }
+        process_flight(segment_info, SPECIMEN_AIRCRAFT_INFO['Tail Number'],
+                       aircraft_info=dict(SPECIMEN_AIRCRAFT_INFO))
+    return run
+
+
+@benchmark('flight.split_hdf_to_segments.specimen_x3', repeat=3, number=1)
+def split_concatenated_flights():
+    from hdfaccess.utils import concat_hdf
+    from analysis_engine.split_hdf_to_segments import split_hdf_to_segments
+    temp_dir = setup_environment()
+    parts = []
+    for index in range(3):
+        part = os.path.join(temp_dir, 'part_%d.hdf5' % index)
+        shutil.copy(SPECIMEN_PATH, part)
+        parts.append(part)
+    hdf_path = concat_hdf(parts, dest=os.path.join(temp_dir, 'joined.hdf5'))
+    segment_dir = os.path.join(temp_dir, 'segments')
+    os.mkdir(segment_dir)
+
+    def run():
+        split_hdf_to_segments(hdf_path, dict(SPECIMEN_AIRCRAFT_INFO),
+                              fallback_dt=SPECIMEN_START_DATETIME,
+                              dest_dir=segment_dir)
+    return run
+
+
+@benchmark('flight.process_flight.synthetic_8h', repeat=3, number=1)
+def process_synthetic_flight():
+    from analysis_engine.process_flight import process_flight
+    from analysis_engine.synthetic_flight import write_synthetic_flight
+    temp_dir = setup_environment()
+    source_path = write_synthetic_flight(
+        os.path.join(temp_dir, 'synthetic_source.hdf5'),
+        start_datetime=SPECIMEN_START_DATETIME, duration=8 * 60 * 60,
+        param_count=200, mask_density=0.01)
+    hdf_path = os.path.join(temp_dir, 'synthetic.hdf5')
+
+    def run():
+        shutil.copy(source_path, hdf_path)
+        segment_info = {
+            'File': hdf_path,
+            'Start Datetime': SPECIMEN_START_DATETIME,
+            'Segment Type': 'START_AND_STOP',
+        }
+        process_flight(segment_info, SPECIMEN_AIRCRAFT_INFO['Tail Number'],
+                       aircraft_info=dict(SPECIMEN_AIRCRAFT_INFO))
+    return run
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Benchmarks of the library functions which dominate node processing time.
+
+Arrays are generated from a fixed seed so that runs are reproducible.
+'''
+
+##############################################################################
+# Imports
+
+
+import numpy as np
+
+from analysis_engine.library import (
+    align,
+    align_many,
+    hysteresis,
+    index_at_value,
+    index_at_values,
+    max_maintained_values,
+    repair_mask,
+    runs_of_ones,
+    second_window,
+    slices_and,
+    slices_from_to,
+    slices_or,
+    values_at_times,
+    vstack_params_sw,
+)
+from analysis_engine.node import P
+
+from benchmarks.runner import benchmark
+
+
+##############################################################################
+# Constants
+
+
+# Duration of the generated data: a four hour flight.
+DURATION = 4 * 60 * 60
+
+
+##############################################################################
+# Helpers
+
+
+def random_state():
+    return np.random.RandomState(0)
+
+
+def flight_profile(frequency=1):
+    '''
+    :returns: Altitude like array climbing to and descending from 35000 ft
+        with noise.
+    :rtype: np.ma.masked_array
+    '''
+    size = int(DURATION * frequency)
+    climb = size // 6
+    array = np.concatenate([
+        np.linspace(0, 35000, climb),
+        np.full(size - 2 * climb, 35000.0),
+        np.linspace(35000, 0, climb),
+    ])
+    array += random_state().normal(0, 20, size)
+    return np.ma.array(array)
+
+
+def masked_runs(array, density=0.05, max_run=10):
+    '''
+    Mask random runs of samples covering approximately density of the array.
+    '''
+    array = array.copy()
+    state = random_state()
+    starts = state.randint(0, len(array), int(len(array) * density / 5))
+    lengths = state.randint(1, max_run, len(starts))
+    for start, length in zip(starts, lengths):
+        array[start:start + length] = np.ma.masked
+    return array
+
+
+def discrete_events(count=2000, frequency=4):
+    '''
+    :returns: Sorted slices of short events spread over the flight.
+    :rtype: [slice]
+    '''
+    size = int(DURATION * frequency)
+    starts = np.sort(random_state().choice(size - 10, count, replace=False))
+    starts = starts[np.append(True, np.diff(starts) > 10)]
+    return [slice(int(start), int(start) + 5) for start in starts]
+
+
+##############################################################################
+# Benchmarks
+
+
+@benchmark('library.align.downsample')
+def align_downsample():
+    slave = P('Slave', flight_profile(8), frequency=8, offset=0.1)
+    master = P('Master', flight_profile(1), frequency=1, offset=0.5)
+    return lambda: align(slave, master)
+
+
+@benchmark('library.align.upsample')
+def align_upsample():
+    slave = P('Slave', flight_profile(0.25), frequency=0.25, offset=1.5)
+    master = P('Master', flight_profile(8), frequency=8, offset=0.1)
+    return lambda: align(slave, master)
+
+
+@benchmark('library.align.multistate')
+def align_multistate():
+    slave = P('Slave', np.ma.array(random_state().randint(0, 2, DURATION * 4)),
+              frequency=4, offset=0.2)
+    master = P('Master', flight_profile(1), frequency=1, offset=0.5)
+    return lambda: align(slave, master, interpolate=False)
+
+
+@benchmark('library.align_many.engines')
+def align_many_engines():
+    params = [P('Eng (%d) N1' % n, masked_runs(flight_profile(4)),
+                frequency=4, offset=0.2) for n in range(1, 5)]
+    master = P('Master', flight_profile(1), frequency=1, offset=0.5)
+    return lambda: align_many(params, master)
+
+
+@benchmark('library.repair_mask.interpolate')
+def repair_mask_interpolate():
+    array = masked_runs(flight_profile(8))
+    return lambda: repair_mask(array, frequency=8, copy=True,
+                               extrapolate=True)
+
+
+@benchmark('library.repair_mask.fill_start')
+def repair_mask_fill_start():
+    array = masked_runs(flight_profile(8))
+    return lambda: repair_mask(array, frequency=8, copy=True,
+                               method='fill_start')
+
+
+@benchmark('library.repair_mask.fragmented')
+def repair_mask_fragmented():
+    # Noisy parameter with thousands of one or two sample dropouts.
+    array = masked_runs(flight_profile(8), density=0.3, max_run=3)
+    return lambda: repair_mask(array, frequency=8, copy=True)
+
+
+@benchmark('library.max_maintained_values')
+def max_maintained_values_engines():
+    # Four engines maintained for 10 seconds to 5 minutes during takeoff and
+    # go-around ratings at 4Hz.
+    state = random_state()
+    array = np.ma.array(np.round(state.normal(95, 1, (4, DURATION * 4)), 1))
+    phases = [slice(1200, 3600), slice(DURATION * 3, DURATION * 3 + 2400)]
+    return lambda: max_maintained_values(array, [10, 20, 300], 4, phases)
+
+
+@benchmark('library.hysteresis')
+def hysteresis_noisy():
+    array = flight_profile(8)
+    return lambda: hysteresis(array, 100)
+
+
+@benchmark('library.second_window')
+def second_window_8hz():
+    array = flight_profile(8)
+    return lambda: second_window(array, 8, 3)
+
+
+@benchmark('library.second_window.long')
+def second_window_long():
+    array = masked_runs(flight_profile(16))
+    return lambda: second_window(array, 16, 30)
+
+
+@benchmark('library.vstack_params_sw.engines')
+def vstack_params_sw_engines():
+    params = [P('Eng (%d) N1' % n, masked_runs(flight_profile(8)),
+                frequency=8) for n in range(1, 5)]
+    return lambda: vstack_params_sw(3, *params)
+
+
+@benchmark('library.index_at_value')
+def index_at_value_descent():
+    array = flight_profile(8)
+    _slice = slice(len(array) // 2, None)
+    return lambda: index_at_value(array, 1000, _slice=_slice)
+
+
+@benchmark('library.index_at_values')
+def index_at_values_descent():
+    array = flight_profile(8)
+    _slice = slice(len(array) // 2, None)
+    thresholds = list(range(500, 10500, 500))
+    return lambda: index_at_values(array, thresholds, _slice=_slice)
+
+
+@benchmark('library.slices_from_to')
+def slices_from_to_climb():
+    array = flight_profile(8)
+    return lambda: slices_from_to(array, 1000, 10000)
+
+
+@benchmark('library.slices_and.events')
+def slices_and_events():
+    events = discrete_events()
+    others = [slice(s.start + 3, s.stop + 3) for s in discrete_events(1500)]
+    return lambda: slices_and(events, others)
+
+
+@benchmark('library.slices_or.events')
+def slices_or_events():
+    events = discrete_events()
+    others = [slice(s.start + 3, s.stop + 3) for s in discrete_events(1500)]
+    return lambda: slices_or(events, others)
+
+
+@benchmark('library.runs_of_ones.discrete')
+def runs_of_ones_discrete():
+    state = random_state()
+    size = DURATION * 4
+    bits = np.ma.array(state.rand(size) < 0.3, mask=state.rand(size) < 0.01)
+    return lambda: runs_of_ones(bits)
+
+
+@benchmark('library.values_at_times')
+def values_at_times_events():
+    array = flight_profile()
+    times = random_state().uniform(0, DURATION, 10000)
+    return lambda: values_at_times(array, 1, 0.5, times)
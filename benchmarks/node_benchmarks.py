@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Benchmarks of node lookups which derive methods call in loops over other
+nodes.
+
+Nodes are generated from a fixed seed so that runs are reproducible.
+'''
+
+##############################################################################
+# Imports
+
+
+import numpy as np
+
+from analysis_engine.library import max_value
+from analysis_engine.node import (FlightPhaseNode, KeyPointValueNode, Node,
+                                  NodeCache, P)
+
+from benchmarks.runner import benchmark
+
+
+##############################################################################
+# Constants
+
+
+# Duration of the generated data: a four hour flight.
+DURATION = 4 * 60 * 60
+
+# Number of lookups made by each benchmark.
+LOOKUPS = 500
+
+
+##############################################################################
+# Helpers
+
+
+def random_state():
+    return np.random.RandomState(0)
+
+
+def phases(count=2000, names=('Holding', 'Turning In Air', 'Level Flight')):
+    '''
+    :returns: Phases of random length spread over the flight with one of names.
+    :rtype: FlightPhaseNode
+    '''
+    state = random_state()
+    starts = np.sort(state.randint(0, DURATION, count))
+    lengths = state.randint(5, 300, count)
+    node = FlightPhaseNode('Phases', frequency=1)
+    for start, length, name in zip(starts.tolist(), lengths.tolist(),
+                                   state.choice(names, count).tolist()):
+        node.create_phase(slice(start, start + length), name=name)
+    return node
+
+
+def lookup_indices():
+    return random_state().uniform(0, DURATION, LOOKUPS).tolist()
+
+
+##############################################################################
+# Benchmarks
+
+
+@benchmark('node.section_node.get.containing_index')
+def section_node_get_containing_index():
+    node = phases()
+    indices = lookup_indices()
+    return lambda: [node.get(containing_index=index, name='Holding')
+                    for index in indices]
+
+
+@benchmark('node.section_node.get.within_slice')
+def section_node_get_within_slice():
+    node = phases()
+    indices = lookup_indices()
+    return lambda: [node.get(within_slice=slice(index, index + 600),
+                             within_use='any') for index in indices]
+
+
+@benchmark('node.section_node.get_next')
+def section_node_get_next():
+    node = phases()
+    indices = lookup_indices()
+    return lambda: [(node.get_next(index), node.get_previous(index))
+                    for index in indices]
+
+
+@benchmark('node.section_node.get_surrounding')
+def section_node_get_surrounding():
+    node = phases()
+    indices = lookup_indices()
+    return lambda: [node.get_surrounding(index) for index in indices]
+
+
+@benchmark('node.key_point_value_node.get_aligned')
+def key_point_value_node_get_aligned():
+    state = random_state()
+    node = KeyPointValueNode('Kpvs', frequency=4)
+    for index, value in zip(state.uniform(0, DURATION * 4, 10000).tolist(),
+                            state.normal(0, 100, 10000).tolist()):
+        node.create_kpv(index, value)
+    param = P('Param', frequency=1, offset=0.5)
+    return lambda: node.get_aligned(param)
+
+
+@benchmark('node.key_point_value_node.create_kpv')
+def key_point_value_node_create_kpv():
+    class EngAtAltitudeWithFlap(KeyPointValueNode):
+        NAME_FORMAT = 'Eng (%(engine)d) At %(altitude)d Ft With Flap %(flap)s'
+        NAME_VALUES = {'engine': [1, 2, 3, 4],
+                       'altitude': list(range(100, 5001, 100)),
+                       'flap': ['0', '1', '5', '10', '15', '25', '30', '40']}
+
+    state = random_state()
+    name_values = EngAtAltitudeWithFlap.NAME_VALUES
+    kwargs = [{name: values[state.randint(len(values))]
+               for name, values in name_values.items()}
+              for _ in range(LOOKUPS)]
+
+    def run():
+        node = EngAtAltitudeWithFlap()
+        for index, replace_values in enumerate(kwargs):
+            node.create_kpv(index, 1.0, **replace_values)
+        return node.get(name='Eng (1) At 100 Ft With Flap 0')
+    return run
+
+
+@benchmark('node.key_point_value_node.create_kpvs_within_slices')
+def key_point_value_node_create_kpvs_within_slices():
+    state = random_state()
+    array = np.ma.array(np.cumsum(state.normal(0, 1, DURATION)))
+    array[state.randint(0, DURATION, DURATION // 100)] = np.ma.masked
+    sections = phases()
+
+    def run():
+        node = KeyPointValueNode('Kpvs', frequency=1)
+        node.create_kpvs_within_slices(array, sections, max_value)
+        return node
+    return run
+
+
+@benchmark('node.key_point_value_node.create_kpvs_within_slices.shared')
+def key_point_value_node_create_kpvs_within_slices_shared():
+    '''
+    Many nodes reducing the same cached dependency within the same phases.
+    '''
+    state = random_state()
+    param = P('Airspeed', np.cumsum(state.normal(0, 1, DURATION)))
+    sections = phases()
+
+    def run():
+        cache = NodeCache()
+        cache[Node.cache_key(param.name, param.frequency, param.offset)] = \
+            param
+        for _ in range(10):
+            node = KeyPointValueNode('Kpvs', frequency=1, cache=cache)
+            node.create_kpvs_within_slices(param.array, sections, max_value)
+        return node
+    return run
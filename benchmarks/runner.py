@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+
+'''
+Benchmark registry, timing, JSON baselines and regression comparison.
+
+Run all benchmarks from the root of the repository with:
+
+    python -m benchmarks
+
+Save the results as a baseline and compare a later run against it:
+
+    python -m benchmarks --save benchmarks/baselines/master.json
+    python -m benchmarks --compare benchmarks/baselines/master.json
+'''
+
+##############################################################################
+# Imports
+
+
+from __future__ import print_function
+
+import argparse
+import fnmatch
+import json
+import logging
+import platform
+import sys
+import timeit
+
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+
+##############################################################################
+# Constants
+
+
+# Benchmark setup functions keyed by name.
+BENCHMARKS = OrderedDict()
+
+# Default ratio a benchmark may slow by before being reported as a regression.
+REGRESSION_THRESHOLD = 0.1
+
+# Minimum time in seconds of each repeat when calibrating the number of calls.
+MIN_REPEAT_DURATION = 0.2
+
+# Modules registering benchmarks when imported.
+BENCHMARK_MODULES = (
+    'benchmarks.library_benchmarks',
+    'benchmarks.node_benchmarks',
+    'benchmarks.dependency_graph_benchmarks',
+    'benchmarks.flight_benchmarks',
+)
+
+
+class SkipBenchmark(Exception):
+    '''
+    Raised by a benchmark setup function when the benchmark cannot run, e.g.
+    test data is not available.
+    '''
+    pass
+
+
+##############################################################################
+# Registry
+
+
+def benchmark(name, repeat=5, number=None):
+    '''
+    Register a benchmark setup function. The setup function is called once
+    and returns the callable to time.
+
+    :param name: Unique name of the benchmark, e.g. 'library.align'.
+    :type name: str
+    :param repeat: Number of times to repeat the timing.
+    :type repeat: int
+    :param number: Number of calls within each repeat. If None, calibrated so
+        that each repeat takes at least MIN_REPEAT_DURATION.
+    :type number: int or None
+    '''
+    def decorator(setup):
+        if name in BENCHMARKS:
+            raise ValueError("Benchmark '%s' is already registered." % name)
+        BENCHMARKS[name] = (setup, repeat, number)
+        return setup
+    return decorator
+
+
+def load_benchmarks():
+    '''
+    Import the modules which register benchmarks.
+    '''
+    import importlib
+    for module in BENCHMARK_MODULES:
+        importlib.import_module(module)
+
+
+##############################################################################
+# Timing
+
+
+def calibrate(func):
+    '''
+    :returns: Number of calls of func taking at least MIN_REPEAT_DURATION.
+    :rtype: int
+    '''
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= MIN_REPEAT_DURATION or number >= 10 ** 6:
+            return number
+        number *= 10
+
+
+def run_benchmark(name):
+    '''
+    :param name: Name of the registered benchmark.
+    :type name: str
+    :returns: Seconds per call of the fastest and median repeat and the
+        number of calls within each repeat.
+    :rtype: dict
+    :raises SkipBenchmark: If the benchmark cannot run.
+    '''
+    setup, repeat, number = BENCHMARKS[name]
+    func = setup()
+    if number is None:
+        number = calibrate(func)
+    times = np.array(timeit.Timer(func).repeat(repeat, number)) / number
+    return OrderedDict([
+        ('min', float(times.min())),
+        ('median', float(np.median(times))),
+        ('number', number),
+        ('repeat', repeat),
+    ])
+
+
+def run_benchmarks(patterns=None):
+    '''
+    Run the registered benchmarks matching any of the patterns.
+
+    :param patterns: fnmatch patterns of benchmark names, all if None.
+    :type patterns: list of str or None
+    :returns: Results keyed by benchmark name.
+    :rtype: OrderedDict
+    '''
+    results = OrderedDict()
+    for name in BENCHMARKS:
+        if patterns and \
+           not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        try:
+            results[name] = run_benchmark(name)
+        except SkipBenchmark as err:
+            print('%-50s skipped: %s' % (name, err))
+            continue
+        except Exception as err:
+            logging.exception("Benchmark '%s' failed.", name)
+            print('%-50s failed: %s' % (name, err))
+            continue
+        print('%-50s %12s %12s' % (name, format_time(results[name]['min']),
+                                   format_time(results[name]['median'])))
+    return results
+
+
+def format_time(seconds):
+    '''
+    :type seconds: float
+    :rtype: str
+    '''
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '%.3f %s' % (seconds / scale, unit)
+    return '%.3f ns' % (seconds / 1e-9)
+
+
+##############################################################################
+# Baselines
+
+
+def environment():
+    '''
+    :returns: Description of the environment the benchmarks were run within.
+    :rtype: dict
+    '''
+    return OrderedDict([
+        ('datetime', datetime.utcnow().isoformat()),
+        ('python', platform.python_version()),
+        ('numpy', np.__version__),
+        ('platform', platform.platform()),
+        ('processor', platform.processor()),
+    ])
+
+
+def save_baseline(results, path):
+    '''
+    :param results: Results returned by run_benchmarks.
+    :type results: dict
+    :param path: Path of JSON baseline file.
+    :type path: str
+    '''
+    with open(path, 'w') as fh:
+        json.dump(OrderedDict([('environment', environment()),
+                               ('benchmarks', results)]), fh, indent=2)
+
+
+def load_baseline(path):
+    '''
+    :param path: Path of JSON baseline file.
+    :type path: str
+    :returns: Baseline results keyed by benchmark name.
+    :rtype: dict
+    '''
+    with open(path) as fh:
+        return json.load(fh)['benchmarks']
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    '''
+    Compare the fastest time of each benchmark against the baseline.
+
+    :param results: Results returned by run_benchmarks.
+    :type results: dict
+    :param baseline: Baseline results keyed by benchmark name.
+    :type baseline: dict
+    :param threshold: Ratio a benchmark may slow by before being considered
+        a regression.
+    :type threshold: float
+    :returns: Names of benchmarks which have regressed with the ratio of
+        current to baseline time.
+    :rtype: list of (str, float)
+    '''
+    regressions = []
+    print()
+    print('%-50s %12s %12s %8s' % ('Benchmark', 'Baseline', 'Current',
+                                   'Ratio'))
+    for name, result in results.items():
+        if name not in baseline:
+            print('%-50s %12s %12s %8s' % (name, '-',
+                                           format_time(result['min']), '-'))
+            continue
+        ratio = result['min'] / baseline[name]['min']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+            flag = ' REGRESSION'
+        print('%-50s %12s %12s %7.2fx%s' % (
+            name, format_time(baseline[name]['min']),
+            format_time(result['min']), ratio, flag))
+    return regressions
+
+
+##############################################################################
+# Command Line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run FlightDataAnalyzer performance benchmarks.')
+    parser.add_argument('patterns', nargs='*',
+                        help='Only run benchmarks matching these patterns, '
+                        'e.g. "library.*".')
+    parser.add_argument('--list', action='store_true',
+                        help='List benchmarks without running them.')
+    parser.add_argument('--save', metavar='PATH',
+                        help='Save the results as a JSON baseline.')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='Compare the results against a JSON baseline '
+                        'and exit with an error if any have regressed.')
+    parser.add_argument('--threshold', type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help='Ratio a benchmark may slow by before being '
+                        'reported as a regression (default: %(default)s).')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    load_benchmarks()
+
+    if args.list:
+        for name in BENCHMARKS:
+            print(name)
+        return 0
+
+    results = run_benchmarks(args.patterns)
+    if args.save:
+        save_baseline(results, args.save)
+        print('Baseline saved to: %s' % args.save)
+    if args.compare:
+        regressions = compare(results, load_baseline(args.compare),
+                              threshold=args.threshold)
+        if regressions:
+            print('%d benchmark(s) regressed by more than %d%%.' % (
+                len(regressions), args.threshold * 100))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,20 +4,26 @@ import collections
 import imp
 import os
 import networkx as nx
+import shutil
 import six
+import tempfile
 import unittest
 import yaml
 import sys
 import traceback
 
 from datetime import datetime
+from mock import patch
 
 from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
 from analysis_engine.dependency_graph import (
     CircularDependency,
     InoperableDependencies,
     any_predecessors_in_requested,
+    clear_dependency_order_cache,
     dependency_order, 
+    dependency_signature,
+    dependencies3,
     graph_nodes, 
     graph_adjacencies,
     indent_tree,
@@ -98,9 +104,9 @@ class TestDependencyGraph(unittest.TestCase):
         mgr2 = NodeManager({'Start Datetime': datetime.now()}, 10, self.lfl_params,
                            requested, [], self.derived_nodes, {}, {})
         gr = graph_nodes(mgr2)
-        gr.node['Raw1']['active'] = True
-        gr.node['Raw2']['active'] = False
-        gr.node['P4']['active'] = False
+        gr.nodes['Raw1']['active'] = True
+        gr.nodes['Raw2']['active'] = False
+        gr.nodes['P4']['active'] = False
         self.assertEqual(
             indent_tree(gr, 'P7', space='__', delim=' ', label=False),
             [' P7',
@@ -234,15 +240,15 @@ class TestDependencyGraph(unittest.TestCase):
         self.assertEqual(len(gr), 5)
         # LFL
         self.assertEqual(gr.edges(1), []) # as it's in LFL, it shouldn't have any edges
-        self.assertEqual(gr.node[1], {'color': '#72f4eb', 'node_type': 'HDFNode'})
+        self.assertEqual(gr.nodes[1], {'color': '#72f4eb', 'node_type': 'HDFNode'})
         # Derived
         self.assertEqual(gr.edges(4), [(4,'DepFour')])
-        self.assertEqual(gr.node[4], {'color': '#72cdf4', 'node_type': 'DerivedParameterNode'})
+        self.assertEqual(gr.nodes[4], {'color': '#72cdf4', 'node_type': 'DerivedParameterNode'})
         # Root
         from analysis_engine.dependency_graph import draw_graph
         draw_graph(gr, 'test_graph_nodes_with_duplicate_key_in_lfl_and_derived')
         self.assertEqual(gr.successors('root'), [2,4]) # only the two requested are linked
-        self.assertEqual(gr.node['root'], {'color': '#ffffff'})
+        self.assertEqual(gr.nodes['root'], {'color': '#ffffff'})
         
     def test_dependency(self):
         requested = ['P7', 'P8']
@@ -618,6 +624,96 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         
 
 
+class TestDependencies3(unittest.TestCase):
+    def _node_mgr(self, lfl_params, derived_nodes):
+        return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params,
+                           [], [], derived_nodes, {}, {})
+
+    def test_dependencies3_deep_tree(self):
+        # Deeper than the recursion limit.
+        depth = sys.getrecursionlimit() * 2
+        names = ['P%d' % n for n in range(depth)]
+        gr = nx.DiGraph()
+        gr.add_edge('root', names[0])
+        for name, dependency in zip(names, names[1:]):
+            gr.add_edge(name, dependency, order=0)
+        gr.add_edge(names[-1], 'Raw1', order=0)
+        derived = {name: MockParam() for name in names}
+        order, tree_path = dependencies3(
+            gr, 'root', self._node_mgr(['Raw1'], derived))
+        self.assertEqual(order, ['Raw1'] + names[::-1] + ['root'])
+        self.assertEqual(tree_path, [])
+
+    def test_dependencies3_circular_dependency(self):
+        # P1 depends upon P2 which can be derived from P1 or Raw1.
+        gr = nx.DiGraph()
+        gr.add_edge('root', 'P1')
+        gr.add_edge('P1', 'P2', order=0)
+        gr.add_edge('P2', 'P1', order=0)
+        gr.add_edge('P2', 'Raw1', order=1)
+        derived = {'P1': MockParam(), 'P2': MockParam()}
+        mgr = self._node_mgr(['Raw1'], derived)
+        order, tree_path = dependencies3(gr, 'root', mgr,
+                                         record_tree_path=True)
+        self.assertEqual(order, ['Raw1', 'P2', 'P1', 'root'])
+        self.assertEqual(tree_path, [
+            ['root', 'P1', 'P2', 'P1', 'CIRCULAR'],
+            ['root', 'P1', 'P2'],
+            ['root', 'P1'],
+            ['root'],
+        ])
+        self.assertRaises(CircularDependency, dependencies3, gr, 'root', mgr,
+                          raise_cir_dep=True)
+
+
+class TestDependencyOrderCache(unittest.TestCase):
+    def setUp(self):
+        clear_dependency_order_cache()
+        self.derived = get_derived_nodes(
+            [import_module('sample_derived_parameters')])
+        self.lfl_params = ['Airspeed', 'Altitude STD', 'Heading', 'Pitch',
+                           'Roll', 'Groundspeed', 'Latitude', 'Longitude']
+
+    def tearDown(self):
+        clear_dependency_order_cache()
+
+    def _node_mgr(self, lfl_params=None, segment_info=None):
+        return NodeManager(
+            segment_info or {'Start Datetime': datetime.now()}, 10,
+            lfl_params or self.lfl_params, ['Smoothed Track', 'Heading Rate'],
+            [], self.derived, {}, {})
+
+    def test_dependency_signature(self):
+        signature = dependency_signature(self._node_mgr())
+        # Attribute values not read by can_operate do not change the signature.
+        self.assertEqual(dependency_signature(self._node_mgr(
+            segment_info={'Start Datetime': datetime(2000, 1, 1)})), signature)
+        self.assertNotEqual(dependency_signature(self._node_mgr(
+            lfl_params=self.lfl_params[:-1])), signature)
+
+    def test_dependency_order_cached(self):
+        order, gr_st = dependency_order(self._node_mgr())
+        with patch('analysis_engine.dependency_graph.graph_nodes') as graph_nodes:
+            cached_order, cached_gr_st = dependency_order(self._node_mgr())
+            self.assertFalse(graph_nodes.called)
+        self.assertEqual(cached_order, order)
+        self.assertIs(cached_gr_st, gr_st)
+
+    def test_dependency_order_cache_dir(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with patch.object(settings, 'DEPENDENCY_ORDER_CACHE_DIR', cache_dir):
+            order, gr_st = dependency_order(self._node_mgr(), draw=False)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            clear_dependency_order_cache()
+            with patch('analysis_engine.dependency_graph.graph_nodes') as graph_nodes:
+                cached_order, cached_gr_st = dependency_order(
+                    self._node_mgr(), draw=False)
+                self.assertFalse(graph_nodes.called)
+        self.assertEqual(cached_order, order)
+        self.assertEqual(sorted(cached_gr_st.edges()), sorted(gr_st.edges()))
+
+
 class TestGraphAdjacencies(unittest.TestCase):
     def test_graph_adjacencies(self):
         g = nx.DiGraph()
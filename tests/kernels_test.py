@@ -0,0 +1,50 @@
+import mock
+import numpy as np
+import unittest
+
+from analysis_engine import kernels
+from analysis_engine.kernels import Kernel, hysteresis_pass, kernel
+
+
+@kernel
+def running_max(values, out):
+    highest = values[0]
+    for index in range(len(values)):
+        if values[index] > highest:
+            highest = values[index]
+        out[index] = highest
+
+
+class TestKernel(unittest.TestCase):
+
+    def test_kernel(self):
+        self.assertIsInstance(running_max, Kernel)
+        result = running_max(np.array([1, 3, 2, 5, 4]), accelerate=False)
+        self.assertEqual(result.dtype, np.float64)
+        np.testing.assert_array_equal(result, [1, 3, 3, 5, 5])
+
+    def test_not_compiled_when_disabled(self):
+        with mock.patch('analysis_engine.kernels.KERNEL_ACCELERATION', False):
+            self.assertIsNone(running_max.compiled())
+            np.testing.assert_array_equal(running_max(np.arange(3.0)),
+                                          [0, 1, 2])
+
+    @unittest.skipIf(kernels.numba is None, 'numba is not installed')
+    def test_compiled_matches_python(self):
+        values = np.cumsum(np.random.RandomState(0).normal(0, 5, 10000))
+        self.assertIsNotNone(hysteresis_pass.compiled())
+        for quarter_range in (0.1, 2.5, 25):
+            np.testing.assert_array_equal(
+                hysteresis_pass(values, quarter_range),
+                hysteresis_pass(values, quarter_range, accelerate=False))
+
+    def test_compile_failure_falls_back(self):
+        @kernel
+        def copy_values(values, out):
+            for index in range(len(values)):
+                out[index] = values[index]
+
+        with mock.patch.object(kernels, 'numba') as numba:
+            numba.njit.side_effect = TypeError('cannot compile')
+            np.testing.assert_array_equal(copy_values([1, 2]), [1, 2])
+            self.assertIsNone(copy_values.compiled())
@@ -32,6 +32,7 @@ from flightdatautilities.array_operations import load_compressed
 import flightdatautilities.masked_array_testutils as ma_test
 
 from analysis_engine.library import *
+from analysis_engine.library import _align_table, _align_tables
 from analysis_engine.node import (A, P, S, load, M, KTI, KeyTimeInstance, Section)
 
 from flight_phase_test import buildsections
@@ -1031,6 +1032,75 @@ class TestAlign(unittest.TestCase):
         np.testing.assert_array_equal(result.data, [0,2,3,5,7,8,10,12,13,15,17,18,20,22,23])
         np.testing.assert_array_equal(result.mask, [0] * 15)
 
+    def test_align_partial_period(self):
+        # 4Hz slave of six samples only fills one and a half periods.
+        slave = P(frequency=4, offset=0.1, array=np.ma.arange(6, dtype=float))
+        master = P(frequency=2, offset=0.1, array=np.ma.arange(3, dtype=float))
+        result = align(slave, master)
+        np.testing.assert_array_equal(result.data, [0, 2, 4])
+        np.testing.assert_array_equal(result.mask, [0, 0, 0])
+
+
+class TestAlignMany(unittest.TestCase):
+    def test_align_many(self):
+        master = P('Master', np.ma.arange(16, dtype=float), frequency=2,
+                   offset=0.3)
+        params = [
+            P('Eng (1) N1', np.ma.arange(32, dtype=float) * 2, frequency=4,
+              offset=0.1),
+            P('Eng (2) N1', np.ma.arange(32, dtype=float), frequency=4,
+              offset=0.1),
+            P('Heading', np.ma.arange(340, 372, dtype=float) % 360,
+              frequency=4, offset=0.1),
+            M('Gear Down', np.ma.array([0, 1] * 16), frequency=4, offset=0.1,
+              values_mapping={0: 'Up', 1: 'Down'}),
+            P('Altitude STD', np.ma.arange(8, dtype=float), frequency=1,
+              offset=0.3),
+            P('Airspeed', np.ma.arange(16, dtype=float), frequency=2,
+              offset=0.3),
+        ]
+        params[1].array[5] = np.ma.masked
+        aligned = align_many(params, master)
+        self.assertEqual(len(aligned), len(params))
+        for param, array in zip(params, aligned):
+            expected = align(param, master)
+            self.assertEqual(type(array), type(expected))
+            ma_test.assert_masked_array_equal(array, expected)
+        self.assertEqual(aligned[3].values_mapping, {0: 'Up', 1: 'Down'})
+        self.assertIs(aligned[5], params[5].array)
+
+
+class TestAlignTable(unittest.TestCase):
+    def setUp(self):
+        _align_tables.clear()
+
+    def test_align_table(self):
+        starts, stops, weights = _align_table(2, 4, 0.5, 'interpolate')
+        np.testing.assert_array_equal(starts, [2, 3, 3, 4])
+        np.testing.assert_array_equal(stops, [3, 4, 4, 5])
+        np.testing.assert_array_equal(weights, [0.5, 0.0, 0.5, 0.0])
+        # Tables are cached.
+        self.assertIs(_align_table(2, 4, 0.5, 'interpolate')[0], starts)
+        self.assertEqual(len(_align_tables), 1)
+
+    def test_align_table_nearest(self):
+        starts, stops, weights = _align_table(1, 2, 0.25, 'nearest')
+        np.testing.assert_array_equal(starts, [1, 1])
+        np.testing.assert_array_equal(stops, [2, 2])
+        np.testing.assert_array_equal(weights, [0, 1])
+
+    def test_align_table_repair(self):
+        # Recorded samples depend upon the slave sample alone.
+        starts, stops, weights = _align_table(1, 4, 0, 'repair')
+        np.testing.assert_array_equal(starts, [1, 1, 1, 1])
+        np.testing.assert_array_equal(stops, [1, 2, 2, 2])
+        np.testing.assert_array_equal(weights, [0, 0.25, 0.5, 0.75])
+
+    def test_align_table_excessive_timing_mismatch(self):
+        self.assertRaises(ValueError, _align_table, 1, 1, -2.5, 'interpolate')
+        self.assertRaises(ValueError, _align_table, 1, 1, 1.5, 'interpolate')
+
+
 class TestAlignStringArrays(unittest.TestCase):
     def test_offset(self):
         first = P(frequency=1.0, offset=0.6,
@@ -3105,6 +3175,43 @@ class TestHysteresis(unittest.TestCase):
         np.testing.assert_array_equal(data.data, hysteresis(data,0).data)
         self.assertRaises(ValueError, hysteresis, data, -3)
 
+    def test_hysteresis_matches_reference(self):
+        def reference(array, hysteresis):
+            # The original implementation looping over each unmasked sample.
+            quarter_range = hysteresis / 4.0
+            half_done = np.zeros(len(array))
+            result = np.zeros(len(array))
+            notmasked = np.ma.where(~np.ma.getmaskarray(array))[0]
+            old = array[notmasked[0]]
+            for index in notmasked:
+                new = array[index]
+                if new - old > quarter_range:
+                    old = new - quarter_range
+                elif new - old < -quarter_range:
+                    old = new + quarter_range
+                half_done[index] = old
+            for index in notmasked[::-1]:
+                new = half_done[index]
+                if new - old > quarter_range:
+                    old = new - quarter_range
+                elif new - old < -quarter_range:
+                    old = new + quarter_range
+                result[index] = old
+            return result
+
+        state = np.random.RandomState(0)
+        data = np.ma.array(np.cumsum(state.normal(0, 5, 2000)),
+                           mask=state.rand(2000) < 0.1)
+        # Both the compiled and Python kernels give the same results.
+        for acceleration in (True, False):
+            with mock.patch('analysis_engine.kernels.KERNEL_ACCELERATION',
+                            acceleration):
+                for threshold in (0.5, 10, 100):
+                    result = hysteresis(data, threshold)
+                    assert_array_equal(result.data,
+                                       reference(data, threshold))
+                    assert_array_equal(result.mask, data.mask)
+
     """
     Hysteresis may need to be speeded up, in which case this test can be
     reinstated.
@@ -3394,6 +3501,36 @@ class TestIndexOfLastStop(unittest.TestCase):
                           np.array([0,1,0]), slice(None, None, -1))
 
 
+class TestIndexAtValues(unittest.TestCase):
+    def test_index_at_values(self):
+        array = np.ma.arange(10.0)
+        self.assertEqual(index_at_values(array, [2.5, 7.25, 20]),
+                         [2.5, 7.25, None])
+
+    def test_index_at_values_backwards(self):
+        array = np.ma.arange(10.0)
+        self.assertEqual(index_at_values(array, [2.5, 7.25],
+                                         slice(9, 1, -1)), [2.5, 7.25])
+
+    def test_index_at_values_matches_index_at_value(self):
+        array = np.ma.array(np.cumsum(
+            np.random.RandomState(1).normal(0, 10, 2000)))
+        array[300:320] = np.ma.masked
+        array[1500:1501] = np.ma.masked
+        thresholds = np.linspace(array.min(), array.max(), 15)
+        for _slice in (slice(None), slice(100, 1800), slice(1900, 50, -1),
+                       slice(None, None, -1)):
+            for endpoint in ('exact', 'closing', 'nearest', 'first_closing'):
+                self.assertEqual(
+                    index_at_values(array, thresholds, _slice, endpoint),
+                    [index_at_value(array, t, _slice, endpoint)
+                     for t in thresholds])
+
+    def test_index_at_values_masked(self):
+        array = np.ma.array(np.arange(10.0), mask=True)
+        self.assertEqual(index_at_values(array, [2, 3]), [None, None])
+
+
 class TestIndexAtValueOrLevelOff(unittest.TestCase):
     @unittest.skip('See Go Around And Climbout test cases')
     def test_reverse_level_off(self):
@@ -5134,6 +5271,22 @@ class TestRepairMask(unittest.TestCase):
         self.assertFalse(np.ma.is_masked(res[8]))
         self.assertFalse(np.ma.is_masked(res[9]))
 
+    def test_repair_mask_fragmented(self):
+        array = np.ma.array([1.0, 0, 3.7, 0, 0, -2.2, 0, 0, 0, 9.1, 0, 5.0],
+                            mask=[0, 1, 0, 1, 1, 0, 1, 1, 1, 0, 1, 0])
+        res = repair_mask(array, copy=True)
+        expected = np.ma.array(array.data)
+        for start, stop in ((1, 2), (3, 5), (6, 9), (10, 11)):
+            expected[start:stop] = np.linspace(
+                array[start - 1], array[stop], stop - start + 2)[1:-1]
+        assert_array_equal(res.data, expected.data)
+        self.assertFalse(res.mask.any())
+        # sections longer than the repair duration remain masked
+        res = repair_mask(array, copy=True, repair_duration=2)
+        assert_array_equal(res.mask, [0] * 6 + [1] * 3 + [0] * 3)
+        self.assertRaises(ValueError, repair_mask, array, copy=True,
+                          repair_duration=2, raise_duration_exceedance=True)
+
 
 class TestResample(unittest.TestCase):
     def test_resample_upsample(self):
@@ -5517,6 +5670,25 @@ class TestRunsOfOnes(unittest.TestCase):
         result = runs_of_ones(self.test_array, min_samples=2)
         self.assertEqual(result, [slice(4, 9), slice(11, 14)])
 
+    def test_runs_of_ones_bounds(self):
+        starts, stops = runs_of_ones_bounds(self.test_array)
+        np.testing.assert_array_equal(starts, [2, 4, 11])
+        np.testing.assert_array_equal(stops, [3, 9, 14])
+        starts, stops = runs_of_ones_bounds(self.test_array, min_samples=3)
+        np.testing.assert_array_equal(starts, [4])
+        np.testing.assert_array_equal(stops, [9])
+        starts, stops = runs_of_ones_bounds(np.ones(4, dtype=bool))
+        np.testing.assert_array_equal(starts, [0])
+        np.testing.assert_array_equal(stops, [4])
+
+    def test_runs_of_ones_empty(self):
+        # An empty array has a single empty run.
+        self.assertEqual(runs_of_ones(np.ma.array([])), [slice(0, 0)])
+        starts, stops = runs_of_ones_bounds(np.ma.array([]))
+        np.testing.assert_array_equal(starts, [0])
+        np.testing.assert_array_equal(stops, [0])
+        self.assertEqual(runs_of_ones(np.ma.array([]), min_samples=1), [])
+
 
 class TestSlicesOfRuns(unittest.TestCase):
 
@@ -5534,6 +5706,17 @@ class TestSlicesOfRuns(unittest.TestCase):
         self.assertIsInstance(result, types.GeneratorType)
         self.assertEqual(list(result), expected)
 
+    def test__slices_of_runs__masked(self):
+        array = np.ma.array([2, 2, 1, 1, 1, 2, 2, 2, 3],
+                            mask=[0, 0, 0, 1, 0, 0, 0, 0, 1])
+        self.assertEqual(list(slices_of_runs(array)),
+                         [(1, [slice(2, 3), slice(4, 5)]),
+                          (2, [slice(0, 2), slice(5, 8)])])
+        self.assertEqual(list(slices_of_runs(array, min_samples=2)),
+                         [(None, []), (2, [slice(5, 8)])])
+        self.assertEqual(list(slices_of_runs(array, flat=True)),
+                         [slice(2, 3), slice(4, 5), slice(0, 2), slice(5, 8)])
+
     def test__slices_of_runs__exclude_masked(self):
         array = np.ma.repeat(range(0, 2), 5)
         array[3:7] = np.ma.masked
@@ -5626,6 +5809,74 @@ class TestSliceDuration(unittest.TestCase):
         self.assertRaises(ValueError, slice_duration, slice(20, None), 1)
 
 
+class TestSliceArray(unittest.TestCase):
+    def setUp(self):
+        self.slices = SliceArray([slice(20, 30), slice(None, 5),
+                                  slice(25, 40), slice(50, None)])
+
+    def test_list(self):
+        self.assertTrue(isinstance(self.slices, list))
+        self.assertEqual(self.slices[1], slice(None, 5))
+        np.testing.assert_array_equal(self.slices.starts,
+                                      [20, -np.inf, 25, 50])
+        self.slices.append(slice(60, 70))
+        np.testing.assert_array_equal(self.slices.stops,
+                                      [30, 5, 40, np.inf, 70])
+
+    def test_union(self):
+        self.assertEqual(self.slices.union([slice(5, 8), slice(45, 50)]),
+                         [slice(None, 5), slice(5, 8), slice(20, 40),
+                          slice(45, 50), slice(50, None)])
+        self.assertEqual(SliceArray([slice(2, 2)]).union(), [])
+
+    def test_intersection(self):
+        self.assertEqual(self.slices & [slice(3, 22), slice(38, 60)],
+                         [slice(3, 5), slice(20, 22), slice(38, 40),
+                          slice(50, 60)])
+        self.assertEqual(self.slices & [], [])
+
+    def test_complement(self):
+        self.assertEqual(self.slices.complement(), [slice(5, 20),
+                                                    slice(40, 50)])
+        self.assertEqual(SliceArray([slice(10, 20)]).complement(0, 30),
+                         [slice(0, 10), slice(20, 30)])
+        self.assertEqual(SliceArray([slice(10, 20)]).complement(12, 15), [])
+
+    def test_join_gaps(self):
+        self.assertEqual(self.slices.join_gaps(12),
+                         [slice(None, 5), slice(20, None)])
+
+    def test_filter_duration(self):
+        slices = SliceArray([slice(0, 4), slice(10, 20), slice(30, 36)])
+        self.assertEqual(slices.filter_duration(3, frequency=2),
+                         [slice(10, 20), slice(30, 36)])
+
+    def test_contains_index(self):
+        self.assertTrue(self.slices.contains_index(27))
+        self.assertFalse(self.slices.contains_index(45))
+        np.testing.assert_array_equal(
+            self.slices.contains_index([-10, 5, 39.5, 1000]),
+            [True, False, True, True])
+
+    def test_bounds_unchanged(self):
+        slices = SliceArray([slice(2.5, 10), slice(8, 20.0)]).union()
+        self.assertEqual(slices, [slice(2.5, 20.0)])
+        self.assertTrue(isinstance(slices[0].start, float))
+        result = slices_and([slice(0, 5), slice(10, 12)], [slice(3, 11)])
+        self.assertTrue(all(isinstance(i, int) for s in result
+                            for i in (s.start, s.stop)))
+
+    def test_many_slices(self):
+        slices = [slice(i * 10, i * 10 + 5) for i in range(5000)]
+        others = [slice(i * 10 + 3, i * 10 + 9) for i in range(5000)]
+        self.assertEqual(slices_and(slices, others),
+                         [slice(i * 10 + 3, i * 10 + 5) for i in range(5000)])
+        self.assertEqual(slices_or(slices, others),
+                         [slice(i * 10, i * 10 + 9) for i in range(5000)])
+        self.assertEqual(slices_not(slices),
+                         [slice(i * 10 + 5, i * 10 + 10) for i in range(4999)])
+
+
 class TestSlicesAnd(unittest.TestCase):
     def test_slices_and(self):
         self.assertEqual(slices_and([slice(2,5)],[slice(3,7)]),
@@ -7263,6 +7514,77 @@ class TestValueAtTime(unittest.TestCase):
         self.assertEquals (value_at_time(array, 2.0, 0.2, 1.0), None)
 
 
+
+class TestValuesAtTimes(unittest.TestCase):
+    def test_values_at_times(self):
+        array = np.ma.arange(10) + 7.4
+        array[[2, 5, 6]] = np.ma.masked
+        times = [-1, 0.0, 0.3, 1.0, 1.25, 2.2, 2.45, 2.7, 2.95, 3.6, 4.7,
+                 4.95, 5.0, 7.5, 20, np.nan]
+        result = values_at_times(array, 2.0, 0.2, times)
+        for time, value in zip(times[:-1], result.tolist()):
+            expected = value_at_time(array, 2.0, 0.2, time)
+            self.assertEqual(value, expected)
+        self.assertIs(result[-1], np.ma.masked)
+
+    def test_values_at_times_unmasked(self):
+        array = np.ma.array(np.cumsum(np.random.RandomState(0).normal(size=50)))
+        times = np.linspace(-5, 60, 200)
+        np.testing.assert_array_equal(
+            values_at_times(array, 0.5, 1.3, times),
+            [value_at_time(array, 0.5, 1.3, time) for time in times])
+
+
+class TestValuesWithinSlices(unittest.TestCase):
+    def setUp(self):
+        self.array = np.ma.array(
+            np.round(np.random.RandomState(0).normal(0, 5, 40), 0))
+        self.array[[3, 4, 17, 18, 19, 20, 30]] = np.ma.masked
+        self.slices = [
+            (slice(0, 10), None, None),
+            (slice(2, 6), 1.5, 6.25),
+            (slice(4.5, 12.8), None, None),
+            (slice(17, 21), 16.5, 21.5),
+            (slice(18, 20), 18, 20),
+            (slice(None, 40), None, None),
+            (slice(25, None), 24.75, None),
+            (slice(35, 50), 34.2, 50),
+            (slice(12, 12), 11.5, 12.5),
+        ]
+
+    def test_values_within_slices(self):
+        for function in (max_value, min_value, max_abs_value):
+            expected = [function(self.array, _slice, start_edge=start_edge,
+                                 stop_edge=stop_edge)
+                        for _slice, start_edge, stop_edge in self.slices]
+            self.assertEqual(
+                values_within_slices(self.array, self.slices, function),
+                expected)
+
+    def test_values_within_slices_ties(self):
+        array = np.ma.array([1.0, 2.0, 2.0, 1.0, 2.0])
+        slices = [(slice(1, 3), 0.5, 2.5), (slice(1, 3), 1.0, 2.5)]
+        self.assertEqual(values_within_slices(array, slices, max_value),
+                         [(1, 2.0), (1.0, 2.0)])
+        self.assertEqual(values_within_slices(array, slices, min_value),
+                         [(0.5, 1.5), (2.5, 1.5)])
+
+    def test_values_within_slices_not_supported(self):
+        self.assertIsNone(values_within_slices(
+            self.array, self.slices, median_value))
+        self.assertIsNone(values_within_slices(
+            np.ma.arange(10), [(slice(2, 5), None, None)], max_value))
+        self.assertIsNone(values_within_slices(
+            self.array, [(slice(2, 10, 2), None, None)], max_value))
+        self.assertIsNone(values_within_slices(
+            self.array, [(slice(-5, None), None, None)], max_value))
+        self.assertIsNone(values_within_slices(
+            self.array, [(slice(2, 5), np.nan, None)], max_value))
+        array = self.array.copy()
+        array[2] = np.inf
+        self.assertIsNone(values_within_slices(
+            array, [(slice(2, 5), None, None)], max_value))
+
 class TestValueAtDatetime(unittest.TestCase):
     @mock.patch('analysis_engine.library.value_at_time')
     def test_value_at_datetime(self, value_at_time):
@@ -7341,6 +7663,19 @@ class TestVstackParams(unittest.TestCase):
                       [99, 11, 12, 13, 14, 15, 16, 17, 18, 99]])
         )
         self.assertRaises(ValueError, vstack_params, None, None, None)
+        self.assertRaises(ValueError, vstack_params, a, np.ma.arange(5))
+
+
+class TestVstackParamsSw(unittest.TestCase):
+    def test_vstack_params_sw(self):
+        params = [P('Eng (%d) N1' % n, frequency=2,
+                    array=np.ma.array(np.arange(20.0) * n)) for n in (1, 2)]
+        params[1].array[5] = np.ma.masked
+        result = vstack_params_sw(3, None, *params)
+        self.assertEqual(result.shape, (2, 20))
+        for row, param in enumerate(params):
+            ma_test.assert_masked_array_equal(
+                result[row], second_window(param.array, 2, 3))
 
 
 class TestVstackParamsWhereState(unittest.TestCase):
@@ -7810,6 +8145,34 @@ class TestSecondWindow(unittest.TestCase):
         res = second_window(sw.array, sw.frequency, 3)
         self.assertEqual(np.ma.count(res), 40972)
 
+    def test_second_window_matches_windows(self):
+        # Each value is clipped between the min and max of the window of
+        # samples + 1 starting at it.
+        state = np.random.RandomState(0)
+        array = np.ma.array(np.cumsum(state.normal(0, 3, 500)),
+                            mask=state.rand(500) < 0.02)
+        samples = 24
+        res = second_window(array, 8, 3)
+        for section in np.ma.clump_unmasked(array):
+            last_value = array[section.start]
+            for idx in range(section.start, section.stop - samples):
+                window = array.data[idx:idx + samples + 1]
+                last_value = min(max(last_value, window.min()), window.max())
+                self.assertEqual(res[idx], last_value)
+        self.assertEqual(np.ma.count(res), sum(
+            max(s.stop - s.start - samples, 0)
+            for s in np.ma.clump_unmasked(array)))
+
+    def test_second_window_2d(self):
+        state = np.random.RandomState(1)
+        array = np.ma.array(np.cumsum(state.normal(0, 3, (4, 200)), axis=1),
+                            mask=state.rand(4, 200) < 0.05)
+        res = second_window(array, 4, 3)
+        self.assertEqual(res.shape, (4, 200))
+        for row in range(4):
+            ma_test.assert_masked_array_equal(
+                res[row], second_window(array[row], 4, 3))
+
 
 class TestLookupTable(unittest.TestCase):
 
@@ -8350,6 +8713,42 @@ class TestMaxMaintainedValue(unittest.TestCase):
             self.assertAlmostEqual(index, idx, places=0)
             self.assertAlmostEqual(value, val, places=3)
 
+    def test_max_maintained_value_first_window(self):
+        # The first of equal windows is chosen, as when summing each window.
+        arrays = np.ma.array([5, 4, 5, 4, 1, 4, 5, 4, 5, 0.1, 0.2, 0.3])
+        arrays[9] = np.ma.masked
+        self.assertEqual(max_maintained_value(arrays, 4, 1, slice(10, 22)),
+                         (11, 4))
+        self.assertEqual(max_maintained_value(arrays, 0.5, 2, slice(10, 22)),
+                         (10, 5))
+        self.assertEqual(max_maintained_value(arrays, 20, 1, slice(10, 22)),
+                         (None, None))
+
+    def test_max_maintained_values(self):
+        state = np.random.RandomState(0)
+        array = np.ma.array(np.round(state.normal(90, 2, (2, 400)), 1),
+                            mask=state.rand(2, 400) < 0.01)
+        seconds = [5, 10, 30]
+        phases = [slice(0, 150), slice(200, 400)]
+        results = max_maintained_values(array, seconds, 2, phases)
+        for row in range(2):
+            for p, phase in enumerate(phases):
+                for n, sec in enumerate(seconds):
+                    self.assertEqual(
+                        results[row][p][n],
+                        max_maintained_value(array[row][phase], sec, 2, phase))
+
+    def test_max_maintained_values_empty_phase(self):
+        array = np.ma.array(np.arange(20.), mask=np.zeros(20, bool))
+        self.assertEqual(
+            max_maintained_values(array, [2, 5], 1,
+                                  [slice(5, 5), slice(25, 30), slice(0, 20)]),
+            [[(None, None), (None, None)],
+             [(None, None), (None, None)],
+             [(18, 18.0), (15, 15.0)]])
+        self.assertEqual(max_maintained_value(array[5:5], 2, 1, slice(5, 5)),
+                         (None, None))
+
 if __name__ == '__main__':
     suite = unittest.TestSuite()
     suite.addTest(TestIndexAtValue('test_index_at_value_slice_beyond_top_end_of_data'))
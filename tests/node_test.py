@@ -9,7 +9,8 @@ from datetime import datetime
 from inspect import ArgSpec
 from random import shuffle
 
-from analysis_engine.library import min_value, max_value, average_value
+from analysis_engine.library import (
+    align, average_value, max_abs_value, max_value, min_value, vstack_params)
 from analysis_engine.node import (
     ApproachItem,
     ApproachNode,
@@ -19,7 +20,7 @@ from analysis_engine.node import (
     KeyTimeInstanceNode, KeyTimeInstance, KTI,
     FlightAttributeNode,
     FormattedNameNode,
-    Node, NodeManager,
+    Node, NodeCache, NodeManager,
     Parameter, P,
     MultistateDerivedParameterNode, M,
     load,
@@ -160,6 +161,80 @@ class TestNode(unittest.TestCase):
         available = ['a', 'Parent', 'b']
         self.assertTrue(NewNode.can_operate(available))
 
+    def test_get_dependency_names_cached(self):
+        class NewNode(Node):
+            def derive(self, aa=P('a'), bb=P('b')):
+                pass
+            def get_derived(self, deps):
+                pass
+        names = NewNode.get_dependency_names()
+        self.assertEqual(names, ['a', 'b'])
+        names.append('c')
+        with mock.patch('analysis_engine.node.get_param_kwarg_names') as get:
+            self.assertEqual(NewNode.get_dependency_names(), ['a', 'b'])
+            self.assertFalse(get.called)
+        # Replacing derive is inspected again.
+        def derive(self, cc=P('c')):
+            pass
+        NewNode.derive = derive
+        self.assertEqual(NewNode.get_dependency_names(), ['c'])
+
+    def test_can_operate_memoized(self):
+        calls = []
+        class NewNode(Node):
+            def derive(self, aa=P('a'), bb=P('b')):
+                pass
+            def get_derived(self, deps):
+                pass
+            @classmethod
+            def can_operate(cls, available,
+                            ac_type=Attribute('Aircraft Type')):
+                calls.append((available, ac_type))
+                return 'a' in available and ac_type \
+                    and ac_type.value != 'helicopter'
+        self.assertEqual(NewNode.get_can_operate_defaults(),
+                         (Attribute('Aircraft Type'),))
+        aeroplane = Attribute('Aircraft Type', 'aeroplane')
+        helicopter = Attribute('Aircraft Type', 'helicopter')
+        self.assertTrue(NewNode.can_operate_memoized(['a', 'b'], aeroplane))
+        self.assertTrue(NewNode.can_operate_memoized(['b', 'a'], aeroplane))
+        self.assertEqual(len(calls), 1)
+        self.assertFalse(NewNode.can_operate_memoized(['a', 'b'], helicopter))
+        self.assertFalse(NewNode.can_operate_memoized(['b'], aeroplane))
+        self.assertFalse(NewNode.can_operate_memoized(['a'], None))
+        self.assertEqual(len(calls), 4)
+        # Unhashable Attribute values are not memoized.
+        unhashable = Attribute('Aircraft Type', ['aeroplane'])
+        self.assertTrue(NewNode.can_operate_memoized(['a'], unhashable))
+        self.assertTrue(NewNode.can_operate_memoized(['a'], unhashable))
+        self.assertEqual(len(calls), 6)
+
+    @mock.patch('analysis_engine.node.CAN_OPERATE_CACHE_SIZE', 2)
+    def test_can_operate_memoized_bounded(self):
+        calls = []
+        class NewNode(Node):
+            def derive(self, aa=P('a'), bb=P('b')):
+                pass
+            def get_derived(self, deps):
+                pass
+            @classmethod
+            def can_operate(cls, available):
+                calls.append(available)
+                return 'a' in available
+        self.assertTrue(NewNode.can_operate_memoized(['a']))
+        self.assertFalse(NewNode.can_operate_memoized(['b']))
+        # ['a'] becomes the most recently used result.
+        self.assertTrue(NewNode.can_operate_memoized(['a']))
+        self.assertEqual(len(calls), 2)
+        # The least recently used result, ['b'], is evicted.
+        self.assertTrue(NewNode.can_operate_memoized(['a', 'b']))
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(NewNode.can_operate_memoized(['a']))
+        self.assertEqual(len(calls), 3)
+        self.assertFalse(NewNode.can_operate_memoized(['b']))
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(len(NewNode._can_operate_info()[2]), 2)
+
     def test_get_operational_combinations(self):
         """ NOTE: This shows a REALLY neat way to test all combinations of a
         derived Node class!
@@ -420,6 +495,123 @@ class TestFlightAttributeNode(unittest.TestCase):
         attr.value = False
         self.assertFalse(bool(attr))
 
+class TestNodeCache(unittest.TestCase):
+    def _param(self, name, size=10):
+        return P(name, array=np.ma.arange(size, dtype=np.float64))
+
+    def test_get_set(self):
+        cache = NodeCache(max_bytes=None)
+        param = self._param('Airspeed')
+        key = Node.cache_key('Airspeed', 1, 0)
+        self.assertIsNone(cache.get(key))
+        cache[key] = param
+        self.assertIs(cache.get(key), param)
+        self.assertIn(key, cache)
+        self.assertEqual(cache.nbytes, param.array.nbytes)
+        self.assertEqual(cache.stats(), {'items': 1, 'nbytes': 80, 'hits': 1,
+                                         'misses': 1, 'evictions': 0})
+        del cache[key]
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_lru_eviction(self):
+        cache = NodeCache(max_bytes=200)
+        for name in ('A', 'B'):
+            cache[(name, 1, 0)] = self._param(name)
+        # use A so that B is the least recently used.
+        cache.get(('A', 1, 0))
+        cache[('C', 1, 0)] = self._param('C')
+        self.assertEqual(cache.nbytes, 160)
+        self.assertNotIn(('B', 1, 0), cache)
+        self.assertIn(('A', 1, 0), cache)
+        self.assertEqual(cache.evictions, 1)
+        # arrays larger than the cache are not stored.
+        cache[('D', 1, 0)] = self._param('D', size=30)
+        self.assertNotIn(('D', 1, 0), cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_consumer_eviction(self):
+        cache = NodeCache(max_bytes=240)
+        consumers = {'A': 1, 'B': 2}
+        cache.set_consumers(consumers)
+        for name in ('A', 'B', 'C'):
+            cache[(name, 1, 0)] = self._param(name)
+        cache[('D', 1, 0)] = self._param('D')
+        # C is evicted before the least recently used A as nothing remains
+        # to consume it.
+        self.assertEqual(cache.evictions, 1)
+        self.assertNotIn(('C', 1, 0), cache)
+        for name in ('A', 'B', 'D'):
+            self.assertIn((name, 1, 0), cache)
+        # Consumers are read again when a Node is used.
+        consumers['B'] = 0
+        cache.get(('B', 1, 0))
+        cache[('E', 1, 0)] = self._param('E')
+        self.assertNotIn(('D', 1, 0), cache)
+        cache[('F', 1, 0)] = self._param('F')
+        self.assertNotIn(('B', 1, 0), cache)
+        self.assertIn(('A', 1, 0), cache)
+        self.assertEqual(cache.evictions, 3)
+
+    def test_release(self):
+        cache = NodeCache(max_bytes=None)
+        cache[('A', 1, 0)] = self._param('A')
+        cache[('A', 2, 0)] = self._param('A', size=20)
+        cache[('B', 1, 0)] = self._param('B')
+        cache.release('A')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 80)
+        self.assertEqual(cache.evictions, 0)
+
+    def test_values_within_slices(self):
+        cache = NodeCache(max_bytes=None)
+        param = self._param('Airspeed')
+        key = ('Airspeed', 1, 0)
+        cache[key] = param
+        edges = [(slice(0, 4), None, None), (slice(5, 8), 4.5, None)]
+        expected = [max_value(param.array, s, start_edge=start_edge,
+                              stop_edge=stop_edge)
+                    for s, start_edge, stop_edge in edges]
+        values = cache.values_within_slices(param.array, edges, max_value)
+        self.assertEqual(values, expected)
+        self.assertIs(cache.values_within_slices(param.array, edges,
+                                                 max_value), values)
+        self.assertEqual(cache.statistics_hits, 1)
+        # Keyed by the slices and function.
+        cache.values_within_slices(param.array, edges[:1], max_value)
+        cache.values_within_slices(param.array, edges, min_value)
+        self.assertEqual(cache.statistics_hits, 1)
+        # Arrays which are not of cached Nodes are not memoized.
+        array = param.array.copy()
+        cache.values_within_slices(array, edges, max_value)
+        cache.values_within_slices(array, edges, max_value)
+        self.assertEqual(cache.statistics_hits, 1)
+        # Replacing the array invalidates the values.
+        param.array = np.ma.arange(10, 0, -1, dtype=np.float64)
+        self.assertEqual(
+            cache.values_within_slices(param.array, edges, max_value),
+            [(0, 10), (4.5, 5.5)])
+        self.assertIsNot(cache.values_within_slices(array, edges, max_value),
+                         values)
+        # Releasing the Node discards the values.
+        param = self._param('Airspeed')
+        cache[key] = param
+        cache.values_within_slices(param.array, edges, max_value)
+        cache.release('Airspeed')
+        self.assertEqual(cache._statistics, {})
+        self.assertEqual(cache._arrays, {})
+        self.assertEqual(cache.statistics_hits, 1)
+
+    def test_get_aligned(self):
+        cache = NodeCache()
+        param = DerivedParameterNode('Airspeed', np.ma.arange(10),
+                                     cache=cache)
+        aligned = param.get_aligned(P('Heading', frequency=1, offset=0))
+        self.assertIs(param.get_aligned(P('Heading', frequency=1, offset=0)),
+                      aligned)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+
 class TestNodeManager(unittest.TestCase):
     @mock.patch('analysis_engine.node.inspect.getargspec')
     def test_operational(self, getargspec):
@@ -897,6 +1089,27 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_surrounding(-3), [])
         self.assertEqual(node.get_surrounding(25), [sect_2])
 
+    def test_index_discarded_on_change(self):
+        node = SectionNode(items=[Section('a', slice(10, 20), 10, 20),
+                                  Section('b', slice(0, 5), 0, 5)])
+        self.assertEqual(node.get(containing_index=12), [node[0]])
+        self.assertEqual(node.get_next(3), node[0])
+        node.append(Section('a', slice(None, 15), None, 15))
+        self.assertEqual(node.get(containing_index=12), [node[0], node[2]])
+        self.assertEqual(node.get_previous(18, use='start', name='a'),
+                         node[0])
+        node[0] = Section('c', slice(30, 40), 30, 40)
+        self.assertEqual(node.get(name='a'), [node[2]])
+        self.assertEqual(node.get_surrounding(12), [node[2]])
+        del node[2]
+        self.assertEqual(node.get_ordered_by_index(), [node[1], node[0]])
+        self.assertEqual(node.get_next(3, use='stop', order_by='stop'),
+                         node[1])
+        node.sort(key=lambda s: s.slice.start)
+        self.assertEqual(node.get_previous(35), node[0])
+        self.assertEqual(node.get(within_slice=slice(25, 45)), [node[1]])
+        self.assertNotIn('_index', node.__getstate__())
+
     def test_get_shortest(self):
         node = SectionNode(items=[Section('ThisSection', slice(0, 5), 0, 5),
                                   Section('ThisSection', slice(10, 13), 10, 13),
@@ -959,6 +1172,31 @@ class TestFormattedNameNode(unittest.TestCase):
                                  'Speed in descent at 400 ft',
                                  'Speed in descent at 700 ft',])
 
+    def test_get_name_registry(self):
+        class Speed(FormattedNameNode):
+            NAME_FORMAT = 'Speed in %(phase)s at %(altitude)d ft'
+            NAME_VALUES = {'altitude': [100, 400],
+                           'phase': ['ascent', 'descent']}
+            def derive(self, *args, **kwargs):
+                pass
+        registry = Speed.get_name_registry()
+        self.assertEqual(registry.names, tuple(Speed.names()))
+        self.assertEqual(registry.name_set, set(Speed.names()))
+        self.assertEqual(sorted(registry.name_ids.values()), [0, 1, 2, 3])
+        self.assertEqual(registry.name_ids['Speed in ascent at 100 ft'], 0)
+        # Built once per class.
+        self.assertIs(Speed.get_name_registry(), registry)
+        self.assertIsNot(self.speed_class.get_name_registry(), registry)
+        # Rebuilt when NAME_VALUES change.
+        Speed.NAME_VALUES['altitude'].append(700)
+        registry = Speed.get_name_registry()
+        self.assertEqual(len(registry.names), 6)
+        self.assertTrue(Speed()._validate_name('Speed in descent at 700 ft'))
+        # Rebuilt when NAME_VALUES are replaced.
+        Speed.NAME_VALUES = {'altitude': [100], 'phase': ['ascent']}
+        self.assertIsNot(Speed.get_name_registry(), registry)
+        self.assertEqual(Speed.names(), ['Speed in ascent at 100 ft'])
+
     def test__validate_name(self):
         """ Ensures that created names have a validated option
         """
@@ -1331,6 +1569,51 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(list(knode),
                          [KeyPointValue(index=6, value=26, name='Kpv')])
 
+    def test_create_kpvs_within_slices_many_sections(self):
+        array = np.ma.array([3.0, 5.0, 2.0, 8.0, 1.0, 7.0, 4.0, 6.0, 0.0, 9.0])
+        array[3] = np.ma.masked
+        sections = SectionNode('Section', items=[
+            Section('section', slice(1, 4), 0.5, 3.5),
+            Section('section', slice(4, 8), 4, 8),
+            Section('section', slice(8, 10), 7.5, 9.25),
+        ])
+        for function in (max_value, min_value, max_abs_value):
+            knode = self.knode.__class__()
+            knode.create_kpvs_within_slices(array, sections, function)
+            expected = self.knode.__class__()
+            for section in sections:
+                expected.create_kpv(*function(
+                    array, section.slice, start_edge=section.start_edge,
+                    stop_edge=section.stop_edge))
+            self.assertEqual(list(knode), list(expected))
+        knode = self.knode
+        knode.create_kpvs_within_slices(array, sections, max_value)
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=1, value=5, name='Kpv'),
+                          KeyPointValue(index=5, value=7, name='Kpv'),
+                          KeyPointValue(index=9, value=9, name='Kpv')])
+
+
+    def test_create_kpvs_within_slices_cached(self):
+        cache = NodeCache()
+        airspeed = P('Airspeed', np.ma.arange(10, dtype=np.float64) % 7)
+        cache[Node.cache_key('Airspeed', 1, 0)] = airspeed
+        sections = SectionNode('Airborne', items=[
+            Section('Airborne', slice(1, 4), 0.5, 3.5),
+            Section('Airborne', slice(4, 9), 4, 9),
+        ])
+        knodes = []
+        for _ in range(2):
+            knode = self.knode.__class__(cache=cache)
+            knode.create_kpvs_within_slices(airspeed.array, sections,
+                                            max_value)
+            knodes.append(list(knode))
+        # The second node reuses the values of the first.
+        self.assertEqual(cache.statistics_hits, 1)
+        self.assertEqual(knodes[0], knodes[1])
+        self.assertEqual(knodes[0],
+                         [KeyPointValue(index=3.5, value=3.5, name='Kpv'),
+                          KeyPointValue(index=6, value=6, name='Kpv')])
 
     def test_create_kpv_from_slices(self):
         knode = self.knode
@@ -1452,6 +1735,14 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(list(knode),
                          [KeyPointValue(index=11, value=6, name='Kpv')])
 
+    def test_create_kpvs_where_min_duration(self):
+        knode = self.knode
+        array = np.ma.array([0, 1, 1, 0, 1, 1, 1, 1, 0, 1, 1, 1],
+                            mask=[False] * 10 + [True] * 2)
+        knode.create_kpvs_where(array == 1, 2.0, min_duration=1.5)
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=4, value=2, name='Kpv')])
+
     def test_create_kpvs_where_in_empty_list(self):
         knode = self.knode
         array = np.ma.array([0.0] * 20, dtype=float)
@@ -1478,6 +1769,17 @@ class TestKeyPointValueNode(unittest.TestCase):
             phase=[slice(16, 16)])
         self.assertEqual(list(knode), [])
 
+    def test_create_kpvs_where_beyond_condition(self):
+        knode = self.knode
+        array = np.ma.array([0, 1, 1, 0, 1])
+        # runs_of_ones gives an empty run where the condition within the
+        # phase is empty, creating a KPV with zero duration.
+        knode.create_kpvs_where(array == 1, phase=[slice(1, 4),
+                                                   slice(10, 15)])
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=1, value=2, name='Kpv'),
+                          KeyPointValue(index=10, value=0, name='Kpv')])
+
     def test_create_kpvs_where_in_list_of_slices(self):
         knode = self.knode
         array = np.ma.array([0.0] * 20, dtype=float)
@@ -1542,6 +1844,9 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(aligned_node,
                          [KeyPointValue(index=1.95, value=12.5, name='Speed at 1000ft'),
                           KeyPointValue(index=5.45, value=12.5, name='Speed at 1000ft')])
+        # Aligned KPVs are copies.
+        aligned_node[0].value = 15
+        self.assertEqual(knode[0].value, 12.5)
 
     def test_get_min(self):
         # Test empty Node first.
@@ -1896,6 +2201,45 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(result.frequency, param1.frequency)
         self.assertEqual(result.offset, param1.offset)
 
+    def test_aligned_copy(self):
+        cache = NodeCache()
+        values_mapping = {0: 'Up', 1: 'Down'}
+        gear = M('Gear Down', np.ma.array([0, 1, 1, 0]),
+                 values_mapping=values_mapping, frequency=2, offset=0.1,
+                 cache=cache)
+        airspeed = P('Airspeed', frequency=1, offset=0.5)
+        aligned = gear.aligned_copy(
+            airspeed, MappedArray([1, 0], values_mapping=values_mapping))
+        self.assertIsInstance(aligned, M)
+        self.assertEqual((aligned.name, aligned.frequency, aligned.offset),
+                         ('Gear Down', 1, 0.5))
+        self.assertEqual(aligned.values_mapping, values_mapping)
+        self.assertIs(gear.get_aligned(airspeed), aligned)
+
+    def test_get_derived_aligns_many(self):
+        '''
+        Parameters sharing a sample rate are aligned together and cached.
+        '''
+        class EngN1Max(DerivedParameterNode):
+            def derive(self, a=P('Airspeed'), e1=P('Eng (1) N1'),
+                       e2=P('Eng (2) N1')):
+                self.array = np.ma.max(vstack_params(e1, e2), axis=0)
+
+        airspeed = P('Airspeed', np.ma.arange(4, dtype=float), frequency=1,
+                     offset=0.5)
+        eng1 = P('Eng (1) N1', np.ma.arange(8, dtype=float), frequency=2,
+                 offset=0.1)
+        eng2 = P('Eng (2) N1', np.ma.arange(8, dtype=float) * 2, frequency=2,
+                 offset=0.1)
+        cache = NodeCache()
+        eng1._cache = eng2._cache = cache
+        node = EngN1Max()
+        node.get_derived([airspeed, eng1, eng2])
+        expected = np.ma.max(np.ma.vstack(
+            [align(eng1, airspeed), align(eng2, airspeed)]), axis=0)
+        np.testing.assert_array_equal(node.array, expected)
+        self.assertEqual(len(cache), 2)
+
     def test_get_derived_unaligned(self):
         """
         Set the class attribute align_to_first_dependency = False
@@ -2175,6 +2519,8 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         if os.path.isfile(dest):
             os.remove(dest)
         node.save(dest)
+        # remove the file even when the assertions below fail.
+        self.addCleanup(os.remove, dest)
         self.assertTrue(os.path.isfile(dest))
         # load
         res = load(dest)
@@ -2183,7 +2529,6 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         self.assertEqual(res.array.values_mapping, mapping)
         expected = [np.ma.masked, 'two', 'one', 'two', 'one', 'two', 'one', 'two', 'one', np.ma.masked]
         self.assertEqual(list(res.array), expected)
-        os.remove(dest)
 
 class TestNodeTypeAbbreviation(unittest.TestCase):
     def test_node_type_abbr_attribute(self):
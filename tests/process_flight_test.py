@@ -1,4 +1,29 @@
+import gc
+import mock
+import numpy as np
+import time
 import unittest
+import weakref
+
+from collections import OrderedDict
+
+import networkx as nx
+
+from analysis_engine.key_point_values import (AirspeedWithGearDownMax,
+                                              RateOfClimbMax)
+from analysis_engine.library import max_value, min_value, runs_of_ones
+from analysis_engine.node import (DerivedParameterNode, FlightPhaseNode, KPV,
+                                  KTI, KeyPointValue, KeyPointValueNode,
+                                  KeyTimeInstance, KeyTimeInstanceNode, M,
+                                  NodeManager, P, S)
+from analysis_engine import process_flight
+from analysis_engine.process_flight import (_init_process_flights_worker,
+                                            _process_flight_worker,
+                                            derive_order_dependencies,
+                                            derive_parameters, geo_locate,
+                                            process_flights, SegmentError,
+                                            SegmentResult)
+from analysis_engine.synthetic_flight import synthetic_parameters
 
 
 class TestProcessFlight(unittest.TestCase):
@@ -15,3 +40,403 @@ class TestProcessFlight(unittest.TestCase):
         '''
         self.assertTrue(False, msg='Test not implemented.')
 
+
+class TestGeoLocate(unittest.TestCase):
+
+    def test_geo_locate(self):
+        lat = P('Latitude Smoothed', np.ma.arange(10, 20, dtype=np.float64))
+        lat.array[-3:] = np.ma.masked
+        lon = P('Longitude Smoothed', np.ma.arange(-5, 5, dtype=np.float64))
+        hdf = mock.MagicMock()
+        hdf.valid_param_names.return_value = [lat.name, lon.name]
+        hdf.__getitem__.side_effect = {lat.name: lat, lon.name: lon}.get
+        items = {
+            'Kti': KTI(items=[KeyTimeInstance(0.5, 'Kti'),
+                              KeyTimeInstance(3.5, 'Kti')]),
+            'Kpv': KPV(items=[KeyPointValue(5, 1, 'Kpv'),
+                              KeyPointValue(8.5, 2, 'Kpv')]),
+        }
+        self.assertIs(geo_locate(hdf, items), items)
+        located = [(item.latitude, item.longitude)
+                   for item in items['Kti'] + items['Kpv']]
+        # Zero longitude is stored as None. Masked samples at the end are
+        # extrapolated.
+        self.assertEqual(located, [(10.5, -4.5), (13.5, -1.5), (15, None),
+                                   (16, 3.5)])
+
+
+class TestDeriveOrderDependencies(unittest.TestCase):
+
+    def setUp(self):
+        class First(DerivedParameterNode):
+            def derive(self, a=P('Raw'), b=P('Second')):
+                pass
+
+        class Second(DerivedParameterNode):
+            def derive(self, a=P('Raw'), b=P('First')):
+                pass
+
+        class Third(DerivedParameterNode):
+            def derive(self, a=P('First'), b=P('Second'), c=P('Raw')):
+                pass
+
+        self.derived = {'First': First, 'Second': Second, 'Third': Third}
+        self.process_order = ['Raw', 'First', 'Second', 'Third']
+
+    def test_derive_order_dependencies(self):
+        waits_for, unavailable = derive_order_dependencies(
+            self.process_order, self.derived)
+        self.assertEqual(waits_for, {'First': set(), 'Second': {'First'},
+                                     'Third': {'First', 'Second'}})
+        # Second appears after First within the process order due to the
+        # circular dependency, therefore is unavailable to First.
+        self.assertEqual(unavailable, {'First': {'Second'}, 'Second': set(),
+                                       'Third': set()})
+
+    def test_derive_order_dependencies_spanning_tree(self):
+        gr_st = nx.DiGraph()
+        gr_st.add_edges_from([('First', 'Raw'), ('Second', 'Raw'),
+                              ('Second', 'First'), ('Third', 'Second')])
+        waits_for, unavailable = derive_order_dependencies(
+            self.process_order, self.derived, gr_st=gr_st)
+        self.assertEqual(waits_for, {'First': set(), 'Second': {'First'},
+                                     'Third': {'Second'}})
+        self.assertEqual(unavailable, {'First': set(), 'Second': set(),
+                                       'Third': set()})
+
+
+class TestDeriveParameters(unittest.TestCase):
+
+    def setUp(self):
+        class Double(DerivedParameterNode):
+            def derive(self, a=P('Raw')):
+                self.array = a.array * 2
+
+        class Triple(DerivedParameterNode):
+            def derive(self, a=P('Raw'), b=P('Double')):
+                self.array = a.array + b.array
+
+        self.derived = {'Double': Double, 'Triple': Triple}
+
+    def test_release_cached_parameters(self):
+        hdf = mock.Mock()
+        hdf.duration = 10
+        hdf.cache_param_list = []
+        raw_refs = []
+
+        def get_param(name, valid_only=False):
+            param = P(name, np.ma.arange(10, dtype=np.float64))
+            if name == 'Raw':
+                raw_refs.append(weakref.ref(param))
+            return param
+
+        hdf.get_param.side_effect = get_param
+        released = []
+        hdf.set_param.side_effect = lambda node: released.append(
+            [ref() is not None for ref in raw_refs])
+        node_mgr = NodeManager({}, 10, ['Raw'], ['Triple'], [], self.derived,
+                               {}, {})
+        with mock.patch('analysis_engine.process_flight.NODE_CACHE', False):
+            derive_parameters(hdf, node_mgr, ['Raw', 'Double', 'Triple'],
+                              cache_params=['Raw'])
+            # Raw is read once and is still required by Triple once Double
+            # has been derived.
+            self.assertEqual(len(raw_refs), 1)
+            self.assertEqual(released, [[True], [True]])
+            gc.collect()
+            self.assertIsNone(raw_refs[0]())
+            self.assertEqual(hdf.cache_param_list, [])
+            # Parameters which are not cached are read by each node.
+            node_mgr = NodeManager({}, 10, ['Raw'], ['Triple'], [],
+                                   self.derived, {}, {})
+            derive_parameters(hdf, node_mgr, ['Raw', 'Double', 'Triple'])
+            self.assertEqual(len(raw_refs), 3)
+
+    def test_profile(self):
+        hdf = mock.Mock()
+        hdf.duration = 10
+        hdf.get_param.return_value = P('Raw', np.ma.arange(10.0))
+        hdf.cache_param_list = []
+        for workers in (0, 2):
+            node_mgr = NodeManager({}, 10, ['Raw'], ['Triple'], [],
+                                   self.derived, {}, {})
+            profile = OrderedDict()
+            derive_parameters(hdf, node_mgr, ['Raw', 'Double', 'Triple'],
+                              workers=workers, profile=profile)
+            self.assertEqual(list(profile), ['Double', 'Triple'])
+            stats = profile['Triple']
+            self.assertEqual(stats['type'], 'DerivedParameterNode')
+            self.assertEqual(stats['nbytes'], 80)
+            self.assertIsNone(stats['items'])
+            self.assertIsNone(stats['peak_memory'])
+            for key in ('wall', 'cpu', 'align'):
+                self.assertGreaterEqual(stats[key], 0)
+
+
+class SyntheticHDF(object):
+    '''
+    In-memory stand-in for hdf_file holding parameters of a synthetic flight.
+    '''
+    def __init__(self, params, duration):
+        self.duration = duration
+        self.params = {p.name: p for p in params}
+        self.cache_param_list = []
+
+    def get_param(self, name, valid_only=False):
+        return self.params[name]
+
+    def set_param(self, param):
+        self.params[param.name] = param
+
+
+class TestDeriveParametersConcurrently(unittest.TestCase):
+
+    def setUp(self):
+        class AltitudeSmoothed(DerivedParameterNode):
+            def derive(self, alt=P('Altitude STD')):
+                self.array = np.ma.convolve(alt.array, np.ones(5) / 5,
+                                            mode='same')
+
+        class Attitude(DerivedParameterNode):
+            # Aligns Altitude STD and Roll to Pitch at 4Hz.
+            def derive(self, pitch=P('Pitch'), roll=P('Roll'),
+                       alt=P('Altitude STD')):
+                self.array = pitch.array + roll.array + alt.array / 1000
+
+        class PitchAltitude(DerivedParameterNode):
+            def derive(self, pitch=P('Pitch'), alt=P('Altitude STD')):
+                self.array = pitch.array * alt.array
+
+        class Airborne(FlightPhaseNode):
+            def derive(self, alt=P('Altitude Smoothed')):
+                self.create_phases(runs_of_ones(alt.array > 1000))
+
+        class Liftoff(KeyTimeInstanceNode):
+            def derive(self, airborne=S('Airborne')):
+                for phase in airborne:
+                    self.create_kti(phase.slice.start)
+
+        class AirspeedMaxAirborne(KeyPointValueNode):
+            def derive(self, airspeed=P('Airspeed'),
+                       airborne=S('Airborne')):
+                self.create_kpvs_within_slices(airspeed.array, airborne,
+                                               max_value)
+
+        class AttitudeMaxAirborne(KeyPointValueNode):
+            def derive(self, attitude=P('Attitude'), airborne=S('Airborne')):
+                self.create_kpvs_within_slices(attitude.array, airborne,
+                                               max_value)
+
+        class EngN1MaxAirborne(KeyPointValueNode):
+            NAME_FORMAT = 'Eng (%(number)d) N1 Max Airborne'
+            NAME_VALUES = {'number': [1, 2]}
+
+            def derive(self, eng1=P('Eng (1) N1'), eng2=P('Eng (2) N1'),
+                       airborne=S('Airborne')):
+                for number, eng in ((1, eng1), (2, eng2)):
+                    self.create_kpvs_within_slices(eng.array, airborne,
+                                                   max_value, number=number)
+
+        class AltitudeAtLiftoff(KeyPointValueNode):
+            def derive(self, alt=P('Altitude STD'), liftoff=KTI('Liftoff')):
+                self.create_kpvs_at_ktis(alt.array, liftoff)
+
+        self.derived = {
+            'Altitude Smoothed': AltitudeSmoothed,
+            'Attitude': Attitude,
+            'Pitch Altitude': PitchAltitude,
+            'Airborne': Airborne,
+            'Liftoff': Liftoff,
+            'Airspeed Max Airborne': AirspeedMaxAirborne,
+            'Attitude Max Airborne': AttitudeMaxAirborne,
+            'Eng N1 Max Airborne': EngN1MaxAirborne,
+            'Altitude At Liftoff': AltitudeAtLiftoff,
+        }
+        self.duration = 3 * 3600
+        self.params = synthetic_parameters(duration=self.duration, flights=3,
+                                           mask_density=0.01)
+
+    def _derive(self, workers):
+        hdf = SyntheticHDF(self.params, self.duration)
+        lfl_params = sorted(hdf.params)
+        process_order = lfl_params + [
+            'Altitude Smoothed', 'Attitude', 'Pitch Altitude', 'Airborne',
+            'Liftoff', 'Airspeed Max Airborne', 'Attitude Max Airborne',
+            'Eng N1 Max Airborne', 'Altitude At Liftoff']
+        node_mgr = NodeManager({}, self.duration, list(lfl_params),
+                               process_order, [], self.derived, {}, {})
+        results = derive_parameters(hdf, node_mgr, process_order,
+                                    workers=workers)
+        return hdf, node_mgr, results
+
+    def test_concurrent_matches_serial(self):
+        serial_hdf, serial_mgr, serial = self._derive(workers=1)
+        for workers in (2, 4):
+            hdf, node_mgr, results = self._derive(workers=workers)
+            self.assertEqual(sorted(node_mgr.hdf_keys),
+                             sorted(serial_mgr.hdf_keys))
+            self.assertEqual(sorted(hdf.params), sorted(serial_hdf.params))
+            for name in ('Altitude Smoothed', 'Attitude', 'Pitch Altitude'):
+                param = hdf.params[name]
+                serial_param = serial_hdf.params[name]
+                self.assertEqual((param.frequency, param.offset),
+                                 (serial_param.frequency, serial_param.offset))
+                np.testing.assert_array_equal(param.array.data,
+                                              serial_param.array.data)
+                np.testing.assert_array_equal(np.ma.getmaskarray(param.array),
+                                              np.ma.getmaskarray(
+                                                  serial_param.array))
+            # ktis, kpvs, sections, approaches and flight attributes
+            for items, serial_items in zip(results, serial):
+                self.assertEqual(list(items), list(serial_items))
+                for name in items:
+                    self.assertEqual(items[name], serial_items[name])
+        ktis, kpvs, sections = serial[:3]
+        phases = len(sections['Airborne'])
+        self.assertGreaterEqual(phases, 3)
+        self.assertEqual(len(ktis['Liftoff']), phases)
+        self.assertEqual(len(kpvs['Airspeed Max Airborne']), phases)
+        self.assertEqual(len(kpvs['Eng N1 Max Airborne']), phases * 2)
+        self.assertEqual(len(kpvs['Altitude At Liftoff']), phases)
+
+    def test_concurrent_matches_serial_modifying_dependencies(self):
+        # AirspeedWithGearDownMax used to mask the aligned Gear Down and
+        # RateOfClimbMax masks descending Vertical Speed in place. Nodes
+        # consuming the same dependencies are processed before them, so that
+        # serially they are unaffected, but also wait for a slow node so that
+        # on threads they are derived after them.
+        class VerticalSpeed(DerivedParameterNode):
+            def derive(self, alt=P('Altitude STD')):
+                self.array = np.ma.ediff1d(alt.array, to_begin=0.0) * 60
+
+        class Climbing(FlightPhaseNode):
+            def derive(self, vrt_spd=P('Vertical Speed')):
+                self.create_phases(runs_of_ones(vrt_spd.array > 300))
+
+        class Delay(DerivedParameterNode):
+            def derive(self, airspeed=P('Airspeed')):
+                time.sleep(0.2)
+                self.array = airspeed.array
+
+        class VerticalSpeedMin(KeyPointValueNode):
+            def derive(self, vrt_spd=P('Vertical Speed'), delay=P('Delay')):
+                self.create_kpv(*min_value(vrt_spd.array))
+
+        class GearDownSamples(KeyPointValueNode):
+            def derive(self, airspeed=P('Airspeed'), gear=M('Gear Down'),
+                       delay=P('Delay')):
+                self.create_kpv(0, np.ma.count(gear.array))
+
+        self.derived.update({
+            'Vertical Speed': VerticalSpeed,
+            'Climbing': Climbing,
+            'Delay': Delay,
+            'Vertical Speed Min': VerticalSpeedMin,
+            'Gear Down Samples': GearDownSamples,
+            'Airspeed With Gear Down Max': AirspeedWithGearDownMax,
+            'Rate Of Climb Max': RateOfClimbMax,
+        })
+        lfl_params = sorted(SyntheticHDF(self.params, self.duration).params)
+        process_order = lfl_params + [
+            'Altitude Smoothed', 'Airborne', 'Vertical Speed', 'Climbing',
+            'Delay', 'Vertical Speed Min', 'Gear Down Samples',
+            'Airspeed With Gear Down Max', 'Rate Of Climb Max']
+
+        def derive(workers):
+            hdf = SyntheticHDF(self.params, self.duration)
+            node_mgr = NodeManager({}, self.duration, list(lfl_params),
+                                   process_order, [], self.derived, {}, {})
+            return hdf, derive_parameters(hdf, node_mgr, process_order,
+                                          workers=workers)
+
+        hdf, serial = derive(workers=1)
+        kpvs = serial[1]
+        self.assertLess(kpvs['Vertical Speed Min'][0].value, 0)
+        self.assertGreater(kpvs['Gear Down Samples'][0].value,
+                           np.ma.sum(hdf.params['Gear Down'].array == 'Down'))
+        self.assertTrue(kpvs['Rate Of Climb Max'])
+        for workers in (2, 4):
+            results = derive(workers)[1]
+            for items, serial_items in zip(results, serial):
+                self.assertEqual(list(items), list(serial_items))
+                for name in items:
+                    self.assertEqual(items[name], serial_items[name])
+
+
+def _fake_process_flight(segment_info, tail_number, **kwargs):
+    '''
+    Stands in for process_flight within process_flights worker processes.
+    Earlier segments take longer so that they complete after later segments.
+    '''
+    time.sleep(0.05 * (4 - segment_info['Segment']))
+    if segment_info['Segment'] == 2:
+        raise ValueError('Segment 2 is invalid')
+    return {'tail_number': tail_number, 'segment': segment_info['Segment'],
+            'kwargs': sorted(kwargs)}
+
+
+class TestProcessFlights(unittest.TestCase):
+
+    def setUp(self):
+        self._derived_nodes_cache = process_flight._derived_nodes_cache
+
+    def tearDown(self):
+        process_flight._derived_nodes_cache = self._derived_nodes_cache
+
+    @mock.patch('analysis_engine.process_flight.get_registered_nodes')
+    def test_init_process_flights_worker(self, get_registered_nodes):
+        get_registered_nodes.side_effect = lambda modules: {
+            module: None for module in modules}
+        _init_process_flights_worker(['custom.nodes'])
+        cache = process_flight._derived_nodes_cache
+        self.assertEqual(get_registered_nodes.call_count, 3)
+        self.assertEqual(len(cache), 3)
+        node_modules = process_flight.settings.NODE_MODULES + ['custom.nodes']
+        self.assertIn('custom.nodes', cache[tuple(node_modules)])
+        # Subsequent segments reuse the nodes found when initialising.
+        self.assertIs(process_flight._get_derived_nodes(node_modules),
+                      cache[tuple(node_modules)])
+        self.assertEqual(get_registered_nodes.call_count, 3)
+
+    @mock.patch('analysis_engine.process_flight.process_flight',
+                side_effect=_fake_process_flight)
+    def test_process_flight_worker(self, process_flight_):
+        segment_info = {'File': 'a.hdf5', 'Segment': 1}
+        result = _process_flight_worker({'segment_info': segment_info,
+                                         'tail_number': 'G-ABCD'})
+        self.assertEqual(result, SegmentResult(
+            segment_info, {'tail_number': 'G-ABCD', 'segment': 1,
+                           'kwargs': []}, None))
+        segment_info = {'File': 'b.hdf5', 'Segment': 2}
+        result = _process_flight_worker({'segment_info': segment_info,
+                                         'tail_number': 'G-ABCD'})
+        self.assertEqual(result.segment_info, segment_info)
+        self.assertIsNone(result.results)
+        self.assertIsInstance(result.error, SegmentError)
+        self.assertEqual(result.error.type, 'ValueError')
+        self.assertEqual(result.error.message, 'Segment 2 is invalid')
+        self.assertIn('Segment 2 is invalid', result.error.traceback)
+
+    # Worker processes inherit the patched module when forked.
+    @mock.patch('analysis_engine.process_flight.get_registered_nodes',
+                return_value={})
+    @mock.patch('analysis_engine.process_flight.process_flight',
+                side_effect=_fake_process_flight)
+    def test_process_flights(self, process_flight_, get_registered_nodes):
+        segments = [{'segment_info': {'File': '%d.hdf5' % n, 'Segment': n},
+                     'tail_number': 'G-ABC%d' % n} for n in range(4)]
+        results = list(process_flights(segments, processes=2,
+                                       trace_path='trace.json'))
+        # Results are in the order of segments although later segments
+        # complete first.
+        self.assertEqual([r.segment_info['Segment'] for r in results],
+                         [0, 1, 2, 3])
+        for n in (0, 1, 3):
+            self.assertEqual(results[n].results,
+                             {'tail_number': 'G-ABC%d' % n, 'segment': n,
+                              'kwargs': ['trace_path']})
+            self.assertIsNone(results[n].error)
+        # A failed segment does not stop the others being processed.
+        self.assertIsNone(results[2].results)
+        self.assertEqual(results[2].error.type, 'ValueError')
+        self.assertEqual(results[2].error.message, 'Segment 2 is invalid')
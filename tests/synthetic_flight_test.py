@@ -0,0 +1,57 @@
+import numpy as np
+import unittest
+
+from analysis_engine.node import MultistateDerivedParameterNode
+from analysis_engine.synthetic_flight import synthetic_parameters
+
+
+class TestSyntheticParameters(unittest.TestCase):
+
+    def test_synthetic_parameters(self):
+        params = synthetic_parameters(duration=600, param_count=40, seed=1)
+        self.assertEqual(len(params), 40)
+        names = [p.name for p in params]
+        self.assertEqual(len(set(names)), 40)
+        for name in ('Airspeed', 'Altitude STD', 'Heading', 'Latitude',
+                     'Longitude', 'Eng (1) N1', 'Eng (2) N2', 'Gear Down'):
+            self.assertIn(name, names)
+        for param in params:
+            self.assertTrue(param.lfl)
+            self.assertEqual(len(param.array), int(600 * param.frequency))
+            self.assertTrue(0 <= param.offset < 1 / float(param.frequency))
+        gear_down = params[names.index('Gear Down')]
+        self.assertIsInstance(gear_down, MultistateDerivedParameterNode)
+        self.assertEqual(gear_down.values_mapping, {0: 'Up', 1: 'Down'})
+        self.assertEqual(set(gear_down.array.raw.compressed()), {0, 1})
+        altitude = params[names.index('Altitude STD')].array
+        self.assertGreater(altitude.max(), 30000)
+        self.assertLess(abs(altitude[0]), 100)
+
+    def test_reproducible(self):
+        params1 = synthetic_parameters(duration=300, seed=2)
+        params2 = synthetic_parameters(duration=300, seed=2)
+        for param1, param2 in zip(params1, params2):
+            self.assertEqual(param1.offset, param2.offset)
+            np.testing.assert_array_equal(param1.array, param2.array)
+
+    def test_mask_density(self):
+        params = synthetic_parameters(duration=3600, mask_density=0.1)
+        airspeed = params[0].array
+        self.assertAlmostEqual(np.ma.count_masked(airspeed) /
+                               float(len(airspeed)), 0.1, delta=0.01)
+        for mask_density in (-0.1, 1.5):
+            self.assertRaises(ValueError, synthetic_parameters,
+                              duration=60, mask_density=mask_density)
+        params = synthetic_parameters(duration=60, mask_density=1)
+        self.assertTrue(params[0].array.mask.all())
+
+    def test_flights(self):
+        params = synthetic_parameters(duration=3 * 3600, flights=3)
+        altitude = params[1].array.data
+        airborne = np.diff((altitude > 1000).astype(int))
+        self.assertEqual(np.sum(airborne == 1), 3)
+        self.assertEqual(np.sum(airborne == -1), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
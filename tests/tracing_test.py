@@ -0,0 +1,62 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from analysis_engine.tracing import (
+    add_span,
+    is_tracing,
+    span,
+    start_trace,
+    stop_trace,
+    trace,
+)
+
+
+class TestTracing(unittest.TestCase):
+
+    def tearDown(self):
+        stop_trace()
+
+    def test_span_not_tracing(self):
+        self.assertFalse(is_tracing())
+        with span('Airspeed', 'derive'):
+            pass
+        add_span('Airspeed', 'align', 0, 1)
+        self.assertEqual(stop_trace(), [])
+
+    def test_span(self):
+        self.assertTrue(start_trace())
+        self.assertFalse(start_trace())
+        with span('Airspeed', 'derive', frequency=1):
+            pass
+        events = stop_trace()
+        self.assertFalse(is_tracing())
+        self.assertEqual([e['ph'] for e in events], ['M', 'X'])
+        event = events[1]
+        self.assertEqual(event['name'], 'Airspeed')
+        self.assertEqual(event['cat'], 'derive')
+        self.assertEqual(event['args'], {'frequency': 1})
+        self.assertGreaterEqual(event['dur'], 0)
+        self.assertEqual(event['tid'], events[0]['tid'])
+
+    def test_trace(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        dest_path = os.path.join(temp_dir, 'trace.json')
+        with trace(dest_path):
+            self.assertTrue(is_tracing())
+            with span('geo_locate', 'process_flight'):
+                pass
+        self.assertFalse(is_tracing())
+        with open(dest_path) as fh:
+            events = json.load(fh)['traceEvents']
+        self.assertEqual(events[-1]['name'], 'geo_locate')
+        # Nothing is traced without a destination path.
+        with trace(None):
+            self.assertFalse(is_tracing())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,17 @@
+import os
+import shutil
+import simplejson
+import sys
+import tempfile
 import unittest
 
 from mock import Mock, patch
 
 from analysis_engine.utils import (
     derived_trimmer,
+    get_derived_nodes,
+    get_name_registries,
+    get_registered_nodes,
     list_derived_parameters,
     list_everything,
     list_flight_attributes,
@@ -12,6 +20,7 @@ from analysis_engine.utils import (
     list_ktis,
     list_lfl_parameter_dependencies,
     list_parameters,
+    write_node_registry,
     )
 
 class TestTrimmer(unittest.TestCase):
@@ -106,4 +115,59 @@ class TestGetNames(unittest.TestCase):
         phases = list_flight_phases()
         self.assertIn('Bounced Landing', phases)
 
-
+    def test_get_name_registries(self):
+        registries = get_name_registries(
+            ['analysis_engine.key_point_values'],
+            filter_nodes=['AOA With Flap Max', 'Airspeed Max'])
+        self.assertEqual(sorted(registries), ['AOA With Flap Max',
+                                              'Airspeed Max'])
+        self.assertIn('AOA With Flap 15 Max',
+                      registries['AOA With Flap Max']['names'])
+        self.assertEqual(registries['Airspeed Max'],
+                         {'name_format': '', 'names': ['Airspeed Max']})
+
+
+class TestNodeRegistry(unittest.TestCase):
+    module = 'tests.sample_derived_parameters'
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.path = os.path.join(temp_dir, 'registry.json')
+        self.registry = write_node_registry(self.path, [self.module])
+        self.derived = get_derived_nodes([self.module])
+        sys.modules.pop(self.module, None)
+
+    def test_write_node_registry(self):
+        records = self.registry['modules'][self.module]
+        self.assertEqual(list(records), list(self.derived))
+        self.assertEqual(records['SAT']['class'], 'SAT')
+        self.assertEqual(records['SAT']['node_type'], 'DerivedParameterNode')
+        self.assertEqual(records['SAT']['dependencies'],
+                         ['TAT', 'Indicated Airspeed', 'Pressure Altitude'])
+        self.assertEqual(records['SAT']['names'], ['SAT'])
+        with open(self.path) as fh:
+            self.assertEqual(simplejson.load(fh), self.registry)
+
+    def test_get_registered_nodes(self):
+        nodes = get_registered_nodes([self.module], self.path)
+        self.assertNotIn(self.module, sys.modules)
+        self.assertEqual(list(nodes), list(self.derived))
+        self.assertIn('Mach', nodes)
+        self.assertEqual(nodes.records['Mach']['dependencies'],
+                         ['Airspeed', 'TAT', 'Altitude STD'])
+        self.assertEqual(nodes['Mach'].__name__, 'Mach')
+        self.assertIn(self.module, sys.modules)
+
+    def test_get_registered_nodes_changed(self):
+        self.registry['sources'][self.module]['size'] += 1
+        with open(self.path, 'w') as fh:
+            simplejson.dump(self.registry, fh)
+        nodes = get_registered_nodes([self.module], self.path)
+        self.assertIn(self.module, sys.modules)
+        self.assertEqual(list(nodes), list(self.derived))
+
+    def test_get_registered_nodes_without_registry(self):
+        nodes = get_registered_nodes([self.module])
+        self.assertIsInstance(nodes, dict)
+        self.assertEqual(list(nodes), list(self.derived))